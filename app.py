@@ -1,81 +1,53 @@
-from flask import Flask, render_template, request, jsonify, send_file
-import pandas as pd
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+import multiprocessing
 import threading
 import time
-import io
 import uuid
 from email.mime.text import MIMEText
 import smtplib
 import os
 import json
 import logging
-import traceback
-from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Import the actual scraper
-from scraper.geonames_scraper import scrape_geonames_postcodes
-# Import Supabase utilities
-from supabase_utils.db_client import get_all_postcodes, supabase
+# Import Supabase utilities (the scraper itself only runs in job workers and /debug-scraper)
+from supabase_utils.db_client import (
+    get_postcode_stats, invalidate_postcode_stats, find_region_id, stream_postcodes, POSTCODE_COLUMNS,
+    ensure_jobs_table_exists, load_job_results, warm_reference_cache, ping_database
+)
+from supabase_utils.job_store import get_job_store
+from supabase_utils.lookup_index import get_lookup_index
+from scraper.city_filter import CityFilter, MATCH_MODES, DEFAULT_MATCH_MODE, normalize_place
+from supabase_utils.export import (
+    EXPORT_FORMATS, ExportFormatUnavailable, check_format, iter_export_rows, stream_csv, stream_export
+)
+from config import (
+    JOB_QUEUE_MAX_PENDING, JOB_WORKERS_EMBEDDED, JOB_REUSE_WINDOW, READY_CHECK_INTERVAL, LOG_LEVEL, LOOKUP_MAX_RESULTS,
+    SSE_MAX_STREAMS, SSE_POLL_INTERVAL, SSE_MAX_STREAM_SECONDS,
+)
+from http_pool import pool_stats
+from metrics import render_span_histograms, format_family
+from job_queue.base import (
+    QueueFull, PENDING, RUNNING, COMPLETED, FAILED, CANCELLED, CANCELLING, DETACHED, TERMINAL_STATUSES,
+)
+from job_queue.cache import get_job_cache
+from job_queue.planner import answer_from_store
+from job_queue.refresh import start_refresh_scheduler, get_refresh_scheduler
+from job_queue.queues import get_job_queue
+from job_queue.worker import get_worker_pool, start_worker_pool
 
 app = Flask(__name__)
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=LOG_LEVEL,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
-# Initialize the jobs dictionary (temporary in-memory storage)
-# This will be replaced with Supabase storage
-jobs = {}
-
-# Function to create jobs table in Supabase if it doesn't exist
-def ensure_jobs_table_exists():
-    try:
-        # Check if jobs table exists by attempting to query it
-        response = supabase.table("jobs").select("id").limit(1).execute()
-        logger.info("Jobs table exists in Supabase")
-        return True
-    except Exception as e:
-        if "relation" in str(e) and "does not exist" in str(e):
-            logger.info("Creating jobs table in Supabase")
-            try:
-                # Create the jobs table
-                # Note: This is a simplified approach - in production you might want to use migrations
-                sql = """
-                CREATE TABLE IF NOT EXISTS jobs (
-                    id UUID PRIMARY KEY,
-                    status VARCHAR(50) NOT NULL,
-                    state VARCHAR(100) NOT NULL,
-                    city VARCHAR(100),
-                    results JSONB,
-                    preview JSONB,
-                    results_count INTEGER DEFAULT 0,
-                    message TEXT,
-                    db_entries INTEGER DEFAULT 0,
-                    error_details TEXT,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-                );
-                """
-                # Assuming you have an rpc function 'exec_sql' set up in Supabase
-                # If not, you'll need to handle table creation differently (e.g., manually or via migrations)
-                # supabase.rpc("exec_sql", {"query": sql}).execute()
-                logger.warning("Automatic table creation via RPC is commented out. Ensure 'jobs' table exists.")
-                # logger.info("Jobs table created successfully")
-                return True # Assume success if RPC is commented out, needs manual creation
-            except Exception as create_error:
-                logger.error(f"Failed to create jobs table: {create_error}")
-                return False
-        else:
-            logger.error(f"Error checking jobs table: {e}")
-            return False
-
 # Define all US states for the dropdown
 STATES = [
     "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", 
@@ -87,87 +59,104 @@ STATES = [
     "Texas", "Utah", "Vermont", "Virginia", "Washington", "West Virginia", "Wisconsin", "Wyoming"
 ]
 
-# Run setup tasks at import time instead of using before_first_request
+# Dropdown value that scrapes every state in one job
+ALL_STATES = "All States"
+
+# Priority range accepted from clients; higher runs first
+MIN_JOB_PRIORITY = -10
+MAX_JOB_PRIORITY = 10
+# Seconds a client is told to wait when the queue is full
+QUEUE_FULL_RETRY_AFTER = 30
+
+# Run setup tasks at import time instead of using before_first_request.
+# Nothing here waits on the network: Supabase is checked and warmed in the background,
+# and /ready reports when that has succeeded.
 def setup_app():
     """Initialize application components"""
+    # Worker processes re-import this module; only the web process starts the pool
+    if multiprocessing.parent_process() is not None:
+        return
     try:
-        # Ensure the jobs table exists
-        ensure_jobs_table_exists()
+        if JOB_WORKERS_EMBEDDED:
+            start_worker_pool()
+        threading.Thread(target=warm_up, name="startup-warm-up", daemon=True).start()
+        get_lookup_index().start_refresher(completed_job_states)
+        # Keeps scraped states warm within REFRESH_REQUESTS_PER_HOUR; refreshes are whole-state scrapes
+        start_refresh_scheduler(STATES, lambda state: job_dedupe_key(state, None, None))
     except Exception as e:
         logger.error(f"Error during app initialization: {e}", exc_info=True)
 
+def warm_up():
+    """
+    Checks the jobs table, loads the country/region ids used by /api/postcodes and /export,
+    and takes the first stats snapshot so no page request has to wait for it.
+    """
+    try:
+        ensure_jobs_table_exists()
+        warm_reference_cache()
+        get_postcode_stats()
+    except Exception as e:
+        logger.error(f"Error warming up: {e}", exc_info=True)
+
+_lookup_watermark = {"since": time.time()}
+
+def completed_job_states():
+    """States scraped by jobs completed since the last call; the lookup index reloads them."""
+    since, payloads = get_job_queue().completed_since(_lookup_watermark["since"])
+    _lookup_watermark["since"] = since
+    return {state for payload in payloads if not payload.get("served_from_store")
+            for state in (payload.get("states") or [payload["state"]])}
+
 # Run setup at import time
 setup_app()
 
-# Function to save job to Supabase
-def save_job_to_supabase(job_id, job_data):
-    try:
-        # Convert job data to a format suitable for Supabase
-        supabase_job = {
-            "id": job_id,
-            "status": job_data.get("status", "unknown"),
-            "state": job_data.get("state", ""),
-            "city": job_data.get("city", None),
-            "results": json.dumps(job_data.get("results", [])),
-            "preview": json.dumps(job_data.get("preview", [])),
-            "results_count": job_data.get("results_count", 0),
-            "message": job_data.get("message", None),
-            "db_entries": job_data.get("db_entries", 0),
-            "error_details": job_data.get("error_details", None),
-            "updated_at": datetime.now().isoformat()
-        }
-        
-        # Try to create the table if it doesn't exist
-        try:
-            ensure_jobs_table_exists()
-        except Exception as table_error:
-            logger.error(f"Error ensuring jobs table exists: {table_error}")
-            # Continue anyway - we'll try the operation
-        
-        # Check if job already exists
-        try:
-            response = supabase.table("jobs").select("id").eq("id", job_id).execute()
-            
-            if response.data:
-                # Update existing job
-                supabase.table("jobs").update(supabase_job).eq("id", job_id).execute()
-                logger.info(f"Updated job {job_id} in Supabase")
-            else:
-                # Insert new job
-                supabase_job["created_at"] = datetime.now().isoformat()
-                supabase.table("jobs").insert(supabase_job).execute()
-                logger.info(f"Inserted job {job_id} into Supabase")
-            
-            return True
-        except Exception as e:
-            logger.error(f"Failed to save job to Supabase: {e}")
-            # If we get here, we'll fall back to in-memory storage only
-            return False
-    except Exception as e:
-        logger.error(f"Failed to prepare job data for Supabase: {e}")
-        return False
+def job_dedupe_key(state, states, city, city_match=DEFAULT_MATCH_MODE):
+    """
+    Identifies identical scrape requests: the same states and the same city filter, compared
+    by its normalised key (case, accents and punctuation ignored) and match mode.
+    """
+    scope = ",".join(sorted(states)) if states else state
+    if not city:
+        return f"{scope}|"
+    suffix = "" if city_match == DEFAULT_MATCH_MODE else f"|{city_match}"
+    return f"{scope}|{normalize_place(city)}{suffix}"
 
-# Function to get job from Supabase
-def get_job_from_supabase(job_id):
-    try:
-        response = supabase.table("jobs").select("*").eq("id", job_id).execute()
-        
-        if not response.data:
-            return None
-        
-        job_data = response.data[0]
-        
-        # Convert JSON strings back to Python objects
-        if isinstance(job_data.get("results"), str):
-            job_data["results"] = json.loads(job_data.get("results", "[]"))
-        
-        if isinstance(job_data.get("preview"), str):
-            job_data["preview"] = json.loads(job_data.get("preview", "[]"))
-        
-        return job_data
-    except Exception as e:
-        logger.error(f"Failed to get job from Supabase: {e}")
-        return None
+def note_job_loaded(job):
+    """
+    Called when a job is read from the queue because its version changed. Postcodes are
+    written by worker processes, which only expire their own stats snapshot, so this process
+    expires its snapshot (refreshed in the background) when it sees a scrape job completed.
+    """
+    if job.get("status") == COMPLETED and not (job.get("fetch_report") or {}).get("served_from_store"):
+        invalidate_postcode_stats()
+
+def get_job(job_id):
+    """
+    Returns a job from the local queue, falling back to the Supabase jobs table.
+
+    Jobs are served from the job cache while their queue version is unchanged. Running
+    jobs are pinned so progress polling never reloads them; pending jobs are not cached
+    because their queue position moves without their version changing.
+    """
+    queue = get_job_queue()
+    cache = get_job_cache()
+    version = queue.get_version(job_id)
+    job = cache.get(job_id, version)
+    if job is not None:
+        return dict(job)
+    job = queue.get(job_id)
+    if job is None:
+        job = get_job_store().get(job_id)
+        # A stored job that has not finished may still be changing on another host
+        if job is None or job.get("status") not in TERMINAL_STATUSES:
+            return job
+        version = None
+    else:
+        version = job.get("version")
+        note_job_loaded(job)
+    if job.get("status") != PENDING:
+        cache.put(job_id, job, version, pinned=job.get("status") == RUNNING)
+    return dict(job)
 
 def get_available_states():
     """Returns the list of states for the dropdown."""
@@ -177,42 +166,26 @@ def get_available_states():
 def index():
     # Get database stats to display on the homepage
     db_stats = get_database_stats()
-    return render_template('index.html', states=get_available_states(), db_stats=db_stats)
+    return render_template('index.html', states=get_available_states(), all_states=ALL_STATES, db_stats=db_stats)
 
 def get_database_stats():
     """Get statistics about the Supabase database for display"""
     try:
-        # Get total count of postcodes
-        postcodes = get_all_postcodes()
-        total_postcodes = len(postcodes)
-        
-        # Get recent entries (last 5)
-        recent_postcodes = postcodes[-5:] if total_postcodes > 0 else []
+        # Counts are computed server-side and cached briefly in db_client
+        stats = get_postcode_stats()
         
         # Format recent entries for display
         recent_entries = []
-        for postcode in recent_postcodes:
+        for postcode in stats["recent_postcodes"]:
             recent_entries.append({
                 "Post-Code": postcode.get("code", ""),
                 "City/Town": postcode.get("place_name", "")
             })
         
-        # Get count by region if available
-        region_counts = {}
-        try:
-            response = supabase.table("regions").select("id,name").execute()
-            regions = {r['id']: r['name'] for r in response.data}
-            
-            for region_id, region_name in regions.items():
-                count_response = supabase.table("postcodes").select("id").eq("region_id", region_id).execute()
-                region_counts[region_name] = len(count_response.data)
-        except Exception as e:
-            print(f"Error getting region counts: {e}")
-        
         return {
-            "total_postcodes": total_postcodes,
+            "total_postcodes": stats["total_postcodes"],
             "recent_entries": recent_entries,
-            "region_counts": region_counts
+            "region_counts": stats["region_counts"]
         }
     except Exception as e:
         print(f"Error getting database stats: {e}")
@@ -225,129 +198,116 @@ def get_database_stats():
 
 @app.route('/scrape', methods=['POST'])
 def scrape_postcodes_route():
-    state = request.form.get('state')
+    selected_states = [s for s in request.form.getlist('state') if s]
     city = request.form.get('city') or None  # Get city, default to None if empty
+    city_match = request.form.get('city_match') or DEFAULT_MATCH_MODE
 
-    if not state:
+    if not selected_states:
         return jsonify({"status": "error", "message": "State is required"}), 400
+    if city_match not in MATCH_MODES:
+        return jsonify({"status": "error", "message": f"city_match must be one of {', '.join(MATCH_MODES)}"}), 400
+    
+    # Several states (or "All States") run as one multi-state job
+    if ALL_STATES in selected_states:
+        states = list(STATES)
+        state = ALL_STATES
+    elif len(selected_states) > 1:
+        states = selected_states
+        state = ", ".join(selected_states)
+    else:
+        states = None
+        state = selected_states[0]
+    
+    # Multi-state jobs default to a lower priority so quick single-state jobs aren't stuck behind them
+    priority = request.form.get('priority', type=int)
+    if priority is None:
+        priority = -1 if states else 0
+    priority = max(MIN_JOB_PRIORITY, min(MAX_JOB_PRIORITY, priority))
     
     # Generate a unique job ID
     job_id = str(uuid.uuid4())
     
     # Initialize job data
     job_data = {
-        "status": "pending",
+        "status": PENDING,
         "state": state,
         "city": city,
-        "results": [],
+        "city_match": city_match if city else None,
         "preview": [],
         "results_count": 0,
         "message": None,
         "db_entries": 0  # Track how many entries were added to the database
     }
     
-    # Store in memory temporarily
-    jobs[job_id] = job_data
-    
-    # Save to Supabase
-    save_job_to_supabase(job_id, job_data)
-
-    # Start the scraper in a background thread
-    thread = threading.Thread(target=run_scraper_thread, args=(job_id, state, city))
-    thread.daemon = True
-    thread.start()
-
-    return jsonify({"status": "started", "job_id": job_id})
-
-def run_scraper_thread(job_id, state, city):
-    """Runs the scraper and updates the job dictionary."""
-    try:
-        # Update job status to running
-        jobs[job_id]["status"] = "running"
-        save_job_to_supabase(job_id, jobs[job_id])
-        
-        logger.info(f"Starting scraper for Job ID: {job_id}, State: {state}, City: {city}")
-        
-        # Call the actual scraper function
-        results_list = scrape_geonames_postcodes(state, city_filter=city)
-        
-        # Check if results_list is None or empty and provide detailed logging
-        if results_list is None:
-            logger.warning(f"Scraper returned None for state: {state}, city: {city}")
-            results_list = []
-        elif len(results_list) == 0:
-            logger.warning(f"Scraper returned empty list for state: {state}, city: {city}")
-        else:
-            logger.info(f"Scraper returned {len(results_list)} results for state: {state}, city: {city}")
-        
-        # Format the results for our application with renamed fields
-        formatted_results = []
-        for item in results_list:
-            formatted_result = {
-                "Post-Code": item.get("code", ""),
-                "City/Town": item.get("place_name", "")
-            }
-            formatted_results.append(formatted_result)
-        
-        # Update the job with results
-        jobs[job_id]["results"] = formatted_results
-        jobs[job_id]["results_count"] = len(formatted_results)
-        jobs[job_id]["preview"] = formatted_results[:5] if formatted_results else []
-        
-        if len(formatted_results) > 0:
-            jobs[job_id]["status"] = "completed"
-            jobs[job_id]["message"] = f"Found {len(formatted_results)} postcodes for {state}" + (f" ({city})" if city else "")
-        else:
-            jobs[job_id]["status"] = "completed"
-            jobs[job_id]["message"] = f"No postcodes found for {state}" + (f" ({city})" if city else "")
-        
-        # Get the count of database entries after scraping
+    # Queue the job for the worker processes; refuse it when too many are already waiting.
+    # An identical job that is in flight (or recently completed) is shared instead of scraping again,
+    # unless force is set, which only skips reusing completed results.
+    payload = {"state": state, "city": city, "city_match": city_match, "states": states}
+    dedupe_key = job_dedupe_key(state, states, city, city_match)
+    reuse_within = 0 if request.form.get('force') else JOB_REUSE_WINDOW
+
+    # A city-filtered job whose states were all scraped recently is answered from their stored rows
+    if city and not request.form.get('force'):
         try:
-            postcodes = get_all_postcodes()
-            jobs[job_id]["db_entries"] = len(postcodes)
+            if answer_from_store(get_job_queue(), job_id, job_data, payload, dedupe_key=dedupe_key):
+                return jsonify({"status": "started", "job_id": job_id, "queue_position": None,
+                                "served_from_store": True})
         except Exception as e:
-            logger.error(f"Error getting database count: {e}")
-            jobs[job_id]["db_entries"] = 0
-        
-        # Save updated job to Supabase
-        save_job_to_supabase(job_id, jobs[job_id])
-        
-        logger.info(f"Job {job_id} completed. Found {len(formatted_results)} postcodes.")
+            logger.error(f"Could not answer {state} ({city}) from stored rows, queueing a scrape: {e}")
 
-    except Exception as e:
-        logger.error(f"Job {job_id} failed: {e}", exc_info=True)
-        
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["message"] = str(e)
-        jobs[job_id]["error_details"] = traceback.format_exc()
-        
-        # Save failed job to Supabase
-        save_job_to_supabase(job_id, jobs[job_id])
+    try:
+        queued_id, position = get_job_queue().enqueue(
+            job_id, job_data, payload, priority=priority, max_pending=JOB_QUEUE_MAX_PENDING,
+            dedupe_key=dedupe_key, reuse_within=reuse_within,
+        )
+    except QueueFull as e:
+        response = jsonify({
+            "status": "error",
+            "message": f"The job queue is full ({e.pending} jobs waiting). Please try again shortly.",
+            "queue_position": e.pending + 1,
+        })
+        response.headers["Retry-After"] = str(QUEUE_FULL_RETRY_AFTER)
+        return response, 429
+    
+    if queued_id != job_id:
+        logger.info(f"Request for {state} ({city}) attached to existing job {queued_id}")
+        return jsonify({"status": "started", "job_id": queued_id, "queue_position": position, "coalesced": True})
+    
+    # Save to Supabase
+    get_job_store().save(job_id, job_data)
+
+    return jsonify({"status": "started", "job_id": job_id, "queue_position": position})
 
 @app.route('/job/<job_id>', methods=['GET'])
 def get_job_status(job_id):
-    # Try to get job from memory first
-    job = jobs.get(job_id)
-    
-    # If not in memory, try to get from Supabase
-    if not job:
-        job = get_job_from_supabase(job_id)
-        
-        # If found in Supabase, cache in memory
-        if job:
-            jobs[job_id] = job
+    job = get_job(job_id)
     
     if not job:
         return jsonify({"status": "error", "message": "Job not found"}), 404
 
+    return jsonify(job_status_data(job))
+
+def job_status_data(job):
+    """The status payload shared by /job/<id> and its event stream."""
     # Return status and preview data if completed
     response_data = {"status": job["status"]}
     
-    if job["status"] == "completed":
+    if job["status"] == PENDING:
+        response_data["queue_position"] = job.get("queue_position")
+    elif job["status"] == RUNNING:
+        if job.get("progress"):
+            response_data["progress"] = job["progress"]
+    elif job["status"] == COMPLETED:
         response_data["preview"] = job["preview"] or []
         response_data["results_count"] = job["results_count"]
         response_data["db_entries"] = job.get("db_entries", 0)
         response_data["message"] = job.get("message", "")
+        if job.get("fetch_report"):
+            response_data["fetch_report"] = job["fetch_report"]
+        if job.get("changes"):
+            response_data["changes"] = job["changes"]
+        if job.get("timings"):
+            response_data["timings"] = job["timings"]
         
         # Get fresh database stats
         try:
@@ -357,53 +317,348 @@ def get_job_status(job_id):
             logger.error(f"Error getting database stats: {e}")
             response_data["db_stats_error"] = str(e)
             
-    elif job["status"] == "failed":
+    elif job["status"] == CANCELLED:
+        response_data["message"] = job.get("message") or "Cancelled"
+    elif job["status"] == FAILED:
         response_data["message"] = job["message"]
         # Include more detailed error info if available
         if "error_details" in job:
             response_data["error_details"] = job["error_details"]
 
-    return jsonify(response_data)
+    return response_data
+
+# Seconds between keep-alive comments on an idle event stream
+SSE_HEARTBEAT_SECONDS = 15
+_sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+def format_sse(event, data, event_id=None):
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+@app.route('/job/<job_id>/events')
+def job_events(job_id):
+    """
+    Server-Sent Events stream of a job's progress. Sends a `status` event whenever the job
+    changes and a final `done` event (same payload as /job/<id>) when it finishes.
+    """
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    # Each stream holds a thread; past the limit clients are told to poll instead
+    if not _sse_slots.acquire(blocking=False):
+        return jsonify({"status": "error", "message": "Too many open event streams; poll /job/<id> instead"}), 503
+    
+    queue = get_job_queue()
+    
+    def generate():
+        current = job
+        last_sent = None
+        started = last_write = time.monotonic()
+        while True:
+            key = (current["status"], current.get("version"), current.get("queue_position"))
+            if key != last_sent:
+                finished = current["status"] in TERMINAL_STATUSES
+                yield format_sse("done" if finished else "status", job_status_data(current), current.get("version"))
+                if finished:
+                    return
+                last_sent = key
+                last_write = time.monotonic()
+            elif time.monotonic() - last_write >= SSE_HEARTBEAT_SECONDS:
+                yield ": keep-alive\n\n"
+                last_write = time.monotonic()
+            if time.monotonic() - started >= SSE_MAX_STREAM_SECONDS:
+                return
+            time.sleep(SSE_POLL_INTERVAL)
+            # Reading the version is an indexed lookup in the local queue; the full job is only
+            # reloaded when it changed, or while pending since its queue position moves
+            if current["status"] == PENDING or queue.get_version(job_id) != current.get("version"):
+                current = queue.get(job_id) or current
+                note_job_loaded(current)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Runs when the server closes the response, including when the client disconnects
+    response.call_on_close(_sse_slots.release)
+    return response
+
+@app.route('/job/<job_id>/results')
+def get_job_results(job_id):
+    """The full result list of a finished job, stored separately from its metadata."""
+    results = load_job_results(job_id)
+    if results is None:
+        return jsonify({"status": "error", "message": "Results not found"}), 404
+    return jsonify({"job_id": job_id, "results": results})
+
+@app.route('/job/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancels a queued job, or stops the worker running it, unless other requests share it."""
+    status = get_job_queue().cancel(job_id)
+    if status is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    if status == DETACHED:
+        return jsonify({"status": status, "job_id": job_id,
+                        "message": "Other requests are waiting on this job, so it keeps running"})
+    if status == CANCELLED:
+        job = get_job_queue().get(job_id)
+        job["message"] = "Cancelled"
+        get_job_store().save(job_id, job)
+    elif status != CANCELLING:
+        return jsonify({"status": status, "message": f"Job already {status}"}), 409
+    return jsonify({"status": status, "job_id": job_id})
+
+@app.route('/queue')
+def queue_status():
+    """Worker pool, queue depth and how many requests were served by coalescing."""
+    stats = get_worker_pool().stats()
+    stats["coalescing"] = get_job_queue().counters()
+    stats["job_store"] = get_job_store().stats()
+    stats["job_cache"] = get_job_cache().stats()
+    # Connections of this (web) process; workers log their own pool after each job
+    stats["http_pool"] = pool_stats()
+    stats["lookup_index"] = get_lookup_index().stats()
+    refresh = get_refresh_scheduler()
+    if refresh is not None:
+        stats["refresh"] = refresh.stats()
+    return jsonify(stats)
+
+@app.route('/metrics')
+def metrics_route():
+    """Prometheus metrics: stage timing histograms from every job worker, plus queue and cache figures."""
+    queue = get_job_queue()
+    coalescing = queue.counters()
+    job_cache = get_job_cache().stats()
+    http = pool_stats()
+    families = [
+        ("scraper_jobs_pending", "gauge", "Jobs waiting in the queue.", queue.pending_count()),
+        ("scraper_jobs_running", "gauge", "Jobs being run by a worker.", len(queue.running_jobs())),
+        ("scraper_jobs_coalesced_total", "counter", "Requests attached to an identical queued or running job.",
+         coalescing.get("coalesced_in_flight", 0)),
+        ("scraper_jobs_reused_total", "counter", "Requests served by a recently completed identical job.",
+         coalescing.get("coalesced_fresh", 0)),
+        ("scraper_job_cache_hits_total", "counter", "Job reads served from the job cache.", job_cache["hits"]),
+        ("scraper_job_cache_misses_total", "counter", "Job reads that missed the job cache.", job_cache["misses"]),
+        ("scraper_http_requests_total", "counter", "HTTP requests sent by the web process.", http["requests"]),
+        ("scraper_http_connections", "gauge", "Open pooled HTTP connections of the web process.", http["connections"]),
+    ]
+    body = render_span_histograms() + "".join(format_family(*family) for family in families)
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+_readiness = {"value": None, "expires_at": 0.0}
+_readiness_lock = threading.Lock()
+
+@app.route('/ready')
+def ready():
+    """
+    Readiness probe: 200 once Supabase answers and (when embedded) a job worker is alive,
+    503 otherwise. The result is reused for READY_CHECK_INTERVAL seconds.
+    """
+    with _readiness_lock:
+        if _readiness["value"] is None or time.monotonic() >= _readiness["expires_at"]:
+            checks = {"database": ping_database()}
+            if JOB_WORKERS_EMBEDDED:
+                checks["workers"] = get_worker_pool().stats()["alive"] > 0
+            _readiness["value"] = checks
+            _readiness["expires_at"] = time.monotonic() + READY_CHECK_INTERVAL
+        checks = _readiness["value"]
+    is_ready = all(checks.values())
+    return jsonify({"status": "ready" if is_ready else "unavailable", "checks": checks}), 200 if is_ready else 503
 
 @app.route('/database-stats')
 def database_stats_route():
     """API endpoint to get current database statistics"""
     return jsonify(get_database_stats())
 
+# Largest page a client can request from /api/postcodes
+MAX_API_PAGE_SIZE = 10000
+
+def resolve_region_id(region):
+    """Accepts a region id or a region (state) name and returns the id, or None if unknown."""
+    if region.isdigit():
+        return int(region)
+    return find_region_id(region)
+
+@app.route('/api/postcodes')
+def postcodes_api():
+    """
+    Paginated postcode listing, streamed as JSON.
+    Query parameters: region (name or id), code_prefix, fields (comma-separated),
+    limit (page size) and after (the next_cursor from the previous page).
+    """
+    fields = [f.strip() for f in request.args.get('fields', ",".join(POSTCODE_COLUMNS)).split(',') if f.strip()]
+    unknown = [f for f in fields if f not in POSTCODE_COLUMNS]
+    if unknown:
+        return jsonify({"status": "error", "message": f"Unknown fields: {', '.join(unknown)}"}), 400
+    
+    limit = request.args.get('limit', 1000, type=int)
+    if limit < 1 or limit > MAX_API_PAGE_SIZE:
+        return jsonify({"status": "error", "message": f"limit must be between 1 and {MAX_API_PAGE_SIZE}"}), 400
+    after = request.args.get('after', type=int)
+    code_prefix = request.args.get('code_prefix') or None
+    
+    region_id = None
+    if request.args.get('region'):
+        region_id = resolve_region_id(request.args['region'])
+        if region_id is None:
+            return jsonify({"status": "error", "message": "Region not found"}), 404
+    
+    rows = stream_postcodes(columns=fields, region_id=region_id, code_prefix=code_prefix, after_id=after, limit=limit)
+    
+    def generate():
+        # Rows are written out as they arrive from the database, one page at a time
+        yield '{"data": ['
+        count = 0
+        last_id = None
+        for row in rows:
+            last_id = row["id"]
+            yield ("," if count else "") + json.dumps({field: row.get(field) for field in fields})
+            count += 1
+        next_cursor = last_id if count == limit else None
+        yield f'], "count": {count}, "next_cursor": {json.dumps(next_cursor)}}}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+# --- Postcode lookups, answered from the in-memory index ---
+
+def lookup_index_or_503():
+    """Returns (index, None), or (None, error response) while the index has not been loaded yet."""
+    index = get_lookup_index()
+    if index.loaded_at is None:
+        response = jsonify({"status": "error", "message": "The lookup index is still loading"})
+        response.headers["Retry-After"] = "5"
+        return None, (response, 503)
+    return index, None
+
+@app.route('/lookup/code/<code>')
+def lookup_code(code):
+    """Returns the place, region id and state of one postcode."""
+    index, error = lookup_index_or_503()
+    if error:
+        return error
+    result = index.get(code.strip())
+    if result is None:
+        return jsonify({"status": "error", "message": "Postcode not found"}), 404
+    return jsonify(result)
+
+@app.route('/lookup/codes')
+def lookup_codes():
+    """Looks up several comma-separated postcodes at once; unknown codes map to null."""
+    index, error = lookup_index_or_503()
+    if error:
+        return error
+    codes = [code.strip() for code in request.args.get('codes', '').split(',') if code.strip()]
+    if not codes or len(codes) > LOOKUP_MAX_RESULTS:
+        return jsonify({"status": "error", "message": f"Pass between 1 and {LOOKUP_MAX_RESULTS} codes"}), 400
+    return jsonify({"results": {code: index.get(code) for code in codes}})
+
+@app.route('/lookup/places')
+def lookup_places():
+    """
+    Postcodes whose place name matches, ordered by place name.
+    Query parameters: name (or prefix), mode (prefix by default, or exact, contains or fuzzy),
+    state (name or region id) and limit.
+    """
+    index, error = lookup_index_or_503()
+    if error:
+        return error
+    name = (request.args.get('name') or request.args.get('prefix', '')).strip()
+    mode = request.args.get('mode', 'prefix')
+    if not name:
+        return jsonify({"status": "error", "message": "name is required"}), 400
+    if mode not in MATCH_MODES:
+        return jsonify({"status": "error", "message": f"mode must be one of {', '.join(MATCH_MODES)}"}), 400
+    limit = request.args.get('limit', 20, type=int)
+    if limit < 1 or limit > LOOKUP_MAX_RESULTS:
+        return jsonify({"status": "error", "message": f"limit must be between 1 and {LOOKUP_MAX_RESULTS}"}), 400
+    region_id = None
+    if request.args.get('state'):
+        region_id = resolve_region_id(request.args['state'])
+        if region_id is None:
+            return jsonify({"status": "error", "message": "Region not found"}), 404
+    if mode == "prefix":
+        results = index.find_places(name, region_id=region_id, limit=limit)
+    else:
+        results = index.filter_places(CityFilter(name, mode), region_id=region_id, limit=limit)
+    return jsonify({"results": results, "count": len(results)})
+
+def job_states(job):
+    """The list of state names a job scraped."""
+    if job['state'] == ALL_STATES:
+        return list(STATES)
+    return [s.strip() for s in job['state'].split(",") if s.strip()]
+
+def export_response(chunks, mimetype, filename):
+    """Streams an export with chunked transfer encoding as a file download."""
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.route('/export')
+def export_postcodes():
+    """
+    Streams stored postcodes straight from the database.
+    Query parameters: format (csv, ndjson or parquet), and one of job, state (repeatable)
+    or region (id). With no scope, every stored postcode is exported.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    try:
+        check_format(export_format)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except ExportFormatUnavailable as e:
+        return jsonify({"status": "error", "message": str(e)}), 501
+    
+    city = None
+    city_match = None
+    region_ids = None
+    states = request.args.getlist('state') or None
+    if request.args.get('job'):
+        job = get_job(request.args['job'])
+        if not job:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+        states = job_states(job)
+        city = job.get('city')
+        city_match = job.get('city_match')
+        name = f"job_{request.args['job'][:8]}"
+    elif request.args.get('region'):
+        region_id = resolve_region_id(request.args['region'])
+        if region_id is None:
+            return jsonify({"status": "error", "message": "Region not found"}), 404
+        region_ids = [region_id]
+        name = f"region_{region_id}"
+    elif states:
+        name = "_".join(s.lower().replace(' ', '_') for s in states) if len(states) == 1 else "selected_states"
+    else:
+        name = "all"
+    
+    rows = iter_export_rows(states=states, region_ids=region_ids, city=city, city_match=city_match)
+    return export_response(stream_export(rows, export_format), EXPORT_FORMATS[export_format],
+                           f"postcodes_{name}.{export_format}")
+
 @app.route('/download/<job_id>')
 def download_results(job_id):
-    # Try to get job from memory first
-    job = jobs.get(job_id)
-    
-    # If not in memory, try to get from Supabase
-    if not job:
-        job = get_job_from_supabase(job_id)
+    job = get_job(job_id)
     
     if not job or job['status'] != 'completed':
         return "Job not found or not completed", 404
     
-    # Create a DataFrame from the results
-    df = pd.DataFrame(job['results'])
-    
-    # Create a string buffer
-    buffer = io.StringIO()
-    df.to_csv(buffer, index=False)
-    
-    # Create a bytes buffer for the response
-    bytes_buffer = io.BytesIO()
-    bytes_buffer.write(buffer.getvalue().encode('utf-8'))
-    bytes_buffer.seek(0)
+    # Stream the job's postcodes from the database using the original CSV headers
+    states = job_states(job)
+    columns = ["code", "place_name"]
+    header = ["Post-Code", "City/Town"]
+    if len(states) > 1:
+        columns.append("state")
+        header.append("State")
+    rows = iter_export_rows(states=states, city=job.get('city'), city_match=job.get('city_match'))
     
     # Generate filename
     state = job['state'].lower().replace(' ', '_')
     filename = f"postcodes_{state}.csv"
     
-    return send_file(
-        bytes_buffer,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
-    )
+    return export_response(stream_csv(rows, columns, header), 'text/csv', filename)
 
 @app.route('/request-info', methods=['POST'])
 def request_info():
@@ -471,6 +726,8 @@ def debug_scraper():
     state = request.args.get('state', 'Connecticut')
     city = request.args.get('city', None)
     
+    from scraper.geonames_scraper import scrape_geonames_postcodes
+
     try:
         # Call the scraper directly
         results = scrape_geonames_postcodes(state, city_filter=city)
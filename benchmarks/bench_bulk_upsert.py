@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark batched postcode upserts against a local PostgREST stand-in, or
+against the SQLite storage backend with --backend sqlite (no network at all).
+
+Usage:
+    python benchmarks/bench_bulk_upsert.py [--rows 1000] [--latency-ms 5] [--backend sqlite]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+
+from postgrest_standin import PostgrestStandin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=5.0,
+                        help="Simulated per-request network latency")
+    parser.add_argument("--batch-sizes", default="1,50,500")
+    parser.add_argument("--backend", choices=("supabase", "sqlite"), default="supabase")
+    args = parser.parse_args()
+
+    standin = PostgrestStandin(latency_ms=args.latency_ms).start()
+    os.environ["SUPABASE_URL"] = standin.url
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["STORAGE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-upsert-"), "postcodes.sqlite3")
+
+    from supabase_utils.db_client import insert_postcodes_bulk, get_or_create_country_id, get_or_create_region_id
+    from supabase_utils.storage.backends import get_storage
+
+    region_id = get_or_create_region_id("Benchmark", get_or_create_country_id("Benchmark"))
+
+    rows = [
+        {"code": f"{i:05d}", "place_name": f"Place {i}", "region_id": region_id}
+        for i in range(args.rows)
+    ]
+
+    report = []
+    for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+        standin.reset()
+        if args.backend == "sqlite":
+            get_storage().delete_postcodes(region_id, [row["code"] for row in rows])
+        start = time.perf_counter()
+        summary = insert_postcodes_bulk(rows, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        report.append((batch_size, elapsed, standin.request_count, summary["success"]))
+
+    standin.stop()
+
+    print()
+    if args.backend == "sqlite":
+        print(f"{args.rows} rows, SQLite storage backend")
+    else:
+        print(f"{args.rows} rows, {args.latency_ms} ms simulated latency")
+    print(f"{'batch':>6} {'seconds':>9} {'requests':>9} {'inserted':>9} {'rows/sec':>10}")
+    for batch_size, elapsed, requests, inserted in report:
+        print(f"{batch_size:>6} {elapsed:>9.3f} {requests:>9} {inserted:>9} {args.rows / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark the postcode lookup index and the /lookup endpoints.
+
+Synthetic postcodes are written to a temporary SQLite storage backend, the index
+is built from it, and random code and place-prefix lookups are timed. Lookups are
+timed twice: as direct index calls, and through Flask (routing and JSON
+encoding, no network). The script reports p50/p99 latency and single-thread
+throughput for each.
+
+Usage:
+    python benchmarks/bench_lookup.py [--rows 100000] [--regions 50] [--queries 20000]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+SYLLABLES = ("ash", "bro", "ca", "del", "field", "glen", "har", "ing", "ton", "ville", "wood", "mor", "new", "port",
+             "river", "san", "stone", "up", "wal", "west", "lake", "mill", "oak", "pine", "spring", "bay")
+
+
+def place_name(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).title()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(label, queries, call):
+    samples = []
+    start = time.perf_counter()
+    for query in queries:
+        began = time.perf_counter()
+        call(query)
+        samples.append(time.perf_counter() - began)
+    elapsed = time.perf_counter() - start
+    return {
+        "case": label,
+        "p50_us": round(statistics.median(samples) * 1e6, 1),
+        "p99_us": round(percentile(samples, 0.99) * 1e6, 1),
+        "max_us": round(max(samples) * 1e6, 1),
+        "qps": round(len(queries) / elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--regions", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="bench-lookup-")
+    os.environ.update(
+        STORAGE_BACKEND="sqlite",
+        STORAGE_PATH=os.path.join(data_dir, "postcodes.sqlite3"),
+        SCRAPER_DATA_DIR=data_dir,
+        JOB_WORKERS_EMBEDDED="false",
+        LOG_LEVEL="WARNING",
+    )
+    rng = random.Random(args.seed)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from supabase_utils.db_client import get_or_create_country_id, get_or_create_region_id, insert_postcodes_bulk
+        country_id = get_or_create_country_id("Benchmark", "BM")
+        region_ids = [get_or_create_region_id(f"Region {n}", country_id) for n in range(args.regions)]
+        rows = [
+            {"code": f"{n:07d}", "place_name": place_name(rng), "region_id": region_ids[n % len(region_ids)]}
+            for n in range(args.rows)
+        ]
+        insert_postcodes_bulk(rows, batch_size=5000)
+
+        from supabase_utils.lookup_index import LookupIndex
+        index = LookupIndex()
+        start = time.perf_counter()
+        index.load()
+        build_seconds = time.perf_counter() - start
+
+        import app as app_module
+    client = app_module.app.test_client()
+    app_module.get_lookup_index().load()
+
+    codes = [rng.choice(rows)["code"] for _ in range(args.queries)]
+    prefixes = [rng.choice(rows)["place_name"][:rng.randint(2, 5)] for _ in range(args.queries)]
+    region_names = [f"Region {rng.randrange(args.regions)}" for _ in range(args.queries)]
+    report = [
+        measure("index code", codes, index.get),
+        measure("index prefix", prefixes, lambda prefix: index.find_places(prefix, limit=20)),
+        measure("http code", codes, lambda code: client.get(f"/lookup/code/{code}")),
+        measure("http prefix", prefixes, lambda prefix: client.get(f"/lookup/places?prefix={prefix}&limit=20")),
+        measure("http prefix+state", list(zip(prefixes, region_names)),
+                lambda query: client.get(f"/lookup/places?prefix={query[0]}&state={query[1]}&limit=20")),
+    ]
+
+    print()
+    print(f"{args.rows} postcodes in {args.regions} regions; index built in {build_seconds:.3f}s; "
+          f"{args.queries} queries per case")
+    print(f"{'case':>18} {'p50 us':>9} {'p99 us':>9} {'max us':>9} {'qps':>9}")
+    for case in report:
+        print(f"{case['case']:>18} {case['p50_us']:>9} {case['p99_us']:>9} {case['max_us']:>9} {case['qps']:>9}")
+
+
+if __name__ == "__main__":
+    main()
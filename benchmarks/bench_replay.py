@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end replay of scrape_geonames_postcodes.
+
+Recorded pages (page_source_*.html) and synthetic restable pages of any size are
+served by a local HTTP stand-in. The database is an in-memory fake of the
+db_client functions the scraper uses, so the real sync diff logic still runs.
+Each case runs in a fresh process so peak RSS is its own. For every case the
+script reports:
+- end-to-end throughput;
+- per-stage timings (fetch, parse, database lookups and writes);
+- database calls;
+- peak RSS.
+
+Results are printed as a table and written as JSON for trend tracking.
+
+Usage:
+    python benchmarks/bench_replay.py [--sizes 10000,100000,1000000] [--runs 3] [--output replay.json]
+"""
+
+import argparse
+import http.server
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+FIXTURES = ("page_source_0.html", "page_source_1.html")
+GEONAMES = "https://www.geonames.org"
+# The state every case is scraped as; its URLs are rewritten to the stand-in
+STATE = "Connecticut"
+
+ROW = ('<tr{odd}><td><small>{n}</small></td><td><a href="https://www.geonames.org/{n}/place-{n}.html">'
+       'Place {n}</a></td><td>{code:05d}</td><td>United States</td><td>Connecticut</td>'
+       '<td>Capitol Region</td><td></td></tr>\n')
+
+
+def synthetic_page(rows):
+    """A geonames-style page whose restable has `rows` data rows."""
+    parts = [
+        '<html><head><title>Postal codes</title></head><body>\n<table class="restable">\n<tbody>'
+        '<tr><th></th><th>Place</th><th>Code</th><th>Country</th><th>Admin1</th><th>Admin2</th><th>Admin3</th></tr>\n'
+    ]
+    parts.extend(ROW.format(n=n, code=n % 100000, odd=' class="odd"' if n % 2 else "") for n in range(1, rows + 1))
+    parts.append('<tr class="tfooter"><td colspan="7"></td></tr>\n</tbody></table>\n</body></html>')
+    return "".join(parts)
+
+
+class FakeDb:
+    """In-memory stand-in for the db_client functions used while scraping, counting every call."""
+
+    def __init__(self):
+        self.postcodes = {}
+        self.calls = {}
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def get_or_create_country_id(self, name, code=None):
+        self._count("get_or_create_country_id")
+        return 1
+
+    def get_or_create_region_id(self, name, country_id, code=None):
+        self._count("get_or_create_region_id")
+        return 1
+
+    def get_region_postcodes(self, region_id, page_size=1000):
+        self._count("get_region_postcodes")
+        return {code: dict(row) for code, row in self.postcodes.items() if row["region_id"] == region_id}
+
+    def insert_postcodes_bulk(self, rows, batch_size=None, ignore_duplicates=True):
+        self._count("insert_postcodes_bulk")
+        inserted = duplicates = 0
+        for row in rows:
+            if ignore_duplicates and row["code"] in self.postcodes:
+                duplicates += 1
+                continue
+            self.postcodes[row["code"]] = dict(row)
+            inserted += 1
+        return {"rows": len(rows), "success": inserted, "duplicates": duplicates, "errors": 0, "batches": []}
+
+    def delete_postcodes(self, region_id, codes, batch_size=200):
+        self._count("delete_postcodes")
+        for code in codes:
+            self.postcodes.pop(code, None)
+        return len(codes)
+
+    def install(self):
+        from supabase_utils import db_client
+        from scraper import geonames_scraper
+        for name in ("get_region_postcodes", "insert_postcodes_bulk", "delete_postcodes"):
+            setattr(db_client, name, getattr(self, name))
+        for name in ("get_or_create_country_id", "get_or_create_region_id", "insert_postcodes_bulk"):
+            setattr(geonames_scraper, name, getattr(self, name))
+
+
+def serve(body):
+    """Serves `body` for every path; returns the server's base URL."""
+    payload = body.encode("utf-8")
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run_case(case, runs):
+    """Runs one case in this process and returns its measurements."""
+    import io
+    import contextlib
+
+    from metrics import start_job_timings, finish_job_timings
+    from scraper.fetchers import HttpFetcher
+    from scraper.geonames_scraper import scrape_geonames_postcodes
+    from scraper import page_cache
+
+    if case.startswith("synthetic:"):
+        body = synthetic_page(int(case.split(":", 1)[1]))
+    else:
+        with open(os.path.join(ROOT, case), encoding="utf-8") as f:
+            body = f.read()
+    base_url = serve(body)
+
+    class ReplayFetcher(HttpFetcher):
+        def fetch(self, url, revalidate=False, before_request=None):
+            result = super().fetch(url.replace(GEONAMES, base_url), revalidate, before_request)
+            result.url = url
+            return result
+
+    fetcher = ReplayFetcher()
+    cache_root = tempfile.mkdtemp(prefix="page-cache-")
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    samples = []
+    for _ in range(runs):
+        # Every run starts cold so the page is fetched, parsed and written again
+        shutil.rmtree(cache_root, ignore_errors=True)
+        page_cache._cache = page_cache.PageCache(root=cache_root)
+        db = FakeDb()
+        db.install()
+        start_job_timings()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = scrape_geonames_postcodes(STATE, fetchers=[fetcher]) or []
+        elapsed = time.perf_counter() - start
+        samples.append({"seconds": elapsed, "rows": len(results), "timings": finish_job_timings(),
+                        "db_calls": db.calls})
+
+    median = sorted(samples, key=lambda sample: sample["seconds"])[len(samples) // 2]
+    return {
+        "case": case,
+        "page_bytes": len(body.encode("utf-8")),
+        "rows": median["rows"],
+        "runs": runs,
+        "seconds_median": round(median["seconds"], 4),
+        "seconds_all": [round(sample["seconds"], 4) for sample in samples],
+        "rows_per_second": round(median["rows"] / median["seconds"]) if median["seconds"] else None,
+        "timings": median["timings"],
+        "db_calls": median["db_calls"],
+        # ru_maxrss is in kilobytes on Linux
+        "baseline_rss_mb": round(baseline_rss / 1024, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000",
+                        help="Comma-separated row counts of the synthetic pages (up to 1000000)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_case(args.child, args.runs)))
+        return
+
+    cases = list(FIXTURES) + [f"synthetic:{int(size)}" for size in args.sizes.split(",") if size]
+    data_dir = tempfile.mkdtemp(prefix="bench-replay-")
+    env = dict(os.environ, SCRAPER_DATA_DIR=data_dir, POSTCODE_WRITE_MODE="sync", LOG_LEVEL="WARNING",
+               METRICS_PATH=os.path.join(data_dir, "metrics.sqlite3"))
+    report = []
+    for case in cases:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", case, "--runs", str(args.runs)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        report.append(json.loads(output.strip().splitlines()[-1]))
+    shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"{'case':>20} {'rows':>9} {'seconds':>9} {'rows/sec':>10} {'parse s':>9} {'db calls':>9} {'peak MB':>8}")
+    for case in report:
+        parse = case["timings"].get("parse", {}).get("seconds", 0.0)
+        print(f"{case['case']:>20} {case['rows']:>9} {case['seconds_median']:>9.3f} {case['rows_per_second'] or 0:>10} "
+              f"{parse:>9.3f} {sum(case['db_calls'].values()):>9} {case['peak_rss_mb']:>8}")
+
+    document = {
+        "benchmark": "replay",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": report,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(document, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Measure application startup: how long `import app` takes in a fresh interpreter,
+how many Supabase requests it makes, and how long until /ready returns 200.
+
+Each run starts a new Python process against a local PostgREST stand-in. With
+--unreachable the app points at a closed port instead, which shows that startup
+does not block on (or fail because of) the database.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--latency-ms 50] [--unreachable]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+
+from postgrest_standin import PostgrestStandin
+
+# Runs in the child process; writes its timings as JSON to the path in argv[1]
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+ready = None
+while time.perf_counter() - imported < {ready_timeout}:
+    if client.get('/ready').status_code == 200:
+        ready = time.perf_counter() - start
+        break
+    time.sleep(0.01)
+with open(sys.argv[1], "w") as f:
+    json.dump({{"import": imported - start, "ready": ready}}, f)
+"""
+
+
+def run_once(env, ready_timeout):
+    with tempfile.NamedTemporaryFile(suffix=".json") as result:
+        subprocess.run(
+            [sys.executable, "-c", CHILD.format(ready_timeout=ready_timeout), result.name],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True,
+        )
+        return json.load(open(result.name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50.0,
+                        help="Simulated per-request network latency")
+    parser.add_argument("--unreachable", action="store_true",
+                        help="Point the app at a closed port instead of the stand-in")
+    parser.add_argument("--ready-timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    standin = PostgrestStandin(latency_ms=args.latency_ms).start()
+    data_dir = tempfile.mkdtemp(prefix="bench-startup-")
+    env = dict(
+        os.environ,
+        SUPABASE_URL="http://127.0.0.1:9" if args.unreachable else standin.url,
+        SCRAPER_DATA_DIR=data_dir,
+        JOB_QUEUE_PATH=os.path.join(data_dir, "jobs.sqlite3"),
+        JOB_WORKERS_EMBEDDED="false",
+    )
+
+    report = []
+    for _ in range(args.runs):
+        standin.reset()
+        result = run_once(env, 1.0 if args.unreachable else args.ready_timeout)
+        report.append((result["import"], result["ready"], standin.request_count))
+    standin.stop()
+
+    print()
+    target = "unreachable database" if args.unreachable else f"{args.latency_ms} ms simulated latency"
+    print(f"{args.runs} cold starts, {target}")
+    print(f"{'run':>4} {'import s':>9} {'ready s':>9} {'requests':>9}")
+    for run, (imported, ready, requests) in enumerate(report, 1):
+        ready_text = f"{ready:.3f}" if ready is not None else "never"
+        print(f"{run:>4} {imported:>9.3f} {ready_text:>9} {requests:>9}")
+    print(f"median import: {statistics.median(r[0] for r in report):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
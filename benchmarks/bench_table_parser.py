@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Compare the streaming restable parser with the previous BeautifulSoup implementation.
+
+Runs both over the committed page_source_*.html fixtures and reports the median
+parse time and the peak traced memory of each.
+
+Usage:
+    python benchmarks/bench_table_parser.py [--runs 20]
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from scraper.table_parser import iter_postcodes
+
+
+def legacy_postcodes(html_content):
+    """The former find_postcode_table + find_all('tr') / find_all('td') extraction."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+    table = None
+    for candidate in soup.find_all('table'):
+        if 'restable' in candidate.get('class', []):
+            table = candidate
+            break
+    if table is None:
+        return []
+
+    rows = []
+    for row in table.find_all("tr")[1:]:
+        cols = row.find_all("td")
+        if len(cols) >= 3:
+            place_name = cols[1].text.strip()
+            postcode = cols[2].text.strip()
+            if place_name and postcode:
+                rows.append((place_name, postcode))
+    return rows
+
+
+def streaming_postcodes(html_content):
+    return list(iter_postcodes(html_content))
+
+
+def measure(fn, html_content, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn(html_content)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(html_content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    fixtures = sorted(glob.glob(os.path.join(ROOT, "page_source_*.html")))
+    fixtures += sorted(glob.glob(os.path.join(ROOT, "debug_output", "page_source_*.html")))
+
+    print(f"{'fixture':<34} {'KB':>5} {'rows':>5} {'impl':<10} {'ms':>8} {'peak KB':>9}")
+    for path in fixtures:
+        with open(path, encoding="utf-8") as f:
+            html_content = f.read()
+        name = os.path.relpath(path, ROOT)
+        legacy_rows, legacy_time, legacy_peak = measure(legacy_postcodes, html_content, args.runs)
+        stream_rows, stream_time, stream_peak = measure(streaming_postcodes, html_content, args.runs)
+        if legacy_rows != stream_rows:
+            print(f"WARNING: {name} produced different rows ({len(legacy_rows)} vs {len(stream_rows)})")
+
+        size = len(html_content) // 1024
+        print(f"{name:<34} {size:>5} {len(stream_rows):>5} {'bs4':<10} {legacy_time * 1000:>8.2f} {legacy_peak // 1024:>9}")
+        print(f"{'':<34} {'':>5} {'':>5} {'streaming':<10} {stream_time * 1000:>8.2f} {stream_peak // 1024:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+A tiny in-process stand-in for PostgREST used by the benchmarks.
+
+It understands just enough of the REST dialect used by supabase_utils.db_client
+(insert/upsert with on_conflict and the Prefer resolution header) to measure
+request counts and throughput without a real Supabase project.
+"""
+
+import fnmatch
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def _greater(value, operand):
+    # Numeric columns (ids) compare as numbers, everything else as text
+    if isinstance(value, int) and operand.lstrip("-").isdigit():
+        return value > int(operand)
+    return str(value) > operand
+
+
+class PostgrestStandin:
+    """Runs a local HTTP server that stores rows in memory, one dict per table."""
+
+    def __init__(self, latency_ms=0.0, host="127.0.0.1", port=0):
+        self.latency = latency_ms / 1000.0
+        self.tables = {}
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.tables = {}
+            self.request_count = 0
+
+    def _make_handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def handle_one_request(self):
+                # Clients that write headers and body separately would otherwise
+                # stall on delayed ACKs, which dwarfs the latency being measured.
+                if hasattr(socket, "TCP_QUICKACK"):
+                    self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+                try:
+                    super().handle_one_request()
+                except ConnectionError:
+                    # A client process exited mid-request (e.g. a startup benchmark run)
+                    self.close_connection = True
+
+            def _send(self, status, payload, total=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if total is not None:
+                    self.send_header("Content-Range", f"0-{max(len(payload) - 1, 0)}/{total}")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return self.rfile.read(length) if length else b""
+
+            def do_GET(self):
+                standin._tick()
+                self._read_body()
+                table, params = self._parse()
+                with standin.lock:
+                    rows, total = standin.select(table, params, with_total=True)
+                counted = "count=exact" in self.headers.get("Prefer", "")
+                self._send(200, rows, total if counted else None)
+
+            def do_DELETE(self):
+                standin._tick()
+                self._read_body()
+                table, params = self._parse()
+                with standin.lock:
+                    rows = standin.select(table, params)
+                    stored = standin.tables.get(table, {})
+                    for key in [k for k, v in stored.items() if v in rows]:
+                        del stored[key]
+                self._send(200, rows)
+
+            def _parse(self):
+                parsed = urlparse(self.path)
+                return parsed.path.rstrip("/").split("/")[-1], parse_qs(parsed.query)
+
+            def do_POST(self):
+                standin._tick()
+                if "/rpc/" in self.path:
+                    self._read_body()
+                    self._send(404, {"code": "PGRST202", "message": "Could not find the function",
+                                     "details": None, "hint": None})
+                    return
+                parsed = urlparse(self.path)
+                table = parsed.path.rstrip("/").split("/")[-1]
+                on_conflict = parse_qs(parsed.query).get("on_conflict", [None])[0]
+                prefer = self.headers.get("Prefer", "")
+                payload = json.loads(self._read_body() or b"[]")
+                rows = payload if isinstance(payload, list) else [payload]
+
+                with standin.lock:
+                    stored = standin.tables.setdefault(table, {})
+                    written = []
+                    for row in rows:
+                        key = row.get(on_conflict or "code", len(stored) + 1)
+                        if key in stored:
+                            if "merge-duplicates" in prefer:
+                                stored[key].update(row)
+                                written.append(stored[key])
+                            elif "ignore-duplicates" in prefer:
+                                continue
+                            else:
+                                self._send(409, {"code": "23505", "message": "duplicate key value violates unique constraint",
+                                                 "details": None, "hint": None})
+                                return
+                        else:
+                            # Tables keyed by a client-supplied id (e.g. jobs) keep it
+                            stored[key] = dict({"id": len(stored) + 1}, **row)
+                            written.append(stored[key])
+                self._send(201, written)
+
+        return Handler
+
+    def select(self, table, params, with_total=False):
+        """Applies the eq/gt/in/like/ilike filters, order and limit used by db_client to a table."""
+        params = dict(params)
+        limit = int(params.pop("limit", ["0"])[0]) or None
+        order = params.pop("order", [None])[0]
+        params.pop("select", None)
+        rows = list(self.tables.get(table, {}).values())
+        for column, values in params.items():
+            for value in values:
+                op, _, operand = value.partition(".")
+                if op == "eq":
+                    rows = [r for r in rows if str(r.get(column)) == operand]
+                elif op == "gt":
+                    rows = [r for r in rows if _greater(r.get(column), operand)]
+                elif op == "like":
+                    rows = [r for r in rows if fnmatch.fnmatchcase(str(r.get(column)), operand)]
+                elif op == "ilike":
+                    rows = [r for r in rows if fnmatch.fnmatchcase(str(r.get(column)).lower(), operand.lower())]
+                elif op == "in":
+                    allowed = set(v.strip('"') for v in operand.strip("()").split(","))
+                    rows = [r for r in rows if str(r.get(column)) in allowed]
+        if order:
+            column, _, direction = order.partition(".")
+            rows.sort(key=lambda r: r.get(column), reverse=direction == "desc")
+        if with_total:
+            return rows[:limit], len(rows)
+        return rows[:limit]
+
+    def _tick(self):
+        with self.lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
@@ -0,0 +1,9 @@
+# Gunicorn loads this file automatically from the working directory.
+
+
+def worker_exit(server, worker):
+    """Close pooled browsers and job workers so their processes don't outlive the worker."""
+    from scraper.browser_pool import shutdown_browser_pool
+    from job_queue.worker import shutdown_worker_pool
+    shutdown_browser_pool()
+    shutdown_worker_pool()
@@ -0,0 +1,125 @@
+"""
+Process-wide HTTP connection pool shared by the Supabase client and the page fetcher.
+
+One httpx transport holds every keep-alive connection of the process, so the
+database client and the scraper reuse warm TCP/TLS connections instead of each
+building their own pool. HTTP/2 is used when the optional `h2` package is
+installed. Connection failures are retried by the transport; callers that know a
+request is idempotent (the fetcher's GETs) also retry retryable status codes.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from config import (
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_RETRIES, HTTP_POOL_SIZE,
+    HTTP_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY, HTTP2,
+)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """An HTTPTransport that counts requests and outlives the clients built on it."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.counters = {"requests": 0, "errors": 0, "request_seconds": 0.0}
+
+    def handle_request(self, request):
+        with self._lock:
+            self.in_flight += 1
+            self.counters["requests"] += 1
+        start = time.perf_counter()
+        try:
+            return super().handle_request(request)
+        except httpx.TransportError:
+            with self._lock:
+                self.counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.counters["request_seconds"] += time.perf_counter() - start
+
+    def close(self):
+        # Closing one client must not tear down connections other clients are using
+        pass
+
+    def shutdown(self):
+        super().close()
+
+    def stats(self):
+        connections = list(self._pool.connections)
+        with self._lock:
+            return dict(
+                self.counters,
+                request_seconds=round(self.counters["request_seconds"], 3),
+                in_flight=self.in_flight,
+                connections=len(connections),
+                idle_connections=sum(1 for connection in connections if connection.is_idle()),
+                max_connections=HTTP_POOL_SIZE,
+                http2=HTTP2 and HTTP2_AVAILABLE,
+            )
+
+
+DEFAULT_TIMEOUT = httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Returns the process-wide pooled transport."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = PooledTransport(
+                http2=HTTP2 and HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_SIZE,
+                    max_keepalive_connections=HTTP_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+                retries=HTTP_MAX_RETRIES,
+            )
+        return _transport
+
+
+def get_http_client(client_class=httpx.Client, **kwargs):
+    """
+    Builds a client (headers, base URL, ...) on top of the shared transport.
+
+    Args:
+        client_class: httpx.Client or a subclass of it
+        **kwargs: Passed to the client; timeout defaults to the configured connect/read timeouts
+
+    Returns:
+        The client. Closing it leaves the shared connections open.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return client_class(transport=get_transport(), **kwargs)
+
+
+def pool_stats():
+    """Request counts and connection utilisation of the shared pool."""
+    return get_transport().stats()
+
+
+def close_pool():
+    global _transport
+    with _transport_lock:
+        transport, _transport = _transport, None
+    if transport is not None:
+        transport.shutdown()
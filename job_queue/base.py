@@ -0,0 +1,108 @@
+"""
+Interface shared by job queue backends.
+
+A job has a JSON-serialisable payload (what to scrape) and a job dict (status,
+results, preview, ...) that the web app reads back. Jobs move through
+pending -> running -> completed / failed / cancelled.
+"""
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+# Returned by cancel() for a running job whose worker has not stopped yet
+CANCELLING = "cancelling"
+# Returned by cancel() for a shared job that other requests still wait on; it keeps going
+DETACHED = "detached"
+
+TERMINAL_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Raised by enqueue() when the queue already holds the maximum number of pending jobs."""
+
+    def __init__(self, pending):
+        super().__init__(f"{pending} jobs are already waiting")
+        self.pending = pending
+
+
+class JobQueue:
+    """Base class for queue backends. Every method must be safe to call from several processes."""
+
+    def enqueue(self, job_id, job, payload, priority=0, max_pending=None, dedupe_key=None, reuse_within=0):
+        """
+        Adds a pending job and returns (job_id, queue position), position 1 being next.
+        Raises QueueFull.
+
+        Jobs with the same dedupe_key are coalesced: while one is pending or running, or
+        completed less than reuse_within seconds ago, its id is returned instead of adding
+        a new job (the position is None unless it is still pending). A pending job that is
+        coalesced into takes the higher of its own and the new request's priority.
+        """
+        raise NotImplementedError
+
+    def record_finished(self, job_id, job, payload, dedupe_key=None):
+        """Adds a job that was answered without a worker (e.g. from stored rows) as completed."""
+        raise NotImplementedError
+
+    def claim(self, worker):
+        """Atomically marks the next pending job as running for `worker`; returns (job_id, payload) or None."""
+        raise NotImplementedError
+
+    def update(self, job_id, job):
+        """Saves the job dict of a job without changing its status."""
+        raise NotImplementedError
+
+    def finish(self, job_id, status, job):
+        """Moves a running job to a terminal status. Returns False if it was no longer running."""
+        raise NotImplementedError
+
+    def cancel(self, job_id):
+        """
+        Cancels a pending job or flags a running one. Returns the resulting status, or None if unknown.
+
+        A job that coalesced requests (or a background refresh) are attached to is only cancelled
+        once every one of them has cancelled; until then each cancel detaches one and returns DETACHED.
+        """
+        raise NotImplementedError
+
+    def mark_cancelled(self, job_id):
+        """Records that a flagged running job was stopped."""
+        raise NotImplementedError
+
+    def requeue(self, job_id, max_attempts=None):
+        """
+        Returns a running job whose worker stopped to the queue, or fails it once it has
+        been started max_attempts times (None = always requeue). Returns the new status.
+        """
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """
+        Returns the job dict with its current status, version (and queue_position while pending),
+        or None if unknown.
+        """
+        raise NotImplementedError
+
+    def get_version(self, job_id):
+        """Returns a counter that increases on every change to the job, or None if unknown."""
+        raise NotImplementedError
+
+    def completed_since(self, since):
+        """
+        Returns (watermark, payloads): the payloads of jobs completed after `since` (a time.time()
+        value) and the finish time to pass as `since` next time.
+        """
+        raise NotImplementedError
+
+    def running_jobs(self):
+        """Returns [{"id", "worker", "cancel_requested"}] for every running job."""
+        raise NotImplementedError
+
+    def pending_count(self):
+        raise NotImplementedError
+
+    def counters(self):
+        """Returns the coalescing counters: coalesced_in_flight, coalesced_fresh and coalesce_misses."""
+        raise NotImplementedError
@@ -0,0 +1,121 @@
+"""
+Bounded in-memory cache of job dicts for the web process.
+
+Entries are bounded by count and by approximate size (their JSON length).
+Finished jobs expire JOB_CACHE_TTL seconds after they were cached. Running jobs
+are pinned: they are never evicted to make room, but are still dropped once
+nobody has read them for JOB_CACHE_TTL seconds. Each entry remembers the queue
+version it was read at, so a changed job is never served stale.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import JOB_CACHE_MAX_ENTRIES, JOB_CACHE_MAX_BYTES, JOB_CACHE_TTL
+
+
+class _Entry:
+    __slots__ = ("value", "version", "size", "pinned", "expires_at")
+
+    def __init__(self, value, version, size, pinned, expires_at):
+        self.value = value
+        self.version = version
+        self.size = size
+        self.pinned = pinned
+        self.expires_at = expires_at
+
+
+class JobCache:
+    """LRU cache with count, byte and TTL limits, and pinned entries."""
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key, version=None):
+        """Returns the cached value, or None if missing, expired or cached at a different version."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(key)
+                self.counters["expirations"] += 1
+                entry = None
+            if entry is None or entry.version != version:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.pinned:
+                # Pinned entries stay as long as someone keeps reading them
+                entry.expires_at = now + self.ttl
+            self.counters["hits"] += 1
+            return entry.value
+
+    def put(self, key, value, version=None, pinned=False):
+        """Caches a value. Values larger than max_bytes are not cached."""
+        size = len(json.dumps(value, default=str))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = _Entry(value, version, size, pinned, time.monotonic() + self.ttl)
+            self._bytes += size
+            self._evict()
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return dict(
+                self.counters,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                pinned=sum(1 for entry in self._entries.values() if entry.pinned),
+                hit_rate=round(self.counters["hits"] / lookups, 3) if lookups else None,
+            )
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self):
+        """Drops expired entries, then least recently used unpinned ones until within limits."""
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+            self._remove(key)
+            self.counters["expirations"] += 1
+        if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+            return
+        for key in [key for key, entry in self._entries.items() if not entry.pinned]:
+            if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            self._remove(key)
+            self.counters["evictions"] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_job_cache():
+    """Returns the process-wide job cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = JobCache(JOB_CACHE_MAX_ENTRIES, JOB_CACHE_MAX_BYTES, JOB_CACHE_TTL)
+        return _cache
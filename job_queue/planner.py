@@ -0,0 +1,109 @@
+"""
+Answers scrape jobs from stored state data where possible.
+
+A city-filtered job keeps only a few rows of each state page. When a state was
+scraped successfully less than STATE_DATA_MAX_AGE seconds ago, its stored rows
+(see scraper.freshness) are filtered instead, and only states whose data is
+stale or missing are scraped. If every state of a job can be answered this way,
+the web process completes the job itself and it never waits for a worker.
+"""
+
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import STATE_DATA_MAX_AGE
+from job_queue.base import COMPLETED
+from metrics import span
+from scraper.city_filter import as_city_filter
+from scraper.freshness import get_state_freshness
+from supabase_utils.db_client import get_postcode_stats
+from supabase_utils.job_store import get_job_store
+
+logger = logging.getLogger(__name__)
+
+
+def format_results(results_list):
+    """Renames scraped fields for the application: code -> Post-Code, place_name -> City/Town."""
+    formatted_results = []
+    for item in results_list:
+        formatted_result = {
+            "Post-Code": item.get("code", ""),
+            "City/Town": item.get("place_name", "")
+        }
+        if "state" in item:
+            formatted_result["State"] = item["state"]
+        formatted_results.append(formatted_result)
+    return formatted_results
+
+
+def completion_message(state, city, count):
+    suffix = f" ({city})" if city else ""
+    if count > 0:
+        return f"Found {count} postcodes for {state}{suffix}"
+    return f"No postcodes found for {state}{suffix}"
+
+
+def stored_results(states, city_filter, max_age=STATE_DATA_MAX_AGE):
+    """
+    Filters the stored rows of every state whose last successful scrape is fresh enough.
+
+    Returns:
+        dict: state -> matching rows, only for the states that need no scrape
+    """
+    freshness = get_state_freshness()
+    found = {}
+    for state in states:
+        rows = freshness.stored_rows(state, max_age)
+        if rows is not None:
+            with span("filter"):
+                found[state] = city_filter.apply(rows)
+    return found
+
+
+def answer_from_store(queue, job_id, job, payload, dedupe_key=None):
+    """
+    Completes a city-filtered job from stored rows if every state it covers is fresh.
+    Raises if the job or its results could not be stored; the job is then not recorded
+    in the queue, so it can be queued for a scrape instead.
+
+    Returns:
+        bool: True if the job was answered; otherwise it has to be queued for a scrape
+    """
+    city_filter = as_city_filter(payload.get("city"), payload.get("city_match"))
+    if city_filter is None:
+        return False
+    states = payload.get("states") or [payload["state"]]
+    started = time.perf_counter()
+    stored = stored_results(states, city_filter)
+    if len(stored) < len(states):
+        return False
+
+    if payload.get("states"):
+        results_list = [dict(item, state=state) for state in states for item in stored[state]]
+    else:
+        results_list = stored[payload["state"]]
+    formatted_results = format_results(results_list)
+    job = dict(job)
+    job.update(
+        status=COMPLETED,
+        results_count=len(formatted_results),
+        preview=formatted_results[:5],
+        message=completion_message(payload["state"], payload.get("city"), len(formatted_results)),
+        fetch_report={"served_from_store": states, "elapsed": round(time.perf_counter() - started, 4)},
+        changes={},
+    )
+    try:
+        job["db_entries"] = get_postcode_stats()["total_postcodes"]
+    except Exception as e:
+        logger.error(f"Error getting database count: {e}")
+
+    # The row and results are written (or raise) before the job is recorded, so a failure leaves
+    # nothing behind. The payload is marked so the lookup index does not reload states nothing was written to.
+    get_job_store().save_now(job_id, job, results=formatted_results)
+    queue.record_finished(job_id, job, dict(payload, served_from_store=True), dedupe_key=dedupe_key)
+    logger.info(f"Job {job_id} answered from stored rows of {len(states)} state(s) "
+                f"with {len(formatted_results)} results")
+    return True
@@ -0,0 +1,30 @@
+"""
+Selects the job queue backend named by JOB_QUEUE_BACKEND.
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import JOB_QUEUE_BACKEND, JOB_QUEUE_PATH
+from job_queue.sqlite_queue import SQLiteJobQueue
+
+# Backend name -> factory; register other backends (e.g. Redis or Postgres) here
+QUEUE_BACKENDS = {
+    "sqlite": lambda: SQLiteJobQueue(JOB_QUEUE_PATH),
+}
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Returns the process-wide job queue."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            if JOB_QUEUE_BACKEND not in QUEUE_BACKENDS:
+                raise ValueError(f"Unknown JOB_QUEUE_BACKEND '{JOB_QUEUE_BACKEND}'")
+            _queue = QUEUE_BACKENDS[JOB_QUEUE_BACKEND]()
+        return _queue
@@ -0,0 +1,180 @@
+"""
+Background refresh that keeps scraped states warm.
+
+Every REFRESH_CHECK_INTERVAL seconds the scheduler looks for the state whose page
+was fetched from the server longest ago (see scraper.freshness). Once that is
+more than REFRESH_AFTER seconds, it queues a low-priority refresh job for it.
+The job revalidates the page with a conditional GET, so an unchanged page costs
+a 304 and skips parsing and database writes. Refreshes are spaced out so the
+requests they send stay within REFRESH_REQUESTS_PER_HOUR. Each refresh is
+charged the number of requests its state's last scrape took. Nothing is queued
+while other jobs are waiting, so refreshes only take workers that would be idle.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import REFRESH_REQUESTS_PER_HOUR, REFRESH_AFTER, REFRESH_STATES, REFRESH_CHECK_INTERVAL
+from job_queue.base import PENDING
+from job_queue.queues import get_job_queue
+from scraper.freshness import get_state_freshness, StateFreshness
+
+logger = logging.getLogger(__name__)
+
+# Below every priority a client can ask for, so user jobs always run first
+REFRESH_PRIORITY = -11
+
+
+class RefreshScheduler:
+    """Queues refresh jobs for the stalest states within an hourly request budget."""
+
+    def __init__(self, states, dedupe_key, queue=None, requests_per_hour=REFRESH_REQUESTS_PER_HOUR,
+                 refresh_after=REFRESH_AFTER, refresh_states=REFRESH_STATES):
+        """
+        Args:
+            states: Every state that can be scraped
+            dedupe_key: Returns the job dedupe key of a whole-state scrape, so a refresh
+                shares a user job for the same state that is already queued or running
+            refresh_states: REFRESH_STATES; a comma-separated list, "all", or empty for
+                the states scraped at least once
+        """
+        self.states = list(states)
+        self.dedupe_key = dedupe_key
+        self.queue = queue or get_job_queue()
+        self.requests_per_hour = requests_per_hour
+        self.refresh_after = refresh_after
+        self.refresh_states = refresh_states.strip()
+        # state -> when a refresh was last queued, so a failing state is not retried at once
+        self._attempted = {}
+        self._next_at = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counters = {"queued": 0, "coalesced": 0, "deferred_busy": 0, "requests_budgeted": 0, "errors": 0}
+
+    def tracked_states(self, records):
+        """The states kept warm, given the freshness records of every state scraped so far."""
+        if self.refresh_states.lower() == "all":
+            return self.states
+        if self.refresh_states:
+            wanted = {state.strip() for state in self.refresh_states.split(",")}
+            return [state for state in self.states if state in wanted]
+        return [state for state in self.states if state in records]
+
+    def due_states(self, now=None):
+        """
+        Returns [(age, state, record)] of the states due for a refresh, stalest first.
+        States never scraped have an infinite age and no record.
+        """
+        now = time.time() if now is None else now
+        records = get_state_freshness().all()
+        due = []
+        for state in self.tracked_states(records):
+            record = records.get(state)
+            age = StateFreshness.age(record, now) if record else float("inf")
+            if age < self.refresh_after or now - self._attempted.get(state, 0.0) < self.refresh_after:
+                continue
+            due.append((age, state, record))
+        due.sort(key=lambda item: item[0], reverse=True)
+        return due
+
+    def tick(self, now=None):
+        """Queues at most one refresh if the budget and the queue allow it. Returns the state, or None."""
+        now = time.time() if now is None else now
+        if self.requests_per_hour <= 0 or now < self._next_at:
+            return None
+        if self.queue.pending_count() > 0:
+            self.counters["deferred_busy"] += 1
+            return None
+        due = self.due_states(now)
+        if not due:
+            return None
+        age, state, record = due[0]
+
+        job_id = str(uuid.uuid4())
+        job = {"status": PENDING, "state": state, "city": None, "city_match": None, "preview": [],
+               "results_count": 0, "message": None, "db_entries": 0, "refresh": True}
+        payload = {"state": state, "city": None, "city_match": None, "states": None, "refresh": True}
+        queued_id, _ = self.queue.enqueue(job_id, job, payload, priority=REFRESH_PRIORITY,
+                                          dedupe_key=self.dedupe_key(state))
+        self._attempted[state] = now
+        if queued_id != job_id:
+            # A user job is already scraping the state; it costs the refresh budget nothing
+            self.counters["coalesced"] += 1
+            return None
+        cost = max(1, (record or {}).get("requests") or 1)
+        self._next_at = now + cost * 3600.0 / self.requests_per_hour
+        self.counters["queued"] += 1
+        self.counters["requests_budgeted"] += cost
+        fetched = "never fetched" if record is None else f"fetched {age:.0f}s ago"
+        logger.info(f"Queued refresh {job_id} for {state} ({fetched})")
+        return state
+
+    def start(self, interval=REFRESH_CHECK_INTERVAL):
+        """Starts the daemon thread that calls tick() every `interval` seconds. Does nothing if disabled."""
+        with self._lock:
+            if self._thread is not None or self.requests_per_hour <= 0:
+                return self._thread
+
+            def run():
+                while True:
+                    try:
+                        self.tick()
+                    except Exception as e:
+                        self.counters["errors"] += 1
+                        logger.error(f"Error scheduling a state refresh: {e}")
+                    time.sleep(interval)
+
+            self._thread = threading.Thread(target=run, name="state-refresh", daemon=True)
+            self._thread.start()
+            return self._thread
+
+    def stats(self):
+        """Counters, the budget and per-state freshness of the tracked states."""
+        now = time.time()
+        records = get_state_freshness().all()
+        tracked = self.tracked_states(records)
+        ages = [StateFreshness.age(records[state], now) for state in tracked if state in records]
+        return dict(
+            self.counters,
+            requests_per_hour=self.requests_per_hour,
+            next_refresh_in=round(max(0.0, self._next_at - now), 1),
+            tracked_states=len(tracked),
+            never_scraped=len(tracked) - len(ages),
+            due=len(self.due_states(now)),
+            stalest_age=round(max(ages), 1) if ages else None,
+            states={
+                state: {
+                    "age": round(StateFreshness.age(records[state], now), 1),
+                    "content_hash": records[state]["content_hash"],
+                    "row_count": records[state]["row_count"],
+                    "changed_at": records[state].get("changed_at"),
+                    "duration": records[state].get("duration"),
+                    "requests": records[state].get("requests"),
+                }
+                for state in tracked if state in records
+            },
+        )
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_refresh_scheduler(states, dedupe_key):
+    """Creates and starts the process-wide refresh scheduler (once)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RefreshScheduler(states, dedupe_key)
+        _scheduler.start()
+        return _scheduler
+
+
+def get_refresh_scheduler():
+    """Returns the process-wide refresh scheduler, or None if it was not started."""
+    return _scheduler
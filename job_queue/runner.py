@@ -0,0 +1,160 @@
+"""
+Runs one scrape job inside a worker process.
+
+Progress is written to the local queue (which the web app reads for /job/<id>)
+and mirrored to the Supabase jobs table through the write-behind job store.
+"""
+
+import logging
+import traceback
+
+from http_pool import pool_stats
+from metrics import start_job_timings, finish_job_timings, flush_metrics
+from job_queue.base import RUNNING, COMPLETED, FAILED, CANCELLED
+from job_queue.planner import format_results, completion_message, stored_results
+from scraper.city_filter import as_city_filter
+from scraper.geonames_scraper import scrape_geonames_postcodes
+from scraper.scheduler import scrape_states
+from supabase_utils.db_client import count_postcodes
+from supabase_utils.job_store import get_job_store
+
+logger = logging.getLogger(__name__)
+
+
+def summarize_changes(fetch_report):
+    """Totals the database change summaries of a single- or multi-state scrape report."""
+    reports = list(fetch_report.get("states", {}).values()) or [fetch_report]
+    totals = {}
+    for report in reports:
+        for key, value in (report.get("changes") or {}).items():
+            totals[key] = totals.get(key, 0) + value
+        if report.get("page_unchanged"):
+            totals["unchanged_pages"] = totals.get("unchanged_pages", 0) + 1
+    return totals
+
+
+def run_job(queue, job_id, payload):
+    """Runs the scraper for a claimed job. If payload["states"] is set, they are all scraped concurrently."""
+    state = payload["state"]
+    city = payload.get("city")
+    city_filter = as_city_filter(city, payload.get("city_match"))
+    states = payload.get("states")
+    job = queue.get(job_id) or {"state": state, "city": city}
+    job.pop("queue_position", None)
+    store = get_job_store()
+    results = None
+    start_job_timings()
+    try:
+        # Update job status to running
+        job["status"] = RUNNING
+        job["progress"] = {"states_done": 0, "states_total": len(states) if states else 1, "rows": 0}
+        queue.update(job_id, job)
+        store.save(job_id, job)
+
+        logger.info(f"Starting scraper for Job ID: {job_id}, State: {state}, City: {city_filter}")
+
+        # States scraped recently answer a city filter from their stored rows; only the rest are scraped
+        stored = stored_results(states or [state], city_filter) if city_filter else {}
+
+        # Call the actual scraper function; the report records which engine served each URL
+        fetch_report = {}
+        if stored:
+            fetch_report["served_from_store"] = [name for name in states or [state] if name in stored]
+        if states:
+            def progress(state_name, state_results):
+                # Published through the queue so /job/<id>/events can push it to the browser
+                job["progress"]["states_done"] += 1
+                job["progress"]["rows"] += len(state_results or [])
+                queue.update(job_id, job)
+
+            for state_name in fetch_report.get("served_from_store", []):
+                progress(state_name, stored[state_name])
+            remaining = [name for name in states if name not in stored]
+            scraped = {}
+            if remaining:
+                scraped = scrape_states(remaining, city_filter=city_filter, report=fetch_report, progress=progress)
+            # Failed states stay missing from the results, as they do for scrape_states()
+            results_by_state = {name: stored[name] if name in stored else scraped[name]
+                                for name in states if name in stored or name in scraped}
+            results_list = [
+                dict(item, state=state_name)
+                for state_name, state_results in results_by_state.items()
+                for item in state_results
+            ]
+            logger.info(f"Job {job_id} scraped {len(results_by_state)}/{len(states)} states "
+                        f"in {fetch_report.get('elapsed')}s, failed: {fetch_report.get('failed_states')}")
+        elif stored:
+            results_list = stored[state]
+            logger.info(f"Job {job_id} answered from the stored rows of {state}")
+        else:
+            # Background refreshes check the page with the server even if the cached copy is within its TTL
+            results_list = scrape_geonames_postcodes(state, city_filter=city_filter, report=fetch_report,
+                                                     revalidate=bool(payload.get("refresh")))
+            logger.info(f"Job {job_id} pages served by: "
+                        f"{[(f['url'], f['engine']) for f in fetch_report.get('fetches', []) if not f['escalated']]}"
+                        + (f", latency saved: {fetch_report['latency_saved']}s"
+                           if "latency_saved" in fetch_report else ""))
+        job["fetch_report"] = fetch_report
+        job["changes"] = summarize_changes(fetch_report)
+
+        # Check if results_list is None or empty and provide detailed logging
+        if results_list is None:
+            logger.warning(f"Scraper returned None for state: {state}, city: {city}")
+            results_list = []
+        elif len(results_list) == 0:
+            logger.warning(f"Scraper returned empty list for state: {state}, city: {city}")
+        else:
+            logger.info(f"Scraper returned {len(results_list)} results for state: {state}, city: {city}")
+
+        # Format the results for our application with renamed fields
+        formatted_results = format_results(results_list)
+
+        # Update the job with results; the full list is stored once, apart from the job metadata
+        job["progress"].update(states_done=job["progress"]["states_total"], rows=len(formatted_results))
+        results = formatted_results
+        job["results_count"] = len(formatted_results)
+        job["preview"] = formatted_results[:5] if formatted_results else []
+        job["status"] = COMPLETED
+        job["message"] = completion_message(state, city, len(formatted_results))
+
+        # Get the count of database entries after scraping
+        try:
+            job["db_entries"] = count_postcodes()
+        except Exception as e:
+            logger.error(f"Error getting database count: {e}")
+            job["db_entries"] = 0
+
+        logger.info(f"Job {job_id} completed. Found {len(formatted_results)} postcodes. HTTP pool: {pool_stats()}")
+
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+
+        job["status"] = FAILED
+        job["message"] = str(e)
+        job["error_details"] = traceback.format_exc()
+
+    # Per-stage timings are stored with the job; the histograms go to /metrics
+    job["timings"] = finish_job_timings()
+    try:
+        flush_metrics()
+    except Exception as e:
+        logger.error(f"Failed to write stage metrics: {e}")
+
+    # A job cancelled while it was finishing keeps its cancelled status
+    if queue.finish(job_id, job["status"], job):
+        try:
+            store.save_now(job_id, job, results=results)
+        except Exception as e:
+            # Retried by the store's flusher, which writes the results once the row is in
+            logger.error(f"Failed to store job {job_id}, retrying in the background: {e}")
+            store.save(job_id, job, results=results)
+
+
+def record_cancelled(queue, job_id):
+    """Marks a job stopped by its worker being terminated as cancelled, locally and in Supabase."""
+    queue.mark_cancelled(job_id)
+    job = queue.get(job_id)
+    if job is not None:
+        job["status"] = CANCELLED
+        job["message"] = "Cancelled"
+        get_job_store().save(job_id, job)
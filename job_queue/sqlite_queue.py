@@ -0,0 +1,235 @@
+"""
+SQLite-backed job queue.
+
+The database runs in WAL mode so the web process can read job status while
+worker processes write. Claims and enqueues use BEGIN IMMEDIATE, which takes the
+write lock up front, so two workers can never claim the same job.
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from job_queue.base import (
+    JobQueue, QueueFull, PENDING, RUNNING, COMPLETED, FAILED, CANCELLED, CANCELLING, DETACHED,
+)
+from sqlite_db import SQLiteFile
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    data TEXT NOT NULL,
+    worker INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, priority DESC, enqueued_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Columns added after the first release, applied to existing queue files on open
+MIGRATIONS = {
+    "dedupe_key": "ALTER TABLE jobs ADD COLUMN dedupe_key TEXT",
+    "version": "ALTER TABLE jobs ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+    # Requests waiting on the job: 1 plus those coalesced into it while in flight
+    "requesters": "ALTER TABLE jobs ADD COLUMN requesters INTEGER NOT NULL DEFAULT 1",
+}
+DEDUPE_INDEX = "CREATE INDEX IF NOT EXISTS jobs_by_dedupe_key ON jobs (dedupe_key, status)"
+FINISHED_INDEX = "CREATE INDEX IF NOT EXISTS jobs_by_finished_at ON jobs (status, finished_at)"
+
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue stored in a local SQLite file, shared by every process on the host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = SQLiteFile(path, SCHEMA)
+        self._db.migrate("jobs", MIGRATIONS)
+        self._db.connection().execute(DEDUPE_INDEX)
+        self._db.connection().execute(FINISHED_INDEX)
+
+    def enqueue(self, job_id, job, payload, priority=0, max_pending=None, dedupe_key=None, reuse_within=0):
+        with self._db.transaction() as db:
+            if dedupe_key is not None:
+                existing = self._find_duplicate(db, dedupe_key, reuse_within)
+                if existing is not None:
+                    counter = "coalesced_in_flight" if existing["status"] in (PENDING, RUNNING) else "coalesced_fresh"
+                    self._increment(db, counter)
+                    if existing["status"] in (PENDING, RUNNING):
+                        db.execute("UPDATE jobs SET requesters = requesters + 1 WHERE id = ?", (existing["id"],))
+                    if existing["status"] == PENDING:
+                        # A later, more urgent request (e.g. a user joining a background refresh)
+                        # moves the shared job up
+                        db.execute("UPDATE jobs SET version = version + 1, priority = ? "
+                                   "WHERE id = ? AND priority < ?", (priority, existing["id"], priority))
+                    position = self._position(db, existing["id"]) if existing["status"] == PENDING else None
+                    return existing["id"], position
+                self._increment(db, "coalesce_misses")
+
+            pending = db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (PENDING,)).fetchone()[0]
+            if max_pending is not None and pending >= max_pending:
+                raise QueueFull(pending)
+            db.execute(
+                "INSERT INTO jobs (id, status, priority, payload, data, enqueued_at, dedupe_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, PENDING, priority, json.dumps(payload), json.dumps(job), time.time(), dedupe_key),
+            )
+            return job_id, self._position(db, job_id)
+
+    def record_finished(self, job_id, job, payload, dedupe_key=None):
+        now = time.time()
+        self._db.connection().execute(
+            "INSERT INTO jobs (id, status, payload, data, enqueued_at, started_at, finished_at, dedupe_key) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, COMPLETED, json.dumps(payload), json.dumps(job), now, now, now, dedupe_key),
+        )
+
+    @staticmethod
+    def _find_duplicate(db, dedupe_key, reuse_within):
+        """An in-flight job with this key, else one completed within reuse_within seconds."""
+        row = db.execute(
+            "SELECT id, status FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) ORDER BY enqueued_at LIMIT 1",
+            (dedupe_key, PENDING, RUNNING),
+        ).fetchone()
+        if row is None and reuse_within > 0:
+            row = db.execute(
+                "SELECT id, status FROM jobs WHERE dedupe_key = ? AND status = ? AND finished_at >= ? "
+                "ORDER BY finished_at DESC LIMIT 1",
+                (dedupe_key, COMPLETED, time.time() - reuse_within),
+            ).fetchone()
+        return row
+
+    @staticmethod
+    def _increment(db, name):
+        db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def counters(self):
+        rows = self._db.connection().execute("SELECT name, value FROM counters").fetchall()
+        return {row["name"]: row["value"] for row in rows}
+
+    def claim(self, worker):
+        with self._db.transaction() as db:
+            row = db.execute(
+                "SELECT id, payload FROM jobs WHERE status = ? ORDER BY priority DESC, enqueued_at LIMIT 1",
+                (PENDING,),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET version = version + 1, status = ?, worker = ?, started_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, worker, time.time(), row["id"]),
+            )
+            return row["id"], json.loads(row["payload"])
+
+    def update(self, job_id, job):
+        self._db.connection().execute("UPDATE jobs SET version = version + 1, data = ? WHERE id = ?",
+                                   (json.dumps(job), job_id))
+
+    def finish(self, job_id, status, job):
+        cursor = self._db.connection().execute(
+            "UPDATE jobs SET version = version + 1, status = ?, data = ?, finished_at = ? "
+            "WHERE id = ? AND status = ?",
+            (status, json.dumps(job), time.time(), job_id, RUNNING),
+        )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id):
+        with self._db.transaction() as db:
+            row = db.execute("SELECT status, requesters FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row["status"] in (PENDING, RUNNING) and row["requesters"] > 1:
+                db.execute("UPDATE jobs SET requesters = requesters - 1 WHERE id = ?", (job_id,))
+                return DETACHED
+            if row["status"] == PENDING:
+                db.execute("UPDATE jobs SET version = version + 1, status = ?, finished_at = ? WHERE id = ?",
+                           (CANCELLED, time.time(), job_id))
+                return CANCELLED
+            if row["status"] == RUNNING:
+                db.execute("UPDATE jobs SET version = version + 1, cancel_requested = 1 WHERE id = ?", (job_id,))
+                return CANCELLING
+            return row["status"]
+
+    def mark_cancelled(self, job_id):
+        self._db.connection().execute(
+            "UPDATE jobs SET version = version + 1, status = ?, finished_at = ? "
+            "WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, RUNNING),
+        )
+
+    def requeue(self, job_id, max_attempts=None):
+        with self._db.transaction() as db:
+            row = db.execute("SELECT status, attempts, data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row["status"] != RUNNING:
+                return row["status"] if row else None
+            if max_attempts is None or row["attempts"] < max_attempts:
+                db.execute("UPDATE jobs SET version = version + 1, status = ?, worker = NULL, started_at = NULL "
+                           "WHERE id = ?", (PENDING, job_id))
+                return PENDING
+            job = json.loads(row["data"])
+            job["message"] = "The worker running this job exited unexpectedly"
+            db.execute("UPDATE jobs SET version = version + 1, status = ?, data = ?, finished_at = ? WHERE id = ?",
+                       (FAILED, json.dumps(job), time.time(), job_id))
+            return FAILED
+
+    def get(self, job_id):
+        db = self._db.connection()
+        row = db.execute("SELECT status, priority, version, data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = json.loads(row["data"])
+        job["status"] = row["status"]
+        job["priority"] = row["priority"]
+        job["version"] = row["version"]
+        if row["status"] == PENDING:
+            job["queue_position"] = self._position(db, job_id)
+        return job
+
+    def get_version(self, job_id):
+        row = self._db.connection().execute("SELECT version FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["version"] if row else None
+
+    def completed_since(self, since):
+        rows = self._db.connection().execute(
+            "SELECT payload, finished_at FROM jobs WHERE status = ? AND finished_at > ? ORDER BY finished_at",
+            (COMPLETED, since),
+        ).fetchall()
+        watermark = rows[-1]["finished_at"] if rows else since
+        return watermark, [json.loads(row["payload"]) for row in rows]
+
+    def running_jobs(self):
+        rows = self._db.connection().execute(
+            "SELECT id, worker, cancel_requested FROM jobs WHERE status = ?", (RUNNING,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def pending_count(self):
+        return self._db.connection().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    @staticmethod
+    def _position(db, job_id):
+        """1-based position among pending jobs, in claim order."""
+        return db.execute(
+            """
+            SELECT COUNT(*) FROM jobs AS other, jobs AS job
+            WHERE job.id = ? AND other.status = ?
+              AND (other.priority > job.priority
+                   OR (other.priority = job.priority AND other.enqueued_at <= job.enqueued_at))
+            """,
+            (job_id, PENDING),
+        ).fetchone()[0]
@@ -0,0 +1,215 @@
+"""
+Pool of worker processes that run queued scrape jobs.
+
+Each worker is a separate process (so a stuck browser or a crash only takes down
+one job) that claims the next pending job, runs it and goes back to the queue.
+A supervisor thread in the owning process restarts workers that die, returns
+their jobs to the queue, and terminates workers whose job was cancelled.
+
+Run standalone with `python -m job_queue.worker` when JOB_WORKERS_EMBEDDED is off.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import JOB_WORKERS, JOB_POLL_INTERVAL, JOB_MAX_ATTEMPTS, LOG_LEVEL
+from job_queue.queues import get_job_queue
+
+logger = logging.getLogger(__name__)
+
+
+def worker_main(stop_flag, poll_interval):
+    """Entry point of a worker process: claim, run, repeat until stop_flag is set or the parent exits."""
+    logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Imported here so the scraper (and its database client) only load in worker processes
+    from job_queue.runner import run_job
+    from supabase_utils.db_client import warm_reference_cache
+
+    # Every job resolves its country and region ids; load them once for this worker
+    warm_reference_cache()
+
+    queue = get_job_queue()
+    pid = os.getpid()
+    parent = multiprocessing.parent_process()
+    logger.info(f"Worker {pid} started")
+    while not stop_flag.value and parent.is_alive():
+        claimed = queue.claim(pid)
+        if claimed is None:
+            time.sleep(poll_interval)
+            continue
+        job_id, payload = claimed
+        run_job(queue, job_id, payload)
+
+
+class WorkerPool:
+    """A fixed number of worker processes plus the thread that supervises them."""
+
+    def __init__(self, size=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL, max_attempts=JOB_MAX_ATTEMPTS):
+        self.size = max(1, size)
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        # spawn rather than fork: the web process has threads and open sockets a child must not inherit
+        self._context = multiprocessing.get_context("spawn")
+        # A lock-free shared flag: workers may be terminated at any point, which would
+        # leave a multiprocessing.Event's internal lock or condition in a broken state
+        self._stop_flag = self._context.Value("b", 0, lock=False)
+        self._stop = threading.Event()
+        self._processes = []
+        self._supervisor = None
+        self._lock = threading.Lock()
+        self.restarts = 0
+
+    def start(self):
+        with self._lock:
+            if self._supervisor is not None:
+                return
+            self._recover_orphans()
+            self._processes = [self._spawn() for _ in range(self.size)]
+            self._supervisor = threading.Thread(target=self._supervise, name="job-supervisor", daemon=True)
+            self._supervisor.start()
+            logger.info(f"Started {self.size} job workers")
+
+    def _spawn(self):
+        process = self._context.Process(
+            target=worker_main, args=(self._stop_flag, self.poll_interval), name="job-worker", daemon=True
+        )
+        process.start()
+        return process
+
+    def _supervise(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.supervise_once()
+            except Exception as e:
+                logger.error(f"Job supervisor error: {e}", exc_info=True)
+
+    def supervise_once(self):
+        """Handles cancellations and dead workers once."""
+        from job_queue.runner import record_cancelled
+
+        queue = get_job_queue()
+        running = {job["worker"]: job for job in queue.running_jobs()}
+        with self._lock:
+            for index, process in enumerate(self._processes):
+                job = running.get(process.pid)
+                if job and job["cancel_requested"]:
+                    logger.info(f"Cancelling job {job['id']} by stopping worker {process.pid}")
+                    self._terminate(process)
+                    record_cancelled(queue, job["id"])
+                elif process.is_alive():
+                    continue
+                elif job:
+                    status = queue.requeue(job["id"], self.max_attempts)
+                    logger.warning(f"Worker {process.pid} died running job {job['id']}; job is now {status}")
+                if self._stop.is_set():
+                    return
+                self._processes[index] = self._spawn()
+                self.restarts += 1
+
+    def _recover_orphans(self):
+        """Requeues jobs left running by workers that no longer exist (e.g. after a restart)."""
+        queue = get_job_queue()
+        for job in queue.running_jobs():
+            if not _pid_alive(job["worker"]):
+                status = queue.requeue(job["id"], self.max_attempts)
+                logger.info(f"Recovered job {job['id']} from a dead worker; job is now {status}")
+
+    @staticmethod
+    def _terminate(process, timeout=5):
+        process.terminate()
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            alive = sum(1 for process in self._processes if process.is_alive())
+        queue = get_job_queue()
+        return {
+            "workers": self.size,
+            "alive": alive,
+            "restarts": self.restarts,
+            "pending": queue.pending_count(),
+            "running": len(queue.running_jobs()),
+        }
+
+    def shutdown(self, timeout=5):
+        """Stops the workers. Jobs still running are returned to the queue so a restart picks them up."""
+        self._stop_flag.value = 1
+        self._stop.set()
+        if self._supervisor is not None:
+            self._supervisor.join(timeout)
+        queue = get_job_queue()
+        with self._lock:
+            deadline = time.monotonic() + timeout
+            for process in self._processes:
+                process.join(max(0.0, deadline - time.monotonic()))
+            running = {job["worker"]: job for job in queue.running_jobs()}
+            for process in self._processes:
+                if process.is_alive():
+                    self._terminate(process)
+                job = running.get(process.pid)
+                if job:
+                    # Interrupted by shutdown rather than a crash, so it is always retried
+                    queue.requeue(job["id"])
+            self._processes = []
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """Returns the process-wide worker pool (not started)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+        return _pool
+
+
+def start_worker_pool():
+    pool = get_worker_pool()
+    pool.start()
+    return pool
+
+
+def shutdown_worker_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+atexit.register(shutdown_worker_pool)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    pool = start_worker_pool()
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"Job queue: {pool.stats()}")
+    except KeyboardInterrupt:
+        shutdown_worker_pool()
@@ -0,0 +1,179 @@
+"""
+Stage timings ("spans") for scrape jobs and their Prometheus exposition.
+
+Code wraps each stage of a scrape in `with span("parse"):`. Every span is
+recorded in two places:
+- the per-stage summary of the job running in this process, which the runner
+  stores with the job record;
+- process-local histograms.
+
+Job workers are separate processes. Each one adds its histogram deltas to a
+small SQLite file (METRICS_PATH) after every job. /metrics renders the totals
+from that file, so it covers every worker on the host.
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from config import METRICS_PATH
+from sqlite_db import SQLiteFile
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS span_buckets (
+    stage TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (stage, bucket)
+);
+CREATE TABLE IF NOT EXISTS span_totals (
+    stage TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    seconds REAL NOT NULL DEFAULT 0
+);
+"""
+
+_lock = threading.Lock()
+# stage -> [per-bucket counts (last one is +Inf), count, seconds] not yet written to METRICS_PATH
+_pending = {}
+# stage -> {"count", "seconds", "max"} for the job running in this process, or None
+_job_spans = None
+
+
+def observe(stage, seconds):
+    """Records one completed stage."""
+    bucket = next((i for i, bound in enumerate(SPAN_BUCKETS) if seconds <= bound), len(SPAN_BUCKETS))
+    with _lock:
+        entry = _pending.setdefault(stage, [[0] * (len(SPAN_BUCKETS) + 1), 0, 0.0])
+        entry[0][bucket] += 1
+        entry[1] += 1
+        entry[2] += seconds
+        if _job_spans is not None:
+            summary = _job_spans.setdefault(stage, {"count": 0, "seconds": 0.0, "max": 0.0})
+            summary["count"] += 1
+            summary["seconds"] += seconds
+            summary["max"] = max(summary["max"], seconds)
+
+
+@contextmanager
+def span(stage):
+    """Times the enclosed block as one `stage` span, including when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def start_job_timings():
+    """Starts collecting a per-stage summary for the job about to run in this process."""
+    global _job_spans
+    with _lock:
+        _job_spans = {}
+
+
+def finish_job_timings():
+    """
+    Stops collecting and returns the job's summary.
+
+    Returns:
+        dict: {stage: {"count", "seconds", "max"}}, with seconds rounded to milliseconds
+    """
+    global _job_spans
+    with _lock:
+        spans, _job_spans = _job_spans or {}, None
+    return {
+        stage: {"count": s["count"], "seconds": round(s["seconds"], 3), "max": round(s["max"], 3)}
+        for stage, s in sorted(spans.items())
+    }
+
+
+# path -> SQLiteFile, opened once per process
+_files = {}
+
+
+def _metrics_file(path):
+    with _lock:
+        if path not in _files:
+            _files[path] = SQLiteFile(path, SCHEMA)
+        return _files[path]
+
+
+def flush_metrics(path=None):
+    """Adds this process's histogram deltas to the shared metrics file."""
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return
+    try:
+        with _metrics_file(path or METRICS_PATH).transaction() as connection:
+            for stage, (buckets, count, seconds) in pending.items():
+                for bucket, bucket_count in enumerate(buckets):
+                    if bucket_count:
+                        connection.execute(
+                            "INSERT INTO span_buckets (stage, bucket, count) VALUES (?, ?, ?) "
+                            "ON CONFLICT(stage, bucket) DO UPDATE SET count = count + excluded.count",
+                            (stage, bucket, bucket_count),
+                        )
+                connection.execute(
+                    "INSERT INTO span_totals (stage, count, seconds) VALUES (?, ?, ?) "
+                    "ON CONFLICT(stage) DO UPDATE SET count = count + excluded.count, "
+                    "seconds = seconds + excluded.seconds",
+                    (stage, count, seconds),
+                )
+    except Exception:
+        # Put the deltas back so the next flush retries them
+        with _lock:
+            for stage, (buckets, count, seconds) in pending.items():
+                entry = _pending.setdefault(stage, [[0] * (len(SPAN_BUCKETS) + 1), 0, 0.0])
+                entry[0] = [a + b for a, b in zip(entry[0], buckets)]
+                entry[1] += count
+                entry[2] += seconds
+        raise
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def format_metric(name, value, labels=None):
+    return f"{name}{_format_labels(labels)} {value}\n"
+
+
+def format_family(name, kind, help_text, value):
+    """A single-sample metric with its HELP and TYPE lines."""
+    return f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n" + format_metric(name, value)
+
+
+def render_span_histograms(path=None):
+    """Returns the stage histograms of every process in the Prometheus text format."""
+    flush_metrics(path)
+    connection = _metrics_file(path or METRICS_PATH).connection()
+    buckets = connection.execute("SELECT stage, bucket, count FROM span_buckets").fetchall()
+    totals = connection.execute("SELECT stage, count, seconds FROM span_totals ORDER BY stage").fetchall()
+
+    counts = {}
+    for stage, bucket, count in buckets:
+        counts.setdefault(stage, [0] * (len(SPAN_BUCKETS) + 1))[bucket] = count
+
+    lines = [
+        "# HELP scraper_stage_seconds Time spent in each stage of a scrape job.\n",
+        "# TYPE scraper_stage_seconds histogram\n",
+    ]
+    for stage, count, seconds in totals:
+        cumulative = 0
+        for bound, bucket_count in zip(SPAN_BUCKETS + ("+Inf",), counts.get(stage, [])):
+            cumulative += bucket_count
+            lines.append(format_metric("scraper_stage_seconds_bucket", cumulative, {"stage": stage, "le": bound}))
+        lines.append(format_metric("scraper_stage_seconds_sum", round(seconds, 6), {"stage": stage}))
+        lines.append(format_metric("scraper_stage_seconds_count", count, {"stage": stage}))
+    return "".join(lines)
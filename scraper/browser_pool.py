@@ -0,0 +1,237 @@
+"""
+Long-lived Playwright browser pool.
+
+Playwright's sync API objects are bound to the thread that created them, so each
+pool slot is a dedicated thread that owns one Playwright instance and one browser.
+Callers hand work to the pool with run(); the function receives a fresh page in an
+isolated browser context and its return value is passed back to the caller.
+"""
+
+import atexit
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import BROWSER_POOL_SIZE, BROWSER_RECYCLE_AFTER, BROWSER_TASK_TIMEOUT
+from metrics import span
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+class BrowserUnavailableError(RuntimeError):
+    """Raised when no browser engine could be launched."""
+
+
+def is_cloud_environment():
+    return bool(os.environ.get("CI") or os.environ.get("RENDER") or os.environ.get("DOCKER_CONTAINER"))
+
+
+class BrowserPool:
+    """A fixed number of browser-owning worker threads fed from a shared task queue."""
+
+    def __init__(self, size=BROWSER_POOL_SIZE, recycle_after=BROWSER_RECYCLE_AFTER):
+        self.size = max(1, size)
+        self.recycle_after = recycle_after
+        self._tasks = Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._browsers_installed = False
+        self._closed = False
+        self.launches = 0
+        self.pages_served = 0
+
+    def run(self, fn, timeout=BROWSER_TASK_TIMEOUT):
+        """
+        Runs fn(page) on a pooled browser and returns its result.
+        Exceptions raised by fn (or by the browser launch) are re-raised here.
+        """
+        if self._closed:
+            raise BrowserUnavailableError("Browser pool has been shut down")
+        self._start_workers()
+        future = Future()
+        self._tasks.put((fn, future))
+        return future.result(timeout=timeout)
+
+    def shutdown(self):
+        """Closes every browser and stops the worker threads."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._tasks.put(None)
+        for thread in threads:
+            thread.join(timeout=10)
+        print(f"Browser pool shut down after {self.pages_served} pages and {self.launches} launches.")
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "workers": len(self._threads),
+            "queued": self._tasks.qsize(),
+            "launches": self.launches,
+            "pages_served": self.pages_served,
+        }
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self._threads) < self.size:
+                thread = threading.Thread(
+                    target=self._worker,
+                    name=f"browser-pool-{len(self._threads)}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+
+    def _worker(self):
+        playwright = None
+        browser = None
+        served = 0
+
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            fn, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                if playwright is None:
+                    try:
+                        from playwright.sync_api import sync_playwright
+                    except ImportError as e:
+                        raise BrowserUnavailableError(f"Playwright is not installed ({e})")
+                    playwright = sync_playwright().start()
+
+                # Health check and recycling happen before each task
+                if browser is not None and (not browser.is_connected() or served >= self.recycle_after):
+                    print(f"Recycling browser after {served} pages (connected: {browser.is_connected()})")
+                    self._close_browser(browser)
+                    browser = None
+                if browser is None:
+                    with span("browser_launch"):
+                        browser = self._launch(playwright)
+                    served = 0
+
+                context = browser.new_context(
+                    viewport={"width": 1920, "height": 1080},
+                    user_agent=USER_AGENT
+                )
+                try:
+                    result = fn(context.new_page())
+                finally:
+                    context.close()
+
+                served += 1
+                self.pages_served += 1
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+                # A crashed browser is replaced on the next task
+                if browser is not None and not browser.is_connected():
+                    browser = None
+
+        self._close_browser(browser)
+        if playwright is not None:
+            try:
+                playwright.stop()
+            except Exception as e:
+                print(f"Error stopping Playwright: {e}")
+
+    def _ensure_browsers_installed(self):
+        """Installs Chromium once per process in cloud environments."""
+        with self._lock:
+            if self._browsers_installed or not is_cloud_environment():
+                return
+            self._browsers_installed = True
+        try:
+            print("Detected cloud environment, ensuring browsers are installed...")
+            subprocess.run(
+                [sys.executable, "-m", "playwright", "install", "chromium"],
+                check=True,
+                capture_output=True
+            )
+            print("Successfully installed Chromium browser")
+        except subprocess.CalledProcessError as e:
+            print(f"Failed to install browsers: {e.stderr.decode()}")
+
+    def _launch(self, playwright):
+        """Launches Chromium with retries, then falls back to Firefox and WebKit."""
+        self._ensure_browsers_installed()
+
+        launch_options = {"headless": True}
+        if is_cloud_environment():
+            launch_options["args"] = [
+                "--no-sandbox",
+                "--disable-setuid-sandbox",
+                "--disable-dev-shm-usage",
+                "--disable-accelerated-2d-canvas",
+                "--no-first-run",
+                "--no-zygote",
+                "--single-process",
+                "--disable-gpu"
+            ]
+
+        max_retries = 3
+        for attempt in range(1, max_retries + 1):
+            try:
+                print(f"Attempting browser launch ({attempt}/{max_retries})...")
+                browser = playwright.chromium.launch(**launch_options)
+                self.launches += 1
+                return browser
+            except Exception as e:
+                print(f"Browser launch failed: {str(e)}")
+                if attempt < max_retries:
+                    time.sleep(5)
+
+        for engine in (playwright.firefox, playwright.webkit):
+            try:
+                browser = engine.launch(**launch_options)
+                self.launches += 1
+                return browser
+            except Exception as e:
+                print(f"{engine.name} launch failed: {str(e)}")
+
+        raise BrowserUnavailableError("All browser engines failed to launch")
+
+    @staticmethod
+    def _close_browser(browser):
+        if browser is None:
+            return
+        try:
+            browser.close()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Returns the process-wide browser pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
+
+
+def shutdown_browser_pool():
+    """Shuts down the process-wide pool if one was started."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+atexit.register(shutdown_browser_pool)
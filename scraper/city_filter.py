@@ -0,0 +1,124 @@
+"""
+City filtering on normalised place-name keys.
+
+Place names and the requested city are compared by key: casefolded, accents
+stripped, apostrophes dropped and other punctuation collapsed to single spaces.
+So "St. Mary's", "st marys" and "ST-MARYS" all give the same key. Four modes
+are supported:
+- contains (the default, the original substring behaviour);
+- exact;
+- prefix;
+- fuzzy, which allows up to CITY_FUZZY_MAX_DISTANCE typos, counting a swap of two
+  neighbouring letters as one edit.
+
+A filter is applied as its own stage after parsing. Many postcodes share a place
+name, so each distinct name is normalised and matched once per page.
+"""
+
+import os
+import re
+import sys
+import unicodedata
+from functools import lru_cache
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import CITY_FUZZY_MAX_DISTANCE
+
+MATCH_MODES = ("contains", "exact", "prefix", "fuzzy")
+DEFAULT_MATCH_MODE = "contains"
+
+_APOSTROPHES = re.compile(r"['’`]")
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+@lru_cache(maxsize=65536)
+def normalize_place(name):
+    """Returns the key a place name is matched by, e.g. "Saint-Étienne's" -> "saint etiennes"."""
+    if not name:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _SEPARATORS.sub(" ", _APOSTROPHES.sub("", stripped.casefold())).strip()
+
+
+def edit_distance_within(a, b, limit):
+    """
+    Returns whether a and b are at most `limit` edits apart (insertions, deletions,
+    substitutions and swaps of neighbouring characters). Stops as soon as every
+    alignment exceeds the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if a == b:
+        return True
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return False
+        previous2, previous = previous, current
+    return previous[len(b)] <= limit
+
+
+class CityFilter:
+    """Matches place names against a requested city in one of MATCH_MODES."""
+
+    def __init__(self, city, mode=DEFAULT_MATCH_MODE, max_distance=None):
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown city match mode '{mode}'; use one of {', '.join(MATCH_MODES)}")
+        self.city = city
+        self.mode = mode
+        self.key = normalize_place(city)
+        if max_distance is None:
+            # Short names tolerate fewer typos, or almost everything would match
+            max_distance = min(CITY_FUZZY_MAX_DISTANCE, max(1, len(self.key) // 4))
+        self.max_distance = max_distance
+
+    def __str__(self):
+        return self.city if self.mode == DEFAULT_MATCH_MODE else f"{self.city} ({self.mode})"
+
+    def matches_key(self, key):
+        """Whether an already normalised place name matches."""
+        if self.mode == "contains":
+            return self.key in key
+        if self.mode == "exact":
+            return key == self.key
+        if self.mode == "prefix":
+            return key.startswith(self.key)
+        return edit_distance_within(self.key, key, self.max_distance)
+
+    def matches(self, place_name):
+        return self.matches_key(normalize_place(place_name))
+
+    def apply(self, rows):
+        """Returns the rows whose place_name matches, deciding once per distinct place name."""
+        decisions = {}
+        kept = []
+        for row in rows:
+            place = row["place_name"]
+            keep = decisions.get(place)
+            if keep is None:
+                keep = decisions[place] = self.matches(place)
+            if keep:
+                kept.append(row)
+        return kept
+
+
+def as_city_filter(city_filter, mode=None):
+    """
+    Accepts a CityFilter, a city name (matched with `mode`, contains by default) or None.
+
+    Returns:
+        CityFilter or None
+    """
+    if city_filter is None or isinstance(city_filter, CityFilter):
+        return city_filter
+    if not str(city_filter).strip():
+        return None
+    return CityFilter(city_filter, mode or DEFAULT_MATCH_MODE)
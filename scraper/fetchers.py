@@ -0,0 +1,238 @@
+"""
+Pluggable page fetchers used by the geonames scraper.
+
+Every fetcher exposes a `name` and a `fetch(url)` method returning a FetchResult.
+Callers that rate-limit requests pass a `before_request` callback, which a fetcher
+calls before every request it sends to the server, retries included.
+The scraper tries them in order (plain HTTP first, then a pooled browser) and only
+escalates when a page looks blocked or is missing the postcode table.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR
+from http_pool import get_http_client
+from metrics import span
+from scraper.browser_pool import get_browser_pool, USER_AGENT
+from scraper.page_cache import get_page_cache
+
+logger = logging.getLogger(__name__)
+
+class FetchResult:
+    """The outcome of fetching one URL with one engine."""
+
+    def __init__(self, url, engine, html=None, status_code=None, elapsed=0.0, error=None,
+                 etag=None, last_modified=None, from_cache=False, content_hash=None, fetched_at=None):
+        self.url = url
+        self.engine = engine
+        self.html = html
+        self.status_code = status_code
+        self.elapsed = elapsed
+        self.error = error
+        self.etag = etag
+        self.last_modified = last_modified
+        self.from_cache = from_cache
+        # Hash of the body in the page cache; set once the body is stored, or taken from the cached entry
+        self.content_hash = content_hash
+        # When the server was last asked for the page: now, unless the body came from the cache within its TTL
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+
+    @property
+    def ok(self):
+        return self.html is not None and self.error is None
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "engine": self.engine,
+            "status_code": self.status_code,
+            "elapsed": round(self.elapsed, 3),
+            "error": self.error,
+            "from_cache": self.from_cache,
+        }
+
+
+class Fetcher:
+    """Base class for fetch engines."""
+
+    name = "base"
+
+    def fetch(self, url, revalidate=False, before_request=None):
+        """
+        Fetches a page; revalidate=True checks a cached page with the server even within its TTL.
+        before_request(), if given, is called (and may block) before each request sent to the server.
+        """
+        raise NotImplementedError
+
+
+# Responses worth retrying for an idempotent GET
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Longest Retry-After (seconds) honoured before giving up on a page
+MAX_RETRY_AFTER = 30
+
+
+class HttpFetcher(Fetcher):
+    """Fetches pages over the process-wide keep-alive connection pool."""
+
+    name = "http"
+
+    def __init__(self):
+        # httpx negotiates gzip/deflate and decodes the body transparently
+        self.client = get_http_client(
+            headers={
+                "User-Agent": USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml",
+                "Accept-Encoding": "gzip, deflate",
+            },
+            follow_redirects=True,
+        )
+
+    def _get(self, url, headers, before_request=None):
+        """GETs a page, retrying retryable statuses with exponential backoff (connection errors are retried by the pool)."""
+        attempt = 0
+        while True:
+            if before_request is not None:
+                before_request()
+            response = self.client.get(url, headers=headers)
+            if response.status_code not in RETRY_STATUSES or attempt >= HTTP_MAX_RETRIES:
+                return response
+            attempt += 1
+            delay = HTTP_BACKOFF_FACTOR * 2 ** (attempt - 1)
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                if int(retry_after) > MAX_RETRY_AFTER:
+                    return response
+                delay = max(delay, int(retry_after))
+            time.sleep(delay)
+
+    def fetch(self, url, revalidate=False, before_request=None):
+        start = time.perf_counter()
+        cache = get_page_cache()
+        entry = cache.get(url)
+
+        # Within the TTL the cached body is used without touching the network
+        if cache.is_fresh(entry) and not revalidate:
+            html = cache.load_body(entry)
+            if html is not None:
+                return FetchResult(url, self.name, html=html, status_code=200, from_cache=True,
+                                   elapsed=time.perf_counter() - start,
+                                   etag=entry.get("etag"), last_modified=entry.get("last_modified"),
+                                   content_hash=entry.get("body_hash"), fetched_at=entry.get("fetched_at"))
+
+        try:
+            with span("http_fetch"):
+                response = self._get(url, cache.conditional_headers(entry), before_request)
+            elapsed = time.perf_counter() - start
+            if response.status_code == 304 and entry is not None:
+                html = cache.load_body(entry)
+                if html is not None:
+                    cache.touch(url)
+                    return FetchResult(url, self.name, html=html, status_code=304, elapsed=elapsed, from_cache=True,
+                                       etag=entry.get("etag"), last_modified=entry.get("last_modified"),
+                                       content_hash=entry.get("body_hash"))
+            if response.status_code != 200:
+                return FetchResult(url, self.name, status_code=response.status_code, elapsed=elapsed,
+                                   error=f"Status code {response.status_code}")
+            return FetchResult(url, self.name, html=response.text, status_code=200, elapsed=elapsed,
+                               etag=response.headers.get("ETag"),
+                               last_modified=response.headers.get("Last-Modified"))
+        except httpx.HTTPError as e:
+            return FetchResult(url, self.name, elapsed=time.perf_counter() - start, error=str(e))
+
+
+class BrowserFetcher(Fetcher):
+    """Fetches pages by rendering them in a pooled Playwright browser."""
+
+    name = "browser"
+
+    def __init__(self):
+        # Running average of browser fetch time, used to estimate latency saved by HTTP.
+        # None until this process has timed a browser fetch
+        self.average_elapsed = None
+        self._lock = threading.Lock()
+
+    def fetch(self, url, revalidate=False, before_request=None):
+        # Browser loads never use the page cache
+        start = time.perf_counter()
+        try:
+            html = get_browser_pool().run(lambda page: self._load(page, url, before_request))
+        except Exception as e:
+            return FetchResult(url, self.name, elapsed=time.perf_counter() - start, error=str(e))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if self.average_elapsed is None:
+                self.average_elapsed = elapsed
+            else:
+                self.average_elapsed = 0.8 * self.average_elapsed + 0.2 * elapsed
+        return FetchResult(url, self.name, html=html, status_code=200, elapsed=elapsed)
+
+    @staticmethod
+    def _load(page, url, before_request=None):
+        # I navigate to the URL with retry logic
+        for nav_attempt in range(3):
+            if before_request is not None:
+                before_request()
+            try:
+                with span("navigation"):
+                    page.goto(url, timeout=60000, wait_until="domcontentloaded")
+                break
+            except Exception as nav_error:
+                print(f"Navigation attempt {nav_attempt + 1} failed: {nav_error}")
+                if nav_attempt < 2:
+                    print("I'll retry navigation...")
+                    time.sleep(2)
+                else:
+                    raise
+
+        # I wait for the page to stabilize
+        with span("networkidle_wait"):
+            page.wait_for_load_state("networkidle", timeout=30000)
+
+        with span("html_snapshot"):
+            html_content = page.content()
+
+        # With LOG_LEVEL=DEBUG I keep the page source and a screenshot of escalated fetches
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Page title: {page.title()}, current URL: {page.url}")
+            debug_dir = "debug_output"
+            os.makedirs(debug_dir, exist_ok=True)
+            with open(f"{debug_dir}/page_source_browser.html", "w", encoding="utf-8") as f:
+                f.write(html_content)
+            page.screenshot(path=f"{debug_dir}/screenshot_browser.png")
+            logger.debug(f"Page source and screenshot saved to '{debug_dir}/'")
+        return html_content
+
+
+_http_fetcher = None
+_browser_fetcher = None
+_fetchers_lock = threading.Lock()
+
+
+def get_http_fetcher():
+    """Returns the process-wide HTTP fetcher so its connection pool is reused."""
+    global _http_fetcher
+    with _fetchers_lock:
+        if _http_fetcher is None:
+            _http_fetcher = HttpFetcher()
+        return _http_fetcher
+
+
+def get_browser_fetcher():
+    """Returns the process-wide browser fetcher."""
+    global _browser_fetcher
+    with _fetchers_lock:
+        if _browser_fetcher is None:
+            _browser_fetcher = BrowserFetcher()
+        return _browser_fetcher
+
+
+def get_default_fetchers():
+    """The escalation order used by the scraper: plain HTTP first, browser second."""
+    return [get_http_fetcher(), get_browser_fetcher()]
@@ -0,0 +1,123 @@
+"""
+When each state was last scraped successfully, and which rows that scrape produced.
+
+A state is recorded after a complete, error-free write of its whole page (or
+after a re-fetched page turned out identical to that write). The record names
+the page body hash, whose parsed rows are kept in the page cache. Together they
+let a city-filtered job be answered from the state's rows instead of scraping.
+Records also hold when the page was last fetched from the server, when its
+content last changed, and how long and how many requests the scrape took; the
+background refresh (job_queue.refresh) uses them to pick the stalest states.
+Records live in a local SQLite file shared by the web process and job workers,
+like the page cache they point into.
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import FRESHNESS_PATH, STATE_DATA_MAX_AGE
+from scraper.page_cache import get_page_cache
+from sqlite_db import SQLiteFile
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state_freshness (
+    state TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    success_at REAL NOT NULL
+);
+"""
+
+# Columns added after the first release, applied to existing files on open
+MIGRATIONS = {
+    "fetched_at": "ALTER TABLE state_freshness ADD COLUMN fetched_at REAL",
+    "changed_at": "ALTER TABLE state_freshness ADD COLUMN changed_at REAL",
+    "duration": "ALTER TABLE state_freshness ADD COLUMN duration REAL",
+    "requests": "ALTER TABLE state_freshness ADD COLUMN requests INTEGER",
+}
+
+
+class StateFreshness:
+    """Per-state record of the last successful scrape: page, body hash, row count, timings and cost."""
+
+    def __init__(self, path=FRESHNESS_PATH):
+        self.path = path
+        self._db = SQLiteFile(path, SCHEMA)
+        self._db.migrate("state_freshness", MIGRATIONS)
+
+    def record_success(self, state, url, content_hash, row_count, fetched_at=None, duration=None, requests=None):
+        """
+        Records a complete scrape of a state.
+
+        Args:
+            fetched_at: When the page was last fetched from (or revalidated with) the server;
+                defaults to now. A page served from the cache carries the time of an earlier
+                fetch, so a recorded fetch time never moves back
+            duration: Seconds the fetch and processing took
+            requests: Requests sent to the server for the page
+        """
+        now = time.time()
+        self._db.connection().execute(
+            """
+            INSERT INTO state_freshness
+                (state, url, content_hash, row_count, success_at, fetched_at, changed_at, duration, requests)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (state) DO UPDATE SET
+                url = excluded.url, content_hash = excluded.content_hash, row_count = excluded.row_count,
+                success_at = excluded.success_at,
+                fetched_at = MAX(COALESCE(state_freshness.fetched_at, 0), excluded.fetched_at),
+                changed_at = CASE WHEN state_freshness.content_hash = excluded.content_hash
+                                  THEN state_freshness.changed_at ELSE excluded.changed_at END,
+                duration = excluded.duration, requests = excluded.requests
+            """,
+            (state, url, content_hash, row_count, now, fetched_at or now, now, duration, requests),
+        )
+
+    def get(self, state):
+        """
+        Returns {"state", "url", "content_hash", "row_count", "success_at", "fetched_at", "changed_at",
+        "duration", "requests"}, or None if the state was never scraped.
+        """
+        row = self._db.connection().execute("SELECT * FROM state_freshness WHERE state = ?", (state,)).fetchone()
+        return dict(row) if row else None
+
+    def all(self):
+        """Returns the records of every scraped state, keyed by state name."""
+        rows = self._db.connection().execute("SELECT * FROM state_freshness").fetchall()
+        return {row["state"]: dict(row) for row in rows}
+
+    @staticmethod
+    def age(record, now=None):
+        """Seconds since the record's page was last fetched from the server."""
+        # Records written before fetched_at was tracked only have their success time
+        return (now or time.time()) - (record.get("fetched_at") or record["success_at"])
+
+    def stored_rows(self, state, max_age=STATE_DATA_MAX_AGE):
+        """
+        Returns the rows of the state's last successful scrape if its page was fetched less
+        than max_age seconds ago and its rows are still cached, else None.
+        """
+        record = self.get(state)
+        if record is None or max_age <= 0 or self.age(record) >= max_age:
+            return None
+        rows = get_page_cache().load_rows(record["content_hash"])
+        if rows is None or len(rows) != record["row_count"]:
+            return None
+        return rows
+
+
+_freshness = None
+_freshness_lock = threading.Lock()
+
+
+def get_state_freshness():
+    """Returns the process-wide freshness records."""
+    global _freshness
+    with _freshness_lock:
+        if _freshness is None:
+            _freshness = StateFreshness()
+        return _freshness
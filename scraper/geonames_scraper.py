@@ -1,12 +1,22 @@
+import logging
 import time
 import os
 import sys
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
 
 # Add parent directory to sys.path to allow importing supabase_utils
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from supabase_utils.db_client import insert_and_get_id, insert_postcode_data, get_id_by_column
+from config import POSTCODE_WRITE_MODE
+from supabase_utils.db_client import (
+    insert_postcodes_bulk, sync_region_postcodes, get_or_create_country_id, get_or_create_region_id,
+)
+from scraper.fetchers import get_default_fetchers, get_http_fetcher, get_browser_fetcher
+from scraper.table_parser import find_restable_start, iter_postcodes
+from scraper.page_cache import get_page_cache
+from scraper.freshness import get_state_freshness
+from scraper.city_filter import as_city_filter
+from metrics import span
+
+logger = logging.getLogger(__name__)
 
 # --- State Mapping ---
 # (Add more states as needed)
@@ -65,7 +75,7 @@ STATE_MAP = {
 
 
 def check_for_protection(page):
-    """Checks if the current page seems to be a protection/captcha page."""
+    """Checks if a page (Playwright page or HTML string) seems to be a protection/captcha page."""
     protection_indicators = [
         "captcha",
         "security check",
@@ -73,278 +83,243 @@ def check_for_protection(page):
         "cloudflare"
     ]
     
-    page_text = page.content().lower()
+    page_text = (page if isinstance(page, str) else page.content()).lower()
     for indicator in protection_indicators:
         if indicator in page_text:
             return True
     return False
 
-def find_postcode_table(html_content):
-    """Finds the table containing postal codes in the HTML content."""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    tables = soup.find_all('table')
-    print(f"Found {len(tables)} tables on the page.")
+def ensure_region(state, state_abbr):
+    """
+    Gets or creates the USA country row and the region row for a state.
+    
+    Returns:
+        int: The region ID, or None if it could not be found or created
+    """
+    country_id = get_or_create_country_id("USA", "US")
+    if country_id is None:
+        print("I failed to create the country entry. I'm aborting.")
+        return None
     
-    for index, table in enumerate(tables):
-        print(f"\nAnalyzing table {index + 1}:")
+    region_id = get_or_create_region_id(state, country_id, state_abbr)
+    if region_id is None:
+        print("Failed to create region entry. Aborting.")
+        return None
+    return region_id
+
+def save_postcodes(results, region_id, complete=True):
+    """
+    Writes scraped postcodes for a region.
+    In "sync" mode (the default) only the difference from the stored rows is written;
+    in "insert" mode every row is sent as a batched insert that skips existing codes.
+    
+    Args:
+        results (list): Dictionaries with 'code' and 'place_name'
+        region_id (int): The region the postcodes belong to
+        complete (bool): Whether results cover the whole region, so missing codes may be deleted
         
-        # Try to find a table with a specific class
-        if 'restable' in table.get('class', []):
-            print("Found table with 'restable' class.")
-            return table
+    Returns:
+        dict: Change summary; always includes an 'errors' count
+    """
+    if POSTCODE_WRITE_MODE == "sync":
+        return sync_region_postcodes(region_id, results, delete_missing=complete)
+    
+    rows = [
+        {"code": item["code"], "place_name": item["place_name"], "region_id": region_id}
+        for item in results
+    ]
+    summary = insert_postcodes_bulk(rows)
+    return {k: v for k, v in summary.items() if k != "batches"}
+
+def needs_escalation(html_content):
+    """A fetched page is escalated to the next engine if it is blocked or has no postcode table."""
+    return check_for_protection(html_content) or find_restable_start(html_content) == -1
+
+def fetch_postcode_page(urls, fetchers, report, revalidate=False, before_request=None):
+    """
+    Fetches the first candidate URL that yields a usable postcode page.
+    Each URL is tried with every fetcher in order; later fetchers are only used
+    when the earlier ones fail or return a page that needs escalation.
+    
+    Args:
+        urls (list): Candidate URLs, tried in order
+        fetchers (list): Fetcher instances in escalation order
+        report (dict): Per-job report; fetch attempts are appended to report["fetches"]
+        revalidate (bool): Check cached pages with the server even within PAGE_CACHE_TTL
+        before_request (callable, optional): Called before every request sent to the server,
+            retries and browser loads included; the crawl scheduler's rate limit
         
-        # Additional checks can be added here
-            
-    print("\nCould not find a suitable postcode table.")
+    Returns:
+        FetchResult: The successful fetch, or None if no URL produced a postcode table
+    """
+    fetches = report.setdefault("fetches", [])
+    for url in urls:
+        logger.debug(f"Trying URL: {url}")
+        for fetcher in fetchers:
+            result = fetcher.fetch(url, revalidate=revalidate, before_request=before_request)
+            escalate = not result.ok or needs_escalation(result.html)
+            # The last engine's page is used as long as it has the table at all
+            if escalate and fetcher is fetchers[-1] and result.ok and find_restable_start(result.html) != -1:
+                escalate = False
+            attempt = result.to_dict()
+            attempt["escalated"] = escalate
+            fetches.append(attempt)
+            logger.debug(f"Fetched {url} with {result.engine} in {result.elapsed:.2f}s"
+                         + (f" ({result.error})" if result.error else "")
+                         + (" - escalating" if escalate else ""))
+            if not escalate:
+                # Downloaded pages are cached with their validators for conditional GETs. Cache hits keep
+                # their entry as it is, so the TTL still counts from the last time the server was asked
+                if not result.from_cache:
+                    result.content_hash = get_page_cache().store(url, result.html, result.etag, result.last_modified)
+                report["engine"] = result.engine
+                browser_average = get_browser_fetcher().average_elapsed
+                if result.engine != "browser" and not result.from_cache and browser_average is not None:
+                    # Compare a download against what a browser load has been costing; cache hits
+                    # would not have needed a browser either
+                    saved = browser_average - result.elapsed
+                    report["latency_saved"] = round(report.get("latency_saved", 0.0) + max(saved, 0.0), 3)
+                return result
     return None
 
-def scrape_geonames_postcodes(state, city_filter=None):
+def get_state_urls(state):
+    """
+    Returns the candidate geonames URLs for a state, best first.
+    
+    Returns:
+        tuple: (state_abbr, urls), or (None, []) if the state is unknown
+    """
+    state_details = STATE_MAP.get(state)
+    if not state_details:
+        print(f"Error: State '{state}' not found in STATE_MAP.")
+        return None, []
+    
+    state_abbr = state_details["abbr"]
+    state_slug = state_details["slug"]
+    return state_abbr, [
+        f"https://www.geonames.org/postal-codes/US/{state_abbr}/{state_slug}.html",
+        f"https://www.geonames.org/postal-codes/US/{state_abbr}/"
+    ]
+
+def record_state_success(state, page, row_count, report, started):
+    """
+    Records that the state's page was fully stored (see scraper.freshness): when the page
+    was last fetched from the server, its hash and row count, how long the scrape took
+    and how many requests it sent.
+    """
+    # Pages served from the cache within their TTL cost no request; 304 revalidations do
+    requests = sum(1 for attempt in report.get("fetches", [])
+                   if not (attempt["from_cache"] and attempt["status_code"] == 200))
+    get_state_freshness().record_success(
+        state, page.url, page.content_hash, row_count, fetched_at=page.fetched_at,
+        duration=round(page.elapsed + time.perf_counter() - started, 3), requests=requests,
+    )
+
+def process_postcode_page(state, page, city_filter=None, report=None):
+    """
+    Parses a fetched postcode page and stores its rows for the state.
+    If the page body is identical to the last fully written run, the cached rows
+    are returned and both parsing and database writes are skipped.
+    
+    Args:
+        state (str): The state the page belongs to
+        page (FetchResult): The fetched page
+        city_filter (str or CityFilter, optional): Filter results by city name; a plain
+            string keeps places whose name contains it
+        report (dict, optional): Per-job report, receives the write summary
+        
+    Returns:
+        list: List of dictionaries with postcode data, or None if the table or region is missing
+    """
+    if report is None:
+        report = {}
+    started = time.perf_counter()
+    state_abbr = STATE_MAP[state]["abbr"]
+    cache = get_page_cache()
+    city = as_city_filter(city_filter)
+    
+    if page.content_hash and cache.is_unchanged(page.url, page.content_hash):
+        rows = cache.load_rows(page.content_hash)
+        if rows is not None:
+            print(f"\nPage for {state} is unchanged since the last successful run. Skipping parse and database writes.")
+            report["page_unchanged"] = True
+            record_state_success(state, page, len(rows), report, started)
+            if city is None:
+                return rows
+            with span("filter"):
+                return city.apply(rows)
+    
+    if find_restable_start(page.html) == -1:
+        print("\nI couldn't find the postal code table in the page.")
+        return None
+        
+    print(f"\nPostcode table found for {state}. Processing data...")
+    
+    # I get or create the country and region
+    with span("db_lookup"):
+        region_id = ensure_region(state, state_abbr)
+    if region_id is None:
+        return None
+    
+    # I stream the rows straight out of the restable table
+    with span("parse"):
+        all_rows = [
+            {"code": postcode, "place_name": place_name}
+            for place_name, postcode in iter_postcodes(page.html)
+        ]
+    
+    # Apply city filter if provided
+    results = all_rows
+    if city is not None:
+        with span("filter"):
+            results = city.apply(all_rows)
+    
+    # I write only what changed, in bulk
+    with span("db_write"):
+        summary = save_postcodes(results, region_id, complete=not city)
+    report["changes"] = summary
+    report["page_unchanged"] = False
+    
+    # Only a complete, error-free write of the whole page lets later runs skip it
+    if page.content_hash and not city and summary["errors"] == 0:
+        cache.save_rows(page.content_hash, all_rows)
+        cache.mark_success(page.url, page.content_hash)
+        record_state_success(state, page, len(all_rows), report, started)
+    
+    print(f"\nScraping completed for {state}" + (f" (City: {city_filter})" if city_filter else "") + ":")
+    print(f"Changes written: {summary}")
+    print(f"Total results in list: {len(results)}")
+    
+    return results
+
+def scrape_geonames_postcodes(state, city_filter=None, report=None, fetchers=None, revalidate=False):
     """
     Scrape postal codes from geonames.org for a given US state
     
     Args:
         state (str): The state to scrape postal codes for
-        city_filter (str, optional): Filter results by city name
+        city_filter (str or CityFilter, optional): Filter results by city name
+        report (dict, optional): Filled with per-job details such as which engine served each URL
+        fetchers (list, optional): Fetchers in escalation order, defaults to HTTP then browser
+        revalidate (bool): Check a cached page with the server even within PAGE_CACHE_TTL
         
     Returns:
         list: List of dictionaries with postcode data
     """
+    if report is None:
+        report = {}
     try:
-        # Initialize results list
-        results = []
-        
-        print("I'm initializing Playwright...")
-        from playwright.sync_api import sync_playwright
-        import subprocess
-        import sys
-        
-        # Check if we're in a cloud environment and install browsers if needed
-        if os.environ.get("CI") or os.environ.get("RENDER") or os.environ.get("DOCKER_CONTAINER"):
-            try:
-                print("Detected cloud environment, ensuring browsers are installed...")
-                # Install browsers directly using subprocess
-                subprocess.run(
-                    [sys.executable, "-m", "playwright", "install", "chromium"],
-                    check=True,
-                    capture_output=True
-                )
-                print("Successfully installed Chromium browser")
-            except subprocess.CalledProcessError as e:
-                print(f"Failed to install browsers: {e.stderr.decode()}")
-                print("Will attempt to use fallback method")
-        
-        # Initialize Playwright
-        p = sync_playwright().start()
-        
-        # Set up browser launch options
-        launch_options = {
-            "headless": True,  # Run in headless mode
-        }
-        
-        # Try to detect if we're running in a CI/CD environment
-        if os.environ.get("CI") or os.environ.get("RENDER") or os.environ.get("DOCKER_CONTAINER"):
-            # Add CI-specific options
-            launch_options.update({
-                "args": [
-                    "--no-sandbox",
-                    "--disable-setuid-sandbox",
-                    "--disable-dev-shm-usage",
-                    "--disable-accelerated-2d-canvas",
-                    "--no-first-run",
-                    "--no-zygote",
-                    "--single-process",
-                    "--disable-gpu"
-                ]
-            })
-        
-        # Try to launch browsers with multiple retries
-        browser = None
-        max_retries = 3
-        
-        # Try Chromium first
-        for attempt in range(1, max_retries + 1):
-            try:
-                print(f"Attempting browser launch ({attempt}/{max_retries})...")
-                browser = p.chromium.launch(**launch_options)
-                break
-            except Exception as e:
-                print(f"Browser launch failed: {str(e)}")
-                if attempt < max_retries:
-                    print(f"I'll retry in 5 seconds...")
-                    time.sleep(5)
-                else:
-                    print(f"I've reached the maximum retries. I'll try Firefox instead...")
-        
-        # If Chromium failed, try Firefox
-        if browser is None:
-            try:
-                browser = p.firefox.launch(**launch_options)
-            except Exception as e:
-                print(f"Firefox launch failed: {str(e)}")
-                print(f"I'll try Webkit as a last resort...")
-                try:
-                    browser = p.webkit.launch(**launch_options)
-                except Exception as e:
-                    print(f"Webkit launch failed: {str(e)}")
-                    # If all browser engines fail, try a fallback method
-                    print("All browser engines failed. Using fallback method...")
-                    return fallback_scraper(state, city_filter)
-        
-        # Create a context with retry logic
-        try:
-            context = browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
-            page = context.new_page()
-            print("Browser context and page created successfully.")
-        except Exception as e:
-            print(f"Failed to create context or page: {e}")
-            if browser:
-                browser.close()
-            raise
-        
-        # Get state details from map
-        state_details = STATE_MAP.get(state)
-        if not state_details:
-            print(f"Error: State '{state}' not found in STATE_MAP.")
-            browser.close()
+        state_abbr, urls = get_state_urls(state)
+        if not urls:
             return
         
-        state_abbr = state_details["abbr"]
-        state_slug = state_details["slug"]
-        
-        # Construct URLs dynamically
-        urls = [
-            f"https://www.geonames.org/postal-codes/US/{state_abbr}/{state_slug}.html",
-            f"https://www.geonames.org/postal-codes/US/{state_abbr}/"
-        ]
-        
-        postal_table = None
-        for url in urls:
-            print(f"\nI'm trying the URL: {url}")
-            
-            try:
-                # I navigate to the URL with retry logic
-                for nav_attempt in range(3):
-                    try:
-                        page.goto(url, timeout=60000, wait_until="domcontentloaded")
-                        break
-                    except Exception as nav_error:
-                        print(f"Navigation attempt {nav_attempt + 1} failed: {nav_error}")
-                        if nav_attempt < 2: # Use '<' for correct retry count
-                            print("I'll retry navigation...")
-                            time.sleep(2)
-                        else:
-                            raise
-                
-                # I wait for the page to stabilize
-                page.wait_for_load_state("networkidle", timeout=30000)
-                
-                # I print page info for debugging
-                print(f"Page title: {page.title()}")
-                print(f"Current URL: {page.url}")
-                
-                # I check for protection/captcha
-                if check_for_protection(page): # Consider removing input for automated runs
-                    print("\nI detected a protection page. Please solve the captcha if present.")
-                    input("Press Enter once you've solved the captcha...")
-                    time.sleep(2)  # I wait after the captcha
-                
-                # I save the page source for debugging
-                html_content = page.content()
-                debug_dir = "debug_output"
-                os.makedirs(debug_dir, exist_ok=True)
-                with open(f"{debug_dir}/page_source_{urls.index(url)}.html", "w", encoding="utf-8") as f:
-                    f.write(html_content)
-                print(f"Page source saved to '{debug_dir}/page_source_{urls.index(url)}.html'")
-                
-                # I take a screenshot for debugging
-                page.screenshot(path=f"{debug_dir}/screenshot_{urls.index(url)}.png")
-                print(f"Screenshot saved to '{debug_dir}/screenshot_{urls.index(url)}.png'")
-                
-                # I find the postal code table
-                postal_table = find_postcode_table(html_content)
-                if postal_table:
-                    break  # I exit the URL loop if I find the table
-                    
-            except Exception as e:
-                print(f"Error processing URL {url}: {e}")
-                continue
-        
-        if not postal_table:
+        # I fetch over plain HTTP first and only escalate to a browser when needed
+        page = fetch_postcode_page(urls, fetchers or get_default_fetchers(), report, revalidate)
+        if page is None:
             print("\nI couldn't find the postal code table in any of the URLs.")
-            browser.close()
             return
-            
-        print(f"\nPostcode table found for {state}. Processing data...")
-        
-        # I get or create the country using improved database functions
-        country_id = get_id_by_column("countries", "name", "USA")
-        if country_id is None:
-            print("I'm creating a USA country entry...")
-            country_id = insert_and_get_id("countries", {"name": "USA", "code": "US"}, "name")
-            if country_id is None:
-                print("I failed to create the country entry. I'm aborting.")
-                browser.close()
-                return
-        
-        # I get or create the region
-        region_id = get_id_by_column("regions", "name", state, country_id=country_id)
-        if region_id is None:
-            print(f"Creating {state} region entry...")
-            region_id = insert_and_get_id("regions", {"name": state, "code": state_abbr, "country_id": country_id}, "name")
-            if region_id is None:
-                print("Failed to create region entry. Aborting.")
-                browser.close()
-                return
         
-        # I process the rows
-        rows = postal_table.find_all("tr")[1:]  # I skip the header
-        success_count = 0
-        error_count = 0
-        
-        for row in rows:
-            cols = row.find_all("td")
-            if len(cols) >= 3:  # I ensure there are at least 3 columns
-                place_name = cols[1].text.strip() # Second column is the place name (e.g., "Avon")
-                postcode = cols[2].text.strip()   # Third column is the postal code (e.g., "06001")
-
-                # Apply city filter if provided
-                if city_filter and city_filter.lower() not in place_name.lower():
-                    continue # Skip this row if city doesn't match
-
-                if place_name and postcode:
-                    print(f"Processing: {place_name} - {postcode}")
-                    data = {
-                        "code": postcode,
-                        "place_name": place_name,
-                        "region_id": region_id,
-                    }
-                    
-                    # Add to results list
-                    results.append({
-                        "code": postcode,
-                        "place_name": place_name
-                    })
-                    
-                    if insert_postcode_data(data):
-                        success_count += 1
-                    else:
-                        error_count += 1
-            else:
-                print(f"Skipping row, expected 3+ columns, found {len(cols)}.")
-        
-        # --- This block should be OUTSIDE the loop ---
-        print(f"\nScraping completed for {state}" + (f" (City: {city_filter})" if city_filter else "") + ":")
-        print(f"Successfully processed/inserted: {success_count} postcodes.")
-        print(f"Errors encountered: {error_count} postcodes.")
-        print(f"Total results in list: {len(results)}")
-        
-        browser.close()
-        
-        # Return the results list
-        return results
+        return process_postcode_page(state, page, city_filter, report)
         
     except Exception as e:
         print(f"An error occurred during scraping: {str(e)}")
@@ -353,89 +328,20 @@ def scrape_geonames_postcodes(state, city_filter=None):
         print(f"Traceback: {traceback.format_exc()}")
         return []  # Return empty list on error
 
-def fallback_scraper(state, city_filter=None):
+def fallback_scraper(state, city_filter=None, report=None):
     """
-    A fallback scraper that uses requests and BeautifulSoup instead of Playwright.
-    This is used when Playwright browsers are not available.
+    A fallback scraper that only uses plain HTTP requests, never a browser.
     
     Args:
         state (str): The state to scrape postcodes for
         city_filter (str, optional): Filter results to this city only
+        report (dict, optional): Filled with per-job fetch details
         
     Returns:
         list: List of dictionaries with postcode data
     """
-    try:
-        import requests
-        from bs4 import BeautifulSoup
-        
-        # Explicitly tell Playwright to use system-installed browsers (redundant here, but safe)
-        print(f"Using fallback scraper for {state} {city_filter if city_filter else ''}")
-        
-        # Get state details from map
-        state_details = STATE_MAP.get(state)
-        if not state_details:
-            print(f"Error: State '{state}' not found in STATE_MAP.")
-            return []
-        
-        state_abbr = state_details["abbr"]
-        state_slug = state_details["slug"]
-        
-        # Create the URL
-        url = f"https://www.geonames.org/postal-codes/US/{state_abbr}/{state_slug}.html"
-        
-        # Send a request to the URL
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code != 200:
-            print(f"Failed to fetch data: Status code {response.status_code}")
-            return []
-        
-        # Save the HTML for debugging
-        debug_dir = "debug_output"
-        os.makedirs(debug_dir, exist_ok=True)
-        with open(f"{debug_dir}/fallback_page_source.html", "w", encoding="utf-8") as f:
-            f.write(response.text)
-        
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find the table with postal codes
-        table = soup.find('table', class_='restable')
-        if not table:
-            print("Could not find postal code table")
-            return []
-        
-        # Extract data from the table
-        results = []
-        rows = table.find_all('tr')[1:]  # Skip header row
-        
-        for row in rows:
-            cells = row.find_all('td')
-            if len(cells) >= 3:  # Ensure there are at least 3 columns
-                place_name = cells[1].text.strip() # Second column is the place name
-                postcode = cells[2].text.strip()   # Third column is the postal code
-                
-                # Apply city filter if provided
-                if city_filter and city_filter.lower() not in place_name.lower():
-                    continue
-                
-                results.append({
-                    'place_name': place_name,
-                    'code': postcode
-                })
-        
-        print(f"Fallback scraper found {len(results)} results")
-        return results
-        
-    except Exception as e:
-        print(f"Fallback scraper error: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        return []
+    print(f"Using fallback scraper for {state} {city_filter if city_filter else ''}")
+    return scrape_geonames_postcodes(state, city_filter, report=report, fetchers=[get_http_fetcher()]) or []
 
 if __name__ == "__main__":
     print("--- GeoNames Postcode Scraper ---")
@@ -0,0 +1,211 @@
+"""
+Content-addressed on-disk cache for fetched pages.
+
+Layout under PAGE_CACHE_DIR:
+    index/<sha256(url)>.json     validators and bookkeeping for one URL
+    objects/<sha256(body)>.html  page bodies, shared by every URL with the same content
+    objects/<sha256(body)>.rows.json  parsed rows for a body, so unchanged pages skip parsing
+
+Index entries hold the ETag / Last-Modified validators used for conditional GETs,
+when the page was last fetched (for TTL freshness) and the body hash of the last
+run that was fully written to the database. Bodies and rows that no index entry
+refers to any more (older versions of a page) are pruned every
+PAGE_CACHE_PRUNE_INTERVAL seconds.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import PAGE_CACHE_DIR, PAGE_CACHE_TTL, PAGE_CACHE_PRUNE_INTERVAL
+
+# Unreferenced files younger than this are kept: a body is written before the index entry pointing to it
+PRUNE_MIN_AGE = 600
+
+
+def content_hash(body):
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """Stores page bodies with their HTTP validators, keyed by URL."""
+
+    def __init__(self, root=PAGE_CACHE_DIR, ttl=PAGE_CACHE_TTL, prune_interval=PAGE_CACHE_PRUNE_INTERVAL):
+        self.root = root
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._last_prune = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "index"), exist_ok=True)
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+
+    # --- Index entries ---
+
+    def get(self, url):
+        """Returns the index entry for a URL, or None if it was never cached."""
+        try:
+            with open(self._index_path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Headers that let the server answer 304 Not Modified for a cached entry."""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, body, etag=None, last_modified=None):
+        """Saves a fetched body and its validators; returns the body hash."""
+        body_hash = content_hash(body)
+        object_path = self._object_path(body_hash, ".html")
+        if not os.path.exists(object_path):
+            self._write(object_path, body)
+
+        with self._lock:
+            entry = self.get(url) or {"url": url}
+            entry.update({
+                "body_hash": body_hash,
+                "fetched_at": time.time(),
+            })
+            # A body fetched without validators (e.g. by a browser) keeps none
+            entry["etag"] = etag
+            entry["last_modified"] = last_modified
+            self._write(self._index_path(url), json.dumps(entry))
+            prune = time.monotonic() - self._last_prune >= self.prune_interval
+            if prune:
+                self._last_prune = time.monotonic()
+        if prune:
+            try:
+                self.prune()
+            except OSError as e:
+                print(f"Error pruning the page cache: {e}")
+        return body_hash
+
+    def touch(self, url):
+        """Marks a cached entry as revalidated (after a 304) without changing its body."""
+        with self._lock:
+            entry = self.get(url)
+            if entry is None:
+                return None
+            entry["fetched_at"] = time.time()
+            self._write(self._index_path(url), json.dumps(entry))
+            return entry
+
+    def load_body(self, entry):
+        try:
+            with open(self._object_path(entry["body_hash"], ".html"), encoding="utf-8") as f:
+                return f.read()
+        except (OSError, KeyError):
+            return None
+
+    # --- Successful runs ---
+
+    def is_unchanged(self, url, body_hash):
+        """True if this exact body was already fully parsed and written to the database."""
+        entry = self.get(url)
+        return bool(entry) and entry.get("success_hash") == body_hash
+
+    def mark_success(self, url, body_hash):
+        with self._lock:
+            entry = self.get(url)
+            if entry is None:
+                return
+            entry["success_hash"] = body_hash
+            entry["success_at"] = time.time()
+            self._write(self._index_path(url), json.dumps(entry))
+
+    def save_rows(self, body_hash, rows):
+        self._write(self._object_path(body_hash, ".rows.json"), json.dumps(rows))
+
+    def load_rows(self, body_hash):
+        try:
+            with open(self._object_path(body_hash, ".rows.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # --- Pruning ---
+
+    def prune(self, min_age=PRUNE_MIN_AGE):
+        """
+        Deletes bodies and parsed rows that no index entry refers to, as either its current
+        body or its last successfully written one, once they are min_age seconds old.
+
+        Returns:
+            int: Number of files removed
+        """
+        referenced = set()
+        for name in os.listdir(os.path.join(self.root, "index")):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, "index", name), encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            referenced.update(entry.get(key) for key in ("body_hash", "success_hash") if entry.get(key))
+
+        cutoff = time.time() - min_age
+        removed = 0
+        objects_dir = os.path.join(self.root, "objects")
+        for name in os.listdir(objects_dir):
+            # <hash>.html, <hash>.rows.json, or a temp file left by an interrupted write
+            if name.split(".", 1)[0] in referenced:
+                continue
+            path = os.path.join(objects_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                # Removed by another process in the meantime
+                continue
+        return removed
+
+    # --- Helpers ---
+
+    def _index_path(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, "index", f"{key}.json")
+
+    def _object_path(self, body_hash, suffix):
+        return os.path.join(self.root, "objects", f"{body_hash}{suffix}")
+
+    @staticmethod
+    def _write(path, text):
+        # Write to a temp file and rename so readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """Returns the process-wide page cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PageCache()
+        return _cache
@@ -0,0 +1,171 @@
+"""
+Asyncio crawl scheduler for scraping many states in one job.
+
+Blocking work (HTTP fetches, parsing and database writes) runs in a thread pool,
+while the event loop enforces the crawl limits:
+- a global cap on states in flight,
+- a per-host cap on concurrent fetches,
+- a token-bucket rate limit on requests, taken by the fetchers before every request
+  they send (retries and browser loads included; page cache hits send none),
+- per-state retries with jittered exponential backoff.
+"""
+
+import asyncio
+import functools
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import (
+    SCRAPE_CONCURRENCY, SCRAPE_PER_HOST_LIMIT, SCRAPE_RATE_PER_SECOND, SCRAPE_RATE_BURST,
+    SCRAPE_STATE_RETRIES, SCRAPE_RETRY_BACKOFF,
+)
+from scraper.geonames_scraper import STATE_MAP, get_state_urls, fetch_postcode_page, process_postcode_page
+from scraper.fetchers import get_default_fetchers
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second with bursts of up to `capacity`. A rate of 0 or less means no limit."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CrawlScheduler:
+    """Scrapes a list of states concurrently within the configured limits."""
+
+    def __init__(self, concurrency=SCRAPE_CONCURRENCY, per_host_limit=SCRAPE_PER_HOST_LIMIT,
+                 rate=SCRAPE_RATE_PER_SECOND, burst=SCRAPE_RATE_BURST,
+                 retries=SCRAPE_STATE_RETRIES, backoff=SCRAPE_RETRY_BACKOFF, fetchers=None):
+        self.concurrency = max(1, concurrency)
+        self.per_host_limit = max(1, per_host_limit)
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.fetchers = fetchers
+
+    def run(self, states, city_filter=None, report=None, progress=None):
+        """
+        Blocking entry point; returns {state: results list} for the states that succeeded.
+        progress(state, results) is called as each state finishes (results is None if it failed).
+        """
+        return asyncio.run(self.scrape(states, city_filter, report, progress))
+
+    async def scrape(self, states, city_filter=None, report=None, progress=None):
+        if report is None:
+            report = {}
+        report["states"] = {}
+
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="crawl")
+        self._global = asyncio.Semaphore(self.concurrency)
+        self._hosts = {}
+        self._bucket = TokenBucket(self.rate, self.burst)
+        self._loop = asyncio.get_running_loop()
+        self._fetchers = self.fetchers or get_default_fetchers()
+
+        start = time.perf_counter()
+        try:
+            outcomes = await asyncio.gather(*[
+                self._scrape_state(state, city_filter, report["states"], progress) for state in states
+            ])
+        finally:
+            self._executor.shutdown(wait=False)
+
+        report["elapsed"] = round(time.perf_counter() - start, 3)
+        report["failed_states"] = [state for state, results in zip(states, outcomes) if results is None]
+        return {state: results for state, results in zip(states, outcomes) if results is not None}
+
+    async def _scrape_state(self, state, city_filter, state_reports, progress=None):
+        results = await self._scrape_with_retries(state, city_filter, state_reports)
+        if progress is not None:
+            progress(state, results)
+        return results
+
+    async def _scrape_with_retries(self, state, city_filter, state_reports):
+        state_report = state_reports[state] = {"attempts": 0}
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # Full jitter keeps retries for many states from arriving in lockstep
+                delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+                await asyncio.sleep(delay)
+            state_report["attempts"] = attempt + 1
+            try:
+                async with self._global:
+                    results = await self._scrape_once(state, city_filter, state_report)
+                if results is not None:
+                    state_report["results_count"] = len(results)
+                    return results
+            except Exception as e:
+                state_report["error"] = str(e)
+                print(f"Scraping {state} failed on attempt {attempt + 1}: {e}")
+        return None
+
+    async def _scrape_once(self, state, city_filter, state_report):
+        loop = asyncio.get_running_loop()
+        _, urls = get_state_urls(state)
+        if not urls:
+            return None
+
+        page = None
+        for url in urls:
+            async with self._host_semaphore(url):
+                page = await loop.run_in_executor(
+                    self._executor, functools.partial(fetch_postcode_page, [url], self._fetchers, state_report,
+                                                      before_request=self._take_token)
+                )
+            if page is not None:
+                break
+        if page is None:
+            return None
+
+        return await loop.run_in_executor(
+            self._executor, process_postcode_page, state, page, city_filter, state_report
+        )
+
+    def _take_token(self):
+        """Blocks a fetch thread until the token bucket allows one more request."""
+        asyncio.run_coroutine_threadsafe(self._bucket.acquire(), self._loop).result()
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._hosts[host]
+
+
+def scrape_states(states=None, city_filter=None, report=None, progress=None):
+    """
+    Scrapes several states concurrently.
+
+    Args:
+        states (list, optional): State names, defaults to every state in STATE_MAP
+        city_filter (str or CityFilter, optional): Filter results by city name
+        report (dict, optional): Filled with per-state attempts, fetches and timings
+        progress (callable, optional): Called with (state, results) as each state finishes
+
+    Returns:
+        dict: Mapping of state name to its list of postcode dictionaries
+    """
+    return CrawlScheduler().run(list(states or STATE_MAP), city_filter, report, progress)
@@ -0,0 +1,113 @@
+"""
+Streaming extractor for the geonames postal-code `restable` table.
+
+Instead of building a DOM for the whole page, the document is sliced to start at
+the `restable` table and fed in chunks to an event-based HTMLParser. Each data row
+is yielded as soon as its closing </tr> is seen, and parsing stops at the end of
+the table.
+"""
+
+from html.parser import HTMLParser
+
+# Column order of a geonames data row: index, place, code, country, admin1, admin2, admin3
+PLACE_COLUMN = 1
+CODE_COLUMN = 2
+
+
+def find_restable_start(html_content):
+    """Returns the offset of the <table> tag carrying the restable class, or -1."""
+    marker = html_content.find('class="restable"')
+    if marker == -1:
+        return -1
+    return html_content.rfind("<table", 0, marker)
+
+
+class RestableParser(HTMLParser):
+    """Collects the cell text of every <tr> in the first table it sees."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.done = False
+        self._table_depth = 0
+        self._cells = None
+        self._text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self._table_depth += 1
+        elif self._table_depth != 1:
+            return
+        elif tag == "tr":
+            # Tolerate omitted </td> and </tr> end tags
+            self._end_row()
+            self._cells = []
+        elif tag == "td" and self._cells is not None:
+            self._end_cell()
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            self._table_depth -= 1
+            if self._table_depth == 0:
+                self._end_row()
+                self.done = True
+        elif self._table_depth != 1:
+            return
+        elif tag == "td":
+            self._end_cell()
+        elif tag == "tr":
+            self._end_row()
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def _end_cell(self):
+        if self._text is not None:
+            self._cells.append("".join(self._text).strip())
+            self._text = None
+
+    def _end_row(self):
+        if self._cells is not None:
+            self._end_cell()
+            self.rows.append(tuple(self._cells))
+            self._cells = None
+
+
+def iter_restable_rows(html_content, chunk_size=16384):
+    """
+    Yields the cell texts of each data row in the restable table.
+    Header rows and the coordinate rows geonames interleaves (fewer than 3 cells)
+    are skipped.
+
+    Args:
+        html_content (str): A geonames postal-code page
+        chunk_size (int): Characters fed to the parser at a time
+
+    Yields:
+        tuple: (index, place_name, code, country, admin1, admin2, admin3)
+    """
+    start = find_restable_start(html_content)
+    if start == -1:
+        return
+
+    parser = RestableParser()
+    for offset in range(start, len(html_content), chunk_size):
+        parser.feed(html_content[offset:offset + chunk_size])
+        rows, parser.rows = parser.rows, []
+        for cells in rows:
+            if len(cells) > CODE_COLUMN:
+                yield cells
+        if parser.done:
+            break
+    parser.close()
+
+
+def iter_postcodes(html_content):
+    """Yields (place_name, code) pairs for rows that have both values."""
+    for cells in iter_restable_rows(html_content):
+        place_name = cells[PLACE_COLUMN]
+        code = cells[CODE_COLUMN]
+        if place_name and code:
+            yield place_name, code
@@ -0,0 +1,79 @@
+"""
+Local SQLite files shared by the web process and job workers.
+
+The job queue, the SQLite storage backend, the per-state freshness records and
+the stage metrics each keep their data in a file opened through SQLiteFile.
+The file runs in WAL mode so readers never wait on the writer, each thread gets
+its own connection, and writes that must not interleave run in BEGIN IMMEDIATE
+transactions, which take the write lock up front.
+"""
+
+import os
+import sqlite3
+import threading
+
+
+class SQLiteFile:
+    """A SQLite file in WAL mode, with one connection per thread."""
+
+    def __init__(self, path, schema, foreign_keys=False):
+        """
+        Args:
+            path: The database file; its directory is created if needed
+            schema: CREATE ... IF NOT EXISTS statements run on open
+            foreign_keys: Enforce REFERENCES constraints on every connection
+        """
+        self.path = path
+        self.foreign_keys = foreign_keys
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection().executescript(schema)
+
+    def connection(self):
+        """Returns this thread's connection, opening it on first use."""
+        # sqlite3 connections may not be shared across threads, so each thread opens its own
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            if self.foreign_keys:
+                connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+        return connection
+
+    def transaction(self):
+        """Context manager running its block in BEGIN IMMEDIATE ... COMMIT; yields the connection."""
+        return _Transaction(self.connection())
+
+    def migrate(self, table, migrations):
+        """
+        Adds the columns a file created by an older release is missing.
+
+        Args:
+            table: The table the columns belong to
+            migrations: {column: ALTER TABLE statement adding it}
+        """
+        connection = self.connection()
+        columns = {row["name"] for row in connection.execute(f"PRAGMA table_info({table})")}
+        for column, statement in migrations.items():
+            if column not in columns:
+                connection.execute(statement)
+
+
+class _Transaction:
+    """Runs a block inside BEGIN IMMEDIATE ... COMMIT, rolling back on errors."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -1,77 +1,38 @@
+import json
 import os
 import sys # Import sys module
+import threading
+import time
 import traceback # Keep for error handling if needed
-from typing import Dict, Any, Optional
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Iterator, Iterable
 # import pandas as pd # Removed as it seems unused
 
 # Add parent directory to path to find config
 # Do this BEFORE trying to import from the parent directory
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# Third-party imports
 try:
-    from supabase import create_client, Client
-    # Use the exceptions path consistently
-    from postgrest.exceptions import APIError
-except ImportError as e:
-    print(f"Error importing Supabase modules: {e}")
-    print("Make sure 'supabase-py' is installed (`pip install supabase`).")
-    sys.exit(1)
-
-# Local imports (config)
-try:
-    from config import SUPABASE_URL, SUPABASE_KEY
-except ImportError as e:
-    # Fallback to environment variables if config.py is missing
-    print(f"Warning: Could not import from config.py ({e}). Attempting to use environment variables SUPABASE_URL and SUPABASE_KEY.")
-    SUPABASE_URL = os.environ.get("SUPABASE_URL")
-    SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-
-# Validate Supabase credentials
-if not SUPABASE_URL or not SUPABASE_KEY:
-    print("Error: Supabase URL and Key must be set in config.py or environment variables.")
-    sys.exit(1)
-
-def initialize_supabase_client():
-    """
-    Initialize Supabase client with version compatibility handling.
-    Returns the initialized client or exits on failure.
-    """
-    # --- Debug: Print relevant environment variables ---
-    print("--- Checking Environment Variables ---")
-    print(f"HTTP_PROXY: {os.environ.get('HTTP_PROXY')}")
-    print(f"HTTPS_PROXY: {os.environ.get('HTTPS_PROXY')}")
-    print(f"ALL_PROXY: {os.environ.get('ALL_PROXY')}")
-    print("------------------------------------")
-
-    # --- Debug: Test httpx directly ---
-    print("--- Testing httpx connection ---")
-    try:
-        import httpx
-        # Try connecting to the base Supabase URL or a known endpoint like auth
-        # Construct the auth v1 URL which is usually accessible
-        test_url = f"{SUPABASE_URL.replace('/rest/v1', '').rstrip('/')}/auth/v1"
-        print(f"Attempting GET request to: {test_url}")
-        with httpx.Client() as http_client:
-            response = http_client.get(test_url, timeout=15.0) # Increased timeout slightly
-            print(f"httpx GET request successful. Status code: {response.status_code}")
-    except Exception as http_err:
-        print(f"httpx direct connection failed: {http_err}")
-        print("This might indicate an underlying network/proxy/SSL issue.")
-    print("------------------------------")
-
-    # --- Attempt Initialization (Simplified) ---
-    try:
-        print("Attempting initialization with create_client...")
-        client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        print("Supabase client initialized successfully using create_client.")
-        return client
-    except Exception as e:
-        print(f"Error initializing Supabase client: {e}")
-        sys.exit(1)
+    from config import POSTCODE_BATCH_SIZE, STATS_CACHE_TTL, STATS_MAX_STALE, REFERENCE_RELOAD_INTERVAL
+except ImportError:
+    POSTCODE_BATCH_SIZE = int(os.environ.get("POSTCODE_BATCH_SIZE", "500"))
+    STATS_CACHE_TTL = float(os.environ.get("STATS_CACHE_TTL", "30"))
+    STATS_MAX_STALE = float(os.environ.get("STATS_MAX_STALE", "300"))
+    REFERENCE_RELOAD_INTERVAL = float(os.environ.get("REFERENCE_RELOAD_INTERVAL", "60"))
 
-# Initialize Supabase Client using the compatibility function
-supabase = initialize_supabase_client()
+# Reads and writes go to the backend selected by STORAGE_BACKEND (see supabase_utils/storage/).
+# The Supabase client helpers are re-exported for the legacy functions at the end of this module.
+from supabase_utils.storage.backends import get_storage
+from supabase_utils.storage.base import DuplicateRow
+from supabase_utils.storage.supabase_storage import SupabaseUnavailable, initialize_supabase_client, get_supabase
+
+def ping_database() -> bool:
+    """Returns whether the storage backend answers a minimal query. Used by the readiness check; never raises."""
+    try:
+        get_storage().ping()
+        return True
+    except Exception:
+        return False
 
 def insert_and_get_id(table_name: str, data: Dict[str, Any], unique_column: str) -> Optional[int]:
     """
@@ -80,21 +41,16 @@ def insert_and_get_id(table_name: str, data: Dict[str, Any], unique_column: str)
     """
     print(f"Attempting to insert into '{table_name}': {data}")
     try:
-        response = supabase.table(table_name).insert(data).execute()
-        if response.data:
-            new_id = response.data[0].get('id')
+        new_id = get_storage().insert(table_name, data)
+        if new_id is not None:
             print(f"Successfully inserted into '{table_name}', new ID: {new_id}")
             return new_id
         else:
             print(f"Insert into '{table_name}' executed, but response has no data.")
             return get_id_by_column(table_name, unique_column, data[unique_column])
-    except APIError as e:
-        if e.code == '23505':  # PostgreSQL unique violation code
-            print(f"Item already exists in '{table_name}'. Fetching existing ID.")
-            return get_id_by_column(table_name, unique_column, data[unique_column])
-        else:
-            print(f"Database API Error inserting into '{table_name}': {e}")
-            return None
+    except DuplicateRow:
+        print(f"Item already exists in '{table_name}'. Fetching existing ID.")
+        return get_id_by_column(table_name, unique_column, data[unique_column])
     except Exception as e:
         print(f"An unexpected error occurred during insert into '{table_name}': {e}")
         return None
@@ -104,25 +60,110 @@ def get_id_by_column(table_name: str, column_name: str, column_value: Any, **kwa
     print(f"Checking for ID in '{table_name}' where {column_name}='{column_value}'" + 
           (f" and {kwargs}" if kwargs else ""))
     try:
-        query = supabase.table(table_name).select("id").eq(column_name, column_value)
-        for key, value in kwargs.items():
-            query = query.eq(key, value)
-        
-        response = query.limit(1).execute()
-        if response.data:
-            found_id = response.data[0]['id']
+        found_id = get_storage().find_id(table_name, {column_name: column_value, **kwargs})
+        if found_id is not None:
             print(f"Found existing ID: {found_id}")
             return found_id
         else:
             print("Item not found.")
             return None
-    except APIError as e:
-        print(f"Database API Error getting ID from '{table_name}': {e}")
-        return None
     except Exception as e:
         print(f"An unexpected error occurred while getting ID from '{table_name}': {e}")
         return None
 
+# --- Reference data ---
+# Countries and regions practically never change, so their ids are loaded once per
+# process (one query per table) and served from memory. Unknown names trigger at most
+# one reload per REFERENCE_RELOAD_INTERVAL before being created or reported missing.
+_reference = {"countries": None, "regions": None, "region_names": None, "loaded_at": 0.0}
+_reference_lock = threading.Lock()
+_create_lock = threading.Lock()
+
+def load_reference_data() -> None:
+    """Replaces the cached country and region ids with the current table contents."""
+    countries = get_storage().select_all("countries", ("id", "name"))
+    regions = get_storage().select_all("regions", ("id", "name", "country_id"))
+    with _reference_lock:
+        _reference["countries"] = {row["name"]: row["id"] for row in countries}
+        _reference["regions"] = {(row["country_id"], row["name"]): row["id"] for row in regions}
+        _reference["region_names"] = {row["name"]: row["id"] for row in regions}
+        _reference["loaded_at"] = time.monotonic()
+
+def warm_reference_cache() -> bool:
+    """Loads the reference cache, e.g. at startup. Returns False (and logs) if the database is unreachable."""
+    try:
+        load_reference_data()
+        print(f"Reference cache loaded: {len(_reference['countries'])} countries, {len(_reference['regions'])} regions")
+        return True
+    except Exception as e:
+        print(f"Could not load the reference cache: {e}")
+        return False
+
+def _reference_lookup(kind: str, key: Any, reload: bool = True) -> Optional[int]:
+    """Looks up a cached id, loading the cache first if needed and reloading once on a miss."""
+    if _reference[kind] is None:
+        load_reference_data()
+    found = _reference[kind].get(key)
+    if found is None and reload and time.monotonic() - _reference["loaded_at"] >= REFERENCE_RELOAD_INTERVAL:
+        load_reference_data()
+        found = _reference[kind].get(key)
+    return found
+
+def _get_or_create(kind: str, key: Any, table_name: str, data: Dict[str, Any]) -> Optional[int]:
+    try:
+        found = _reference_lookup(kind, key)
+        if found is not None:
+            return found
+        # Serialises creation so concurrent jobs in this process insert a row once; another
+        # process inserting the same row hits the unique constraint and we reload instead
+        with _create_lock:
+            found = _reference_lookup(kind, key, reload=False)
+            if found is not None:
+                return found
+            print(f"'{key}' not found in '{table_name}'. Attempting to insert...")
+            new_id = insert_and_get_id(table_name, data, "name")
+            load_reference_data()
+            return _reference[kind].get(key) or new_id
+    except Exception as e:
+        print(f"An unexpected error occurred while resolving '{key}' in '{table_name}': {e}")
+        return None
+
+def get_or_create_country_id(name: str, code: Optional[str] = None) -> Optional[int]:
+    """
+    Returns the id of a country, inserting it if it does not exist yet.
+
+    Args:
+        name: Country name (countries.name)
+        code: Country code, only used when the country is created
+
+    Returns:
+        The country id, or None if it could not be found or created
+    """
+    return _get_or_create("countries", name, "countries", {"name": name, "code": code})
+
+def get_or_create_region_id(name: str, country_id: int, code: Optional[str] = None) -> Optional[int]:
+    """
+    Returns the id of a region of a country, inserting it if it does not exist yet.
+
+    Args:
+        name: Region (state) name
+        country_id: Id of the country the region belongs to
+        code: Region code, only used when the region is created
+
+    Returns:
+        The region id, or None if it could not be found or created
+    """
+    data = {"name": name, "code": code, "country_id": country_id}
+    return _get_or_create("regions", (country_id, name), "regions", data)
+
+def find_region_id(name: str) -> Optional[int]:
+    """Returns the id of a region by name from the reference cache, or None if there is no such region."""
+    try:
+        return _reference_lookup("region_names", name)
+    except Exception as e:
+        print(f"An unexpected error occurred while looking up region '{name}': {e}")
+        return None
+
 # --- Removed duplicate imports and client initialization ---
 # --- Other functions like insert_and_get_id, get_id_by_column would be here ---
 
@@ -133,69 +174,440 @@ def insert_postcode_data(data: Dict[str, Any]) -> bool:
     """
     print(f"Attempting to insert postcode: {data}")
     try:
-        # Note: If the 'code' column has a UNIQUE constraint and you want to
-        # UPDATE existing entries instead of skipping, use the .upsert() method:
-        # supabase.table("postcodes").upsert(data, on_conflict='code').execute()
+        # Note: to UPDATE existing entries instead of skipping them, use
+        # insert_postcodes_bulk([data], ignore_duplicates=False)
+        new_id = get_storage().insert("postcodes", data)
 
-        response = supabase.table("postcodes").insert(data).execute()
-        
-        if hasattr(response, 'data') and response.data:
+        if new_id is not None:
              print(f"Successfully inserted postcode: {data.get('code')}")
-             return True
-        elif hasattr(response, 'status_code') and 200 <= response.status_code < 300:
-             print(f"Successfully inserted postcode (status code: {response.status_code}): {data.get('code')}")
+             invalidate_postcode_stats()
              return True
         else:
              print(f"Postcode insert executed, but response indicates potential issue or no data returned.")
-             print(f"Response details: {response}")
              return False
 
-    except APIError as e:
-        if e.code == '23505':  # PostgreSQL unique violation code
-            print(f"Postcode '{data.get('code')}' already exists. Skipping.")
-            return True  # Consider this a success since we don't need to insert it again
-        elif "foreign key constraint" in str(e).lower() and "region_id" in str(e).lower():
+    except DuplicateRow:
+        print(f"Postcode '{data.get('code')}' already exists. Skipping.")
+        return True  # Consider this a success since we don't need to insert it again
+    except Exception as e:
+        if "foreign key" in str(e).lower():
              print(f"Error: The region_id '{data.get('region_id')}' does not exist in the 'regions' table.")
              return False
+        print(f"Database error during postcode insert: {e}")
+        print(traceback.format_exc())
+        return False
+
+def insert_postcodes_bulk(rows: List[Dict[str, Any]], batch_size: Optional[int] = None,
+                          ignore_duplicates: bool = True) -> Dict[str, Any]:
+    """
+    Upserts postcode rows into the 'postcodes' table in batches.
+    By default rows whose 'code' already exists are skipped (ON CONFLICT (code) DO NOTHING),
+    matching the behaviour of insert_postcode_data but with one request per batch.
+    With ignore_duplicates=False existing rows are updated instead (DO UPDATE).
+
+    Returns a summary dict with overall and per-batch success/duplicate/error counts.
+    """
+    batch_size = batch_size or POSTCODE_BATCH_SIZE
+    summary = {"rows": len(rows), "success": 0, "duplicates": 0, "errors": 0, "batches": []}
+
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+
+        # Postgres rejects a statement that touches the same conflict key twice,
+        # so duplicates inside a batch are dropped up front.
+        unique_rows = {}
+        for row in chunk:
+            unique_rows.setdefault(row.get("code"), row)
+        payload = list(unique_rows.values())
+
+        batch = {"size": len(chunk), "success": 0, "duplicates": len(chunk) - len(payload), "errors": 0}
+        try:
+            # With ignore-duplicates only newly inserted rows are counted
+            inserted = get_storage().upsert_postcodes(payload, ignore_duplicates=ignore_duplicates)
+            batch["success"] = inserted
+            batch["duplicates"] += len(payload) - inserted
+        except Exception as e:
+            print(f"Database error during bulk postcode upsert (rows {start}-{start + len(chunk) - 1}): {e}")
+            batch["errors"] = len(payload)
+
+        summary["success"] += batch["success"]
+        summary["duplicates"] += batch["duplicates"]
+        summary["errors"] += batch["errors"]
+        summary["batches"].append(batch)
+
+    if summary["success"]:
+        invalidate_postcode_stats()
+    print(f"Bulk upsert finished: {summary['success']} inserted, {summary['duplicates']} duplicates, "
+          f"{summary['errors']} errors in {len(summary['batches'])} batches.")
+    return summary
+
+def get_region_postcodes(region_id: int, page_size: int = 1000) -> Dict[str, Dict[str, Any]]:
+    """
+    Loads the (code, place_name, region_id) rows stored for a region, keyed by code.
+    Reads in pages so regions larger than PostgREST's row cap are not truncated.
+    """
+    return get_storage().region_postcodes(region_id, page_size=page_size)
+
+def delete_postcodes(region_id: int, codes: List[str], batch_size: int = 200) -> int:
+    """Deletes the given codes from a region in batches. Returns the number of rows deleted."""
+    deleted = 0
+    for start in range(0, len(codes), batch_size):
+        chunk = codes[start:start + batch_size]
+        deleted += get_storage().delete_postcodes(region_id, chunk)
+    if deleted:
+        invalidate_postcode_stats()
+    return deleted
+
+def sync_region_postcodes(region_id: int, rows: List[Dict[str, Any]], delete_missing: bool = True,
+                          batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Makes the stored postcodes of a region match the scraped rows, writing only the delta.
+    The region's existing rows are read once, inserts/updates/deletes are computed in memory
+    and only the changed rows are sent, in bulk.
+
+    Args:
+        region_id: The region being synced
+        rows: Scraped rows with 'code' and 'place_name'
+        delete_missing: Also delete stored codes that are no longer on the page
+            (disable for partial scrapes such as a city filter)
+
+    Returns a change summary with inserted/updated/deleted/unchanged/errors counts.
+    """
+    summary = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "errors": 0}
+    try:
+        existing = get_region_postcodes(region_id)
+    except Exception as e:
+        print(f"Error loading existing postcodes for region {region_id}: {e}")
+        summary["errors"] = len(rows)
+        return summary
+
+    inserts, updates, seen = [], [], set()
+    for row in rows:
+        code = row["code"]
+        if code in seen:
+            continue
+        seen.add(code)
+        current = existing.get(code)
+        desired = {"code": code, "place_name": row["place_name"], "region_id": region_id}
+        if current is None:
+            inserts.append(desired)
+        elif current.get("place_name") != row["place_name"]:
+            updates.append(desired)
         else:
-            print(f"Database API Error during postcode insert: {e}")
-            print(f"Error Code: {e.code}, Message: {e.message}, Details: {e.details}, Hint: {e.hint}")
-            return False
+            summary["unchanged"] += 1
+
+    changed = inserts + updates
+    if changed:
+        # DO UPDATE also covers codes that moved here from another region
+        batch_size = batch_size or POSTCODE_BATCH_SIZE
+        result = insert_postcodes_bulk(changed, batch_size=batch_size, ignore_duplicates=False)
+        summary["errors"] += result["errors"]
+        # Batches succeed or fail whole; the rows of the ones that succeeded were written
+        insert_codes = {row["code"] for row in inserts}
+        for start, batch in zip(range(0, len(changed), batch_size), result["batches"]):
+            if batch["errors"] == 0:
+                chunk = changed[start:start + batch_size]
+                inserted = sum(1 for row in chunk if row["code"] in insert_codes)
+                summary["inserted"] += inserted
+                summary["updated"] += len(chunk) - inserted
+
+    if delete_missing:
+        stale = [code for code in existing if code not in seen]
+        if stale:
+            try:
+                summary["deleted"] = delete_postcodes(region_id, stale)
+            except Exception as e:
+                print(f"Error deleting stale postcodes for region {region_id}: {e}")
+                summary["errors"] += len(stale)
+
+    print(f"Synced region {region_id}: {summary}")
+    return summary
+
+# --- Reading postcodes ---
+POSTCODE_COLUMNS = ("id", "code", "place_name", "region_id")
+
+def stream_postcodes(columns: Iterable[str] = ("id", "code", "place_name", "region_id"),
+                     region_id: Optional[int] = None, code_prefix: Optional[str] = None,
+                     place_name_contains: Optional[str] = None,
+                     after_id: Optional[int] = None, limit: Optional[int] = None,
+                     page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    Yields postcode rows ordered by id, fetching page_size rows per request.
+    Uses keyset pagination (id > last id seen), so each page is an index range scan
+    and results are never truncated by PostgREST's max-rows cap.
+
+    Args:
+        columns: Columns to select; 'id' is always included since it is the cursor
+        region_id: Only rows for this region
+        code_prefix: Only codes starting with this prefix
+        place_name_contains: Only places whose name contains this text (case-insensitive)
+        after_id: Start after this id (the cursor returned to API clients)
+        limit: Stop after this many rows
+        page_size: Rows per request. A short page ends the stream, so this must not exceed
+            the server's max-rows cap (1000 on Supabase by default)
+    """
+    columns = list(columns)
+    if "*" not in columns and "id" not in columns:
+        columns.insert(0, "id")
+
+    last_id = after_id
+    remaining = limit
+    while remaining is None or remaining > 0:
+        batch = page_size if remaining is None else min(page_size, remaining)
+        rows = get_storage().postcode_page(columns, region_id=region_id, code_prefix=code_prefix,
+                                           place_name_contains=place_name_contains, after_id=last_id, limit=batch)
+
+        yield from rows
+        if len(rows) < batch:
+            return
+        last_id = rows[-1]["id"]
+        if remaining is not None:
+            remaining -= len(rows)
+
+def get_region_names() -> Dict[int, str]:
+    """Returns {region id: region name} for every region."""
+    return {row["id"]: row["name"] for row in get_storage().select_all("regions", ("id", "name"))}
+
+# --- Statistics ---
+# A short-lived snapshot shared by the index page and job polling. Writes made
+# through this module mark it expired; writes from other processes age out via the TTL.
+# Once expired, the old snapshot keeps being served (for up to STATS_MAX_STALE seconds)
+# while a background thread refreshes it, so request threads do not wait on Supabase.
+# _stats_lock only guards the snapshot dict; it is never held across a query.
+_stats_snapshot = {"value": None, "expires_at": 0.0, "refreshing": False, "loading": None, "generation": 0}
+_stats_lock = threading.Lock()
+
+def count_postcodes(region_id: Optional[int] = None) -> int:
+    """Counts postcodes server-side (optionally for one region) without transferring the rows."""
+    return get_storage().count_postcodes(region_id)
+
+def get_recent_postcodes(limit: int = 5) -> List[Dict[str, Any]]:
+    """Returns the most recently inserted postcodes, oldest first."""
+    return list(reversed(get_storage().recent_postcodes(limit)))
+
+def get_region_counts() -> Dict[str, int]:
+    """
+    Returns {region name: postcode count}.
+    Uses the postcode_region_counts() SQL function (a single GROUP BY, see
+    supabase_utils/migrations/001_postcode_region_counts.sql) when it is installed,
+    otherwise one count-only request per region. The SQLite backend always uses a GROUP BY.
+    """
+    return get_storage().region_counts()
+
+def _load_postcode_stats() -> Dict[str, Any]:
+    return {
+        "total_postcodes": count_postcodes(),
+        "recent_postcodes": get_recent_postcodes(),
+        "region_counts": get_region_counts(),
+    }
+
+def _store_postcode_stats(stats: Dict[str, Any], generation: int, max_age: float) -> None:
+    """Saves a loaded snapshot. One loaded before the latest invalidation is kept but stays expired."""
+    with _stats_lock:
+        _stats_snapshot["value"] = stats
+        if generation == _stats_snapshot["generation"]:
+            _stats_snapshot["expires_at"] = time.monotonic() + max_age
+
+def _refresh_postcode_stats(max_age: float, generation: int) -> None:
+    """Background refresh of an expired snapshot. On failure the old snapshot is kept and retried after max_age."""
+    try:
+        _store_postcode_stats(_load_postcode_stats(), generation, max_age)
     except Exception as e:
-        import traceback
-        print(traceback.format_exc())
+        print(f"Error refreshing postcode stats: {e}")
+        with _stats_lock:
+            _stats_snapshot["expires_at"] = time.monotonic() + max_age
+    finally:
+        with _stats_lock:
+            _stats_snapshot["refreshing"] = False
+
+def get_postcode_stats(max_age: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Returns {"total_postcodes", "recent_postcodes", "region_counts"}, served from an
+    in-process snapshot that is refreshed at most every max_age seconds (STATS_CACHE_TTL).
+    Only the first call (or one after the snapshot is STATS_MAX_STALE seconds out of date)
+    waits for Supabase, and concurrent callers share that one load; later refreshes
+    happen in the background.
+    """
+    max_age = STATS_CACHE_TTL if max_age is None else max_age
+    with _stats_lock:
+        now = time.monotonic()
+        generation = _stats_snapshot["generation"]
+        if _stats_snapshot["value"] is not None:
+            if now < _stats_snapshot["expires_at"]:
+                return _stats_snapshot["value"]
+            if now < _stats_snapshot["expires_at"] + STATS_MAX_STALE:
+                if not _stats_snapshot["refreshing"]:
+                    _stats_snapshot["refreshing"] = True
+                    threading.Thread(target=_refresh_postcode_stats, args=(max_age, generation),
+                                     name="stats-refresh", daemon=True).start()
+                return _stats_snapshot["value"]
+        loading = _stats_snapshot["loading"]
+        leader = loading is None
+        if leader:
+            loading = _stats_snapshot["loading"] = threading.Event()
+
+    if not leader:
+        # Another thread is already loading; wait for its snapshot rather than querying again
+        loading.wait()
+        with _stats_lock:
+            stats = _stats_snapshot["value"]
+        return stats if stats is not None else _load_postcode_stats()
+
+    try:
+        stats = _load_postcode_stats()
+        _store_postcode_stats(stats, generation, max_age)
+        return stats
+    finally:
+        with _stats_lock:
+            _stats_snapshot["loading"] = None
+        loading.set()
+
+def invalidate_postcode_stats() -> None:
+    """
+    Marks the stats snapshot expired so the next read reflects new writes. The old snapshot
+    is still served while it is refreshed in the background.
+    """
+    with _stats_lock:
+        _stats_snapshot["expires_at"] = time.monotonic()
+        _stats_snapshot["generation"] += 1
+
+# --- Jobs ---
+# Scrape jobs are mirrored to the jobs table so they outlive the local queue. Writes normally
+# go through supabase_utils.job_store, which buffers and batches them.
+
+def ensure_jobs_table_exists() -> bool:
+    """Checks that the jobs table can be queried. The table itself is created manually or via migrations."""
+    try:
+        get_storage().check_jobs_table()
+        print(f"Jobs table exists ({get_storage().name} storage)")
+        return True
+    except Exception as e:
+        if "relation" in str(e) and "does not exist" in str(e):
+            print("Warning: the 'jobs' table does not exist. Create it in Supabase to keep job history.")
+        else:
+            print(f"Error checking jobs table: {e}")
+        return False
+
+# Job metadata columns written by upsert_jobs; results live in job_results
+JOB_COLUMNS = ("status", "state", "city", "preview", "results_count", "message", "db_entries", "error_details",
+               "timings")
+# Columns added by later, optional migrations (003_job_timings.sql). A jobs table without one
+# still gets its rows: the column is dropped from writes and reads, with a single warning.
+OPTIONAL_JOB_COLUMNS = ("timings",)
+_missing_job_columns = set()
+
+def _job_columns() -> tuple:
+    return tuple(column for column in JOB_COLUMNS if column not in _missing_job_columns)
+
+def _note_missing_job_column(error: Exception) -> bool:
+    """Returns True if `error` is about an optional jobs column that was not known to be missing."""
+    message = str(error)
+    for column in OPTIONAL_JOB_COLUMNS:
+        if column not in _missing_job_columns and column in message and "column" in message.lower():
+            _missing_job_columns.add(column)
+            print(f"Warning: the jobs table has no '{column}' column; storing jobs without it. "
+                  f"Run the migration that adds it to keep it.")
+            return True
+    return False
+
+def job_row(job_id: str, job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Builds the jobs table row for a job dict. Results are not included; see save_job_results."""
+    row = {column: job_data.get(column) for column in JOB_COLUMNS}
+    row.update({
+        "id": job_id,
+        "status": job_data.get("status", "unknown"),
+        "state": job_data.get("state", ""),
+        "preview": json.dumps(job_data.get("preview") or []),
+        "results_count": job_data.get("results_count", 0),
+        "db_entries": job_data.get("db_entries", 0),
+        "updated_at": datetime.now().isoformat(),
+    })
+    return row
+
+def upsert_jobs(rows: List[Dict[str, Any]]) -> None:
+    """Writes job rows in one upsert request. created_at is left to the column default."""
+    while rows:
+        try:
+            get_storage().upsert_jobs([
+                {column: value for column, value in row.items() if column not in _missing_job_columns}
+                for row in rows
+            ])
+            return
+        except Exception as e:
+            if not _note_missing_job_column(e):
+                raise
+
+def save_job(job_id: str, job_data: Dict[str, Any]) -> bool:
+    """Inserts or updates a single job row. Returns False if the write failed."""
+    try:
+        upsert_jobs([job_row(job_id, job_data)])
+        return True
+    except Exception as e:
+        print(f"Failed to save job {job_id}: {e}")
         return False
 
-# Legacy functions maintained for backwards compatibility
+def load_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Reads a job's metadata row, decoding its JSON columns. Returns None if missing or on error."""
+    try:
+        try:
+            job_data = get_storage().load_job(job_id, ("id", "created_at", "updated_at") + _job_columns())
+        except Exception as e:
+            if not _note_missing_job_column(e):
+                raise
+            job_data = get_storage().load_job(job_id, ("id", "created_at", "updated_at") + _job_columns())
+        if job_data is None:
+            return None
+        if isinstance(job_data.get("preview"), str):
+            job_data["preview"] = json.loads(job_data["preview"] or "[]")
+        return job_data
+    except Exception as e:
+        print(f"Failed to get job {job_id}: {e}")
+        return None
+
+def save_job_results(job_id: str, results: List[Dict[str, Any]]) -> None:
+    """
+    Stores a finished job's full result list once, in the job_results table. The job's row
+    must already be written (job_results.job_id references jobs). Raises if the write fails.
+    """
+    get_storage().save_job_results(job_id, results)
+
+def load_job_results(job_id: str) -> Optional[List[Dict[str, Any]]]:
+    """Reads a job's full result list, or None if it was not stored."""
+    try:
+        return get_storage().load_job_results(job_id)
+    except Exception as e:
+        print(f"Failed to get results of job {job_id}: {e}")
+        return None
+
+# Legacy functions maintained for backwards compatibility; they return raw Supabase
+# responses, so they always use Supabase whatever STORAGE_BACKEND is set to
 def insert_country(data):
-    response = supabase.table("countries").insert(data).execute()
+    response = get_supabase().table("countries").insert(data).execute()
     return response
 
 def insert_region(data):
-    response = supabase.table("regions").insert(data).execute()
+    response = get_supabase().table("regions").insert(data).execute()
     return response
 
 def insert_postcode(data):
-    response = supabase.table("postcodes").insert(data).execute()
+    response = get_supabase().table("postcodes").insert(data).execute()
     return response
 
 def get_region_id(region_name, country_id):
-    response = supabase.table("regions").select("id").eq("name", region_name).eq("country_id", country_id).execute()
+    response = get_supabase().table("regions").select("id").eq("name", region_name).eq("country_id", country_id).execute()
     return response.data[0]['id'] if response.data else None
 
 def get_country_id(country_name):
-    response = supabase.table("countries").select("id").eq("name", country_name).execute()
+    response = get_supabase().table("countries").select("id").eq("name", country_name).execute()
     return response.data[0]['id'] if response.data else None
 
 def get_all_postcodes():
     """
-    Retrieves all postcodes from the database
+    Retrieves all postcodes from the database.
+    Prefer stream_postcodes for large tables; this materialises every row in memory.
     """
     try:
-        response = supabase.table("postcodes").select("*").execute()
-        if hasattr(response, 'data'):
-            return response.data
-        return []
+        return list(stream_postcodes(columns=["*"]))
     except Exception as e:
         print(f"Error retrieving postcodes: {e}")
         return []
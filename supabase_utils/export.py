@@ -0,0 +1,186 @@
+"""
+Streaming exports of stored postcodes.
+
+Rows are read from the postcodes table one keyset page at a time and encoded as
+they arrive, so an export holds at most one page of rows (or one Parquet row
+group) in memory regardless of how many postcodes it covers.
+"""
+
+import csv
+import io
+import json
+from typing import Dict, Any, Optional, List, Iterator, Iterable
+
+from supabase_utils.db_client import stream_postcodes, get_region_names
+from scraper.city_filter import as_city_filter
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Exported columns, in order
+EXPORT_COLUMNS = ("code", "place_name", "state")
+
+# Rows encoded per yielded chunk; larger chunks mean fewer, bigger writes to the socket
+CSV_ROWS_PER_CHUNK = 500
+PARQUET_ROW_GROUP_SIZE = 10000
+
+
+class ExportFormatUnavailable(Exception):
+    """Raised when an export format needs an optional dependency that is not installed."""
+
+
+def iter_export_rows(states: Optional[Iterable[str]] = None, region_ids: Optional[Iterable[int]] = None,
+                     city: Optional[str] = None, city_match: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields {"code", "place_name", "state"} rows from the database.
+
+    Args:
+        states: Region (state) names to export
+        region_ids: Region ids to export
+        city: Only places matching this city, with the same normalised matching as the scraper
+        city_match: How the city is matched (see scraper.city_filter.MATCH_MODES), contains by default
+
+    With neither states nor region_ids, every stored postcode is exported.
+    """
+    region_names = get_region_names()
+    region_ids_by_name = {name: region_id for region_id, name in region_names.items()}
+    wanted = list(region_ids or [])
+    for state in states or []:
+        if state in region_ids_by_name:
+            wanted.append(region_ids_by_name[state])
+
+    if not wanted and not states:
+        scopes = [None]
+    else:
+        # Deduplicate while keeping the requested order
+        scopes = list(dict.fromkeys(wanted))
+
+    city_filter = as_city_filter(city, city_match)
+    for region_id in scopes:
+        # The database cannot strip accents or match fuzzily, so the city is matched here
+        rows = stream_postcodes(columns=("code", "place_name", "region_id"), region_id=region_id)
+        for row in rows:
+            if city_filter is not None and not city_filter.matches(row.get("place_name")):
+                continue
+            yield {
+                "code": row.get("code"),
+                "place_name": row.get("place_name"),
+                "state": region_names.get(row.get("region_id")),
+            }
+
+
+def stream_csv(rows: Iterable[Dict[str, Any]], columns: Iterable[str] = EXPORT_COLUMNS,
+               header: Optional[List[str]] = None) -> Iterator[str]:
+    """Encodes rows as CSV, yielding a header chunk followed by chunks of CSV_ROWS_PER_CHUNK rows."""
+    columns = list(columns)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header or columns)
+
+    pending = 0
+    for row in rows:
+        writer.writerow([row.get(column) for column in columns])
+        pending += 1
+        if pending >= CSV_ROWS_PER_CHUNK:
+            yield _drain(buffer)
+            pending = 0
+    yield _drain(buffer)
+
+
+def stream_ndjson(rows: Iterable[Dict[str, Any]], columns: Iterable[str] = EXPORT_COLUMNS) -> Iterator[str]:
+    """Encodes rows as newline-delimited JSON, one object per line."""
+    columns = list(columns)
+    for row in rows:
+        yield json.dumps({column: row.get(column) for column in columns}) + "\n"
+
+
+def stream_parquet(rows: Iterable[Dict[str, Any]], columns: Iterable[str] = EXPORT_COLUMNS) -> Iterator[bytes]:
+    """
+    Encodes rows as a Parquet file, one row group per PARQUET_ROW_GROUP_SIZE rows.
+    Requires pyarrow, which is an optional dependency.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportFormatUnavailable("Parquet export requires pyarrow (pip install pyarrow)")
+
+    columns = list(columns)
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def write_group(group):
+        table = pa.Table.from_pydict(
+            {column: [row.get(column) for row in group] for column in columns}, schema=schema
+        )
+        writer.write_table(table)
+
+    group = []
+    for row in rows:
+        group.append(row)
+        if len(group) >= PARQUET_ROW_GROUP_SIZE:
+            write_group(group)
+            group = []
+            yield sink.drain()
+    if group:
+        write_group(group)
+    writer.close()
+    yield sink.drain()
+
+
+def check_format(export_format: str) -> None:
+    """Raises ValueError for unknown formats and ExportFormatUnavailable for missing dependencies."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}', expected one of: {', '.join(EXPORT_FORMATS)}")
+    if export_format == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ExportFormatUnavailable("Parquet export requires pyarrow (pip install pyarrow)")
+
+
+def stream_export(rows: Iterable[Dict[str, Any]], export_format: str) -> Iterator:
+    """Returns the chunk generator for an export format."""
+    check_format(export_format)
+    if export_format == "csv":
+        return stream_csv(rows)
+    if export_format == "ndjson":
+        return stream_ndjson(rows)
+    return stream_parquet(rows)
+
+
+def _drain(buffer: io.StringIO) -> str:
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return chunk
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the caller in chunks."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        chunk = b"".join(self._chunks)
+        self._chunks = []
+        return chunk
@@ -0,0 +1,150 @@
+"""
+Write-behind store for the Supabase jobs table.
+
+save() only records the latest state of a job in memory. A background thread
+flushes everything buffered every JOB_STORE_FLUSH_INTERVAL seconds as a single
+upsert, so a burst of transitions for one job (or many jobs) costs one request.
+Finished jobs are flushed right away. Full result lists are written once, to
+job_results, instead of being re-sent with every status change. job_results
+references the jobs table, so results are only written after their job's row.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+from typing import Dict, Any, Optional, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import JOB_STORE_FLUSH_INTERVAL
+from supabase_utils.db_client import job_row, upsert_jobs, load_job, save_job_results
+
+# Statuses after which a job no longer changes
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class JobStore:
+    """Buffers job writes and batches them into upserts."""
+
+    def __init__(self, flush_interval=JOB_STORE_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        # job id -> result list waiting for its job's row to be written
+        self._pending_results = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+        self.counters = {"saves": 0, "coalesced": 0, "flushes": 0, "rows_written": 0, "flush_errors": 0}
+
+    def save(self, job_id: str, job: Dict[str, Any], results: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Queues the job's current metadata, and its results if given, for the next flush."""
+        with self._lock:
+            self.counters["saves"] += 1
+            if job_id in self._pending:
+                self.counters["coalesced"] += 1
+            self._pending[job_id] = job_row(job_id, job)
+            if results is not None:
+                self._pending_results[job_id] = results
+            self._start_flusher()
+        if job.get("status") in FINISHED_STATUSES or results is not None:
+            self._wake.set()
+
+    def save_now(self, job_id: str, job: Dict[str, Any], results: Optional[List[Dict[str, Any]]] = None) -> None:
+        """
+        Writes the job's row, then its results, before returning, so /job/<id>/results can be
+        read straight away. Raises if either write fails; nothing stays buffered in that case.
+        """
+        row = job_row(job_id, job)
+        # Holding the flush lock keeps an older buffered row of this job from being written after this one
+        with self._flush_lock:
+            with self._lock:
+                self.counters["saves"] += 1
+                self._pending.pop(job_id, None)
+                if results is not None:
+                    self._pending_results.pop(job_id, None)
+            upsert_jobs([row])
+            self.counters["rows_written"] += 1
+            if results is not None:
+                save_job_results(job_id, results)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a job's metadata, including writes still buffered in this process."""
+        with self._lock:
+            row = self._pending.get(job_id)
+        if row is not None:
+            return dict(row, preview=json.loads(row["preview"]))
+        return load_job(job_id)
+
+    def flush(self) -> None:
+        """
+        Writes every buffered job in one upsert, then the buffered results of those jobs.
+        Rows and results that fail stay buffered for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, {}
+                results, self._pending_results = self._pending_results, {}
+            if not rows and not results:
+                return
+            try:
+                upsert_jobs(list(rows.values()))
+                self.counters["flushes"] += 1
+                self.counters["rows_written"] += len(rows)
+            except Exception as e:
+                print(f"Failed to write {len(rows)} job rows: {e}")
+                self.counters["flush_errors"] += 1
+                with self._lock:
+                    # Keep newer updates that arrived while this flush was running
+                    for job_id, row in rows.items():
+                        self._pending.setdefault(job_id, row)
+                    for job_id, job_results in results.items():
+                        self._pending_results.setdefault(job_id, job_results)
+                return
+
+            # Every job with buffered results had its row in this flush or in an earlier one
+            for job_id, job_results in results.items():
+                try:
+                    save_job_results(job_id, job_results)
+                except Exception as e:
+                    print(f"Failed to save results of job {job_id}: {e}")
+                    self.counters["flush_errors"] += 1
+                    with self._lock:
+                        self._pending_results.setdefault(job_id, job_results)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, buffered=len(self._pending), buffered_results=len(self._pending_results))
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._run, name="job-store-flush", daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Returns the process-wide job store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def flush_job_store() -> None:
+    if _store is not None:
+        _store.flush()
+
+
+atexit.register(flush_job_store)
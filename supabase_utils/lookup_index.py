@@ -0,0 +1,264 @@
+"""
+In-process, read-optimised index of stored postcodes for the /lookup endpoints.
+
+The index is split into one partition per region. A partition holds a dict from
+code to place name and the region's normalised place names in sorted order. The
+sorted names of every region are also merged into one array, so:
+- a code lookup is two dict reads;
+- a place-name prefix lookup, with or without a state, is one binary search
+  followed by a short scan.
+
+Partitions are immutable. A refresh builds new partitions, a new code map and a
+new merged array, then swaps them in together, so readers never take a lock. When a scrape job completes, only the regions it touched
+are reloaded. The whole index is also reloaded every LOOKUP_FULL_RELOAD_INTERVAL
+seconds to pick up writes made elsewhere.
+"""
+
+import itertools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Any, Optional, List, Callable, Iterable
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import LOOKUP_REFRESH_INTERVAL, LOOKUP_FULL_RELOAD_INTERVAL
+from supabase_utils.db_client import stream_postcodes, get_region_names, find_region_id
+from scraper.city_filter import CityFilter, normalize_place
+
+
+def prefix_range(keys: List[str], key: str, limit: int):
+    """Returns (start, end) of at most `limit` entries of the sorted `keys` that start with `key`."""
+    start = end = bisect_left(keys, key)
+    stop = min(len(keys), start + limit)
+    while end < stop and keys[end].startswith(key):
+        end += 1
+    return start, end
+
+
+class RegionPartition:
+    """The postcodes of one region: code -> place name, plus normalised names and their codes in name order."""
+
+    __slots__ = ("region_id", "places", "keys", "codes")
+
+    def __init__(self, region_id: int, rows: Iterable[Dict[str, Any]]):
+        self.region_id = region_id
+        self.places = {row["code"]: row["place_name"] for row in rows}
+        pairs = sorted((normalize_place(place), code) for code, place in self.places.items())
+        self.keys = [key for key, _ in pairs]
+        self.codes = [code for _, code in pairs]
+
+    def __len__(self):
+        return len(self.places)
+
+
+class MergedNames:
+    """The sorted names of every partition in one array, for prefix lookups across all regions."""
+
+    __slots__ = ("keys", "codes", "region_ids")
+
+    def __init__(self, partitions: Iterable[RegionPartition]):
+        # Each partition is already sorted, so this sort only merges runs
+        triples = sorted(itertools.chain.from_iterable(
+            zip(partition.keys, partition.codes, itertools.repeat(partition.region_id)) for partition in partitions
+        ))
+        self.keys = [key for key, _, _ in triples]
+        self.codes = [code for _, code, _ in triples]
+        self.region_ids = [region_id for _, _, region_id in triples]
+
+
+class LookupIndex:
+    """Postcode lookups served from memory. Safe to read from any thread while it is refreshed."""
+
+    def __init__(self):
+        self._partitions = {}
+        self._merged = MergedNames(())
+        # code -> region id; partitions hold the place names
+        self._regions_by_code = {}
+        self._region_names = {}
+        self._refresh_lock = threading.Lock()
+        self.loaded_at = None
+        self._needs_full_load = False
+        self.counters = {"full_loads": 0, "region_refreshes": 0, "refresh_errors": 0}
+
+    # --- Loading ---
+
+    def load(self) -> None:
+        """(Re)builds every partition from the postcodes table in one pass."""
+        with self._refresh_lock:
+            region_names = get_region_names()
+            rows_by_region = {}
+            for row in stream_postcodes(columns=("id", "code", "place_name", "region_id")):
+                rows_by_region.setdefault(row["region_id"], []).append(row)
+            partitions = {
+                region_id: RegionPartition(region_id, rows) for region_id, rows in rows_by_region.items()
+            }
+            regions_by_code = {
+                code: region_id for region_id, partition in partitions.items() for code in partition.places
+            }
+            merged = MergedNames(partitions.values())
+            self._partitions, self._regions_by_code, self._merged, self._region_names = (
+                partitions, regions_by_code, merged, region_names)
+            self.loaded_at = time.time()
+            self._needs_full_load = False
+            self.counters["full_loads"] += 1
+
+    def refresh_regions(self, region_ids: Iterable[int]) -> None:
+        """Reloads the partitions of the given regions, e.g. after a scrape job wrote them."""
+        with self._refresh_lock:
+            partitions = dict(self._partitions)
+            regions_by_code = dict(self._regions_by_code)
+            for region_id in set(region_ids):
+                rows = list(stream_postcodes(columns=("id", "code", "place_name"), region_id=region_id))
+                partition = RegionPartition(region_id, rows)
+                old = partitions.get(region_id)
+                partitions[region_id] = partition
+                if old is not None:
+                    for code in old.places:
+                        if code not in partition.places and regions_by_code.get(code) == region_id:
+                            del regions_by_code[code]
+                for code in partition.places:
+                    regions_by_code[code] = region_id
+                self.counters["region_refreshes"] += 1
+            region_names = self._region_names
+            if any(region_id not in region_names for region_id in partitions):
+                region_names = get_region_names()
+            # Readers never see a half-applied refresh: everything is built first, then swapped in together
+            merged = MergedNames(partitions.values())
+            self._partitions, self._regions_by_code, self._merged, self._region_names = (
+                partitions, regions_by_code, merged, region_names)
+
+    def refresh_states(self, states: Iterable[str]) -> None:
+        """Reloads the partitions of the named states. Unknown names are skipped."""
+        region_ids = [find_region_id(state) for state in states]
+        self.refresh_regions(region_id for region_id in region_ids if region_id is not None)
+
+    # --- Reading ---
+
+    def _result(self, code: str, region_id: int) -> Optional[Dict[str, Any]]:
+        partition = self._partitions.get(region_id)
+        if partition is None or code not in partition.places:
+            return None
+        return {"code": code, "place_name": partition.places[code], "region_id": region_id,
+                "state": self._region_names.get(region_id)}
+
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        """Returns {"code", "place_name", "region_id", "state"} for a postcode, or None."""
+        region_id = self._regions_by_code.get(code)
+        return None if region_id is None else self._result(code, region_id)
+
+    def find_places(self, prefix: str, region_id: Optional[int] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Returns postcodes whose normalised place name starts with `prefix`, ordered by place name.
+
+        Args:
+            prefix: Place name prefix; matched case-insensitively
+            region_id: Only search this region's partition
+            limit: Maximum number of results
+        """
+        key = normalize_place(prefix)
+        if region_id is not None:
+            partition = self._partitions.get(region_id)
+            if partition is None:
+                return []
+            start, end = prefix_range(partition.keys, key, limit)
+            results = (self._result(code, region_id) for code in partition.codes[start:end])
+        else:
+            merged = self._merged
+            start, end = prefix_range(merged.keys, key, limit)
+            results = (self._result(code, match_region)
+                       for code, match_region in zip(merged.codes[start:end], merged.region_ids[start:end]))
+        # A partition refreshed in the meantime may no longer hold the code
+        return [result for result in results if result is not None]
+
+    def filter_places(self, city_filter: CityFilter, region_id: Optional[int] = None,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the stored postcodes matching a city filter, ordered by place name, without scraping.
+        Exact and prefix filters are answered by binary search; contains and fuzzy filters check
+        each distinct normalised name once.
+
+        Args:
+            city_filter: The filter to apply to the precomputed keys
+            region_id: Only search this region's partition
+            limit: Maximum number of results (None for all)
+        """
+        if city_filter.mode in ("exact", "prefix"):
+            search_limit = len(self._regions_by_code) if limit is None else limit
+            results = self.find_places(city_filter.key, region_id=region_id, limit=search_limit)
+            if city_filter.mode == "exact":
+                results = [result for result in results if normalize_place(result["place_name"]) == city_filter.key]
+            return results
+
+        if region_id is not None:
+            partition = self._partitions.get(region_id)
+            if partition is None:
+                return []
+            keys, codes, region_ids = partition.keys, partition.codes, itertools.repeat(region_id)
+        else:
+            merged = self._merged
+            keys, codes, region_ids = merged.keys, merged.codes, merged.region_ids
+        results = []
+        decision_key, keep = None, False
+        for key, code, match_region in zip(keys, codes, region_ids):
+            # Keys are sorted, so equal names are adjacent and each is matched once
+            if key != decision_key:
+                decision_key, keep = key, city_filter.matches_key(key)
+            if keep:
+                result = self._result(code, match_region)
+                if result is not None:
+                    results.append(result)
+                    if limit is not None and len(results) >= limit:
+                        break
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self.counters,
+            regions=len(self._partitions),
+            postcodes=len(self._regions_by_code),
+            loaded_at=self.loaded_at,
+        )
+
+    # --- Background refresh ---
+
+    def start_refresher(self, changed_states: Callable[[], Iterable[str]],
+                        interval: float = LOOKUP_REFRESH_INTERVAL) -> threading.Thread:
+        """
+        Starts a daemon thread that loads the index, then every `interval` seconds reloads the
+        states returned by changed_states(), and everything once the index is
+        LOOKUP_FULL_RELOAD_INTERVAL old. After a failed refresh the next attempt reloads
+        everything, so no change is missed.
+        """
+        def run():
+            while True:
+                try:
+                    states = list(changed_states())
+                    if (self._needs_full_load or self.loaded_at is None
+                            or time.time() - self.loaded_at >= LOOKUP_FULL_RELOAD_INTERVAL):
+                        self.load()
+                    elif states:
+                        self.refresh_states(states)
+                except Exception as e:
+                    self._needs_full_load = True
+                    self.counters["refresh_errors"] += 1
+                    print(f"Error refreshing the lookup index: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name="lookup-refresh", daemon=True)
+        thread.start()
+        return thread
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_lookup_index() -> LookupIndex:
+    """Returns the process-wide lookup index. It is empty until load() has run."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LookupIndex()
+        return _index
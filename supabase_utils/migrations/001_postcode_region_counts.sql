@@ -0,0 +1,15 @@
+-- Postcode counts per region in a single GROUP BY, used by db_client.get_region_counts().
+-- Run once in the Supabase SQL editor; without it the client falls back to one count per region.
+
+CREATE INDEX IF NOT EXISTS postcodes_region_id_idx ON postcodes (region_id);
+
+CREATE OR REPLACE FUNCTION postcode_region_counts()
+RETURNS TABLE (region_name TEXT, postcode_count BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT r.name::TEXT, COUNT(p.id)
+    FROM regions r
+    LEFT JOIN postcodes p ON p.region_id = r.id
+    GROUP BY r.id, r.name
+    ORDER BY r.name;
+$$;
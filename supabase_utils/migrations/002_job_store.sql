@@ -0,0 +1,28 @@
+-- Job metadata and results, written by supabase_utils.job_store.
+-- Jobs are upserted on id, so created_at relies on its column default. Full result
+-- lists are stored once per job in job_results instead of in every jobs row update.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id UUID PRIMARY KEY,
+    status VARCHAR(50) NOT NULL,
+    state VARCHAR(100) NOT NULL,
+    city VARCHAR(100),
+    results JSONB,
+    preview JSONB,
+    results_count INTEGER DEFAULT 0,
+    message TEXT,
+    db_entries INTEGER DEFAULT 0,
+    error_details TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE jobs ALTER COLUMN created_at SET DEFAULT NOW();
+-- "All States" jobs list every state name
+ALTER TABLE jobs ALTER COLUMN state TYPE TEXT;
+
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id UUID PRIMARY KEY REFERENCES jobs (id) ON DELETE CASCADE,
+    results JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
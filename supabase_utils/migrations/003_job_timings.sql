@@ -0,0 +1,4 @@
+-- Per-stage timings of a job (fetch, parse, database writes, ...), written by the job runner.
+-- Shape: {"<stage>": {"count": <spans>, "seconds": <total>, "max": <longest span>}}
+
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS timings JSONB;
@@ -0,0 +1,32 @@
+"""
+Selects the storage backend named by STORAGE_BACKEND.
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from config import STORAGE_BACKEND, STORAGE_PATH
+from supabase_utils.storage.supabase_storage import SupabaseStorage
+from supabase_utils.storage.sqlite_storage import SQLiteStorage
+
+# Backend name -> factory; register other backends here
+STORAGE_BACKENDS = {
+    "supabase": SupabaseStorage,
+    "sqlite": lambda: SQLiteStorage(STORAGE_PATH),
+}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Returns the process-wide storage backend."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND not in STORAGE_BACKENDS:
+                raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'")
+            _storage = STORAGE_BACKENDS[STORAGE_BACKEND]()
+        return _storage
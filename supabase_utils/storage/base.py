@@ -0,0 +1,101 @@
+"""
+Interface shared by storage backends.
+
+A backend stores the countries, regions and postcodes tables and the jobs /
+job_results tables. It only performs the reads and writes; batching, the
+reference id cache, the sync diff and the stats snapshot stay in db_client, so
+they behave the same whichever backend is configured. Methods raise on failure;
+db_client decides what is logged and what is returned to callers.
+"""
+
+# Tables and columns a backend stores
+TABLE_COLUMNS = {
+    "countries": ("id", "name", "code"),
+    "regions": ("id", "name", "code", "country_id"),
+    "postcodes": ("id", "code", "place_name", "region_id"),
+}
+
+
+class DuplicateRow(Exception):
+    """Raised by insert() when a row with the same unique value already exists."""
+
+
+class StorageBackend:
+    """Base class for storage backends. Instances are shared by every thread of a process."""
+
+    name = None
+
+    def ping(self):
+        """Runs a minimal query; raises if the database cannot be reached."""
+        raise NotImplementedError
+
+    # --- Reference tables ---
+
+    def insert(self, table, data):
+        """Inserts one row and returns its id (None if the backend did not report it). Raises DuplicateRow."""
+        raise NotImplementedError
+
+    def find_id(self, table, filters):
+        """Returns the id of the first row whose columns equal `filters`, or None."""
+        raise NotImplementedError
+
+    def select_all(self, table, columns):
+        """Returns every row of a (small) table as dicts with the given columns."""
+        raise NotImplementedError
+
+    # --- Postcodes ---
+
+    def upsert_postcodes(self, rows, ignore_duplicates=True):
+        """
+        Writes one batch of postcode rows keyed on code. With ignore_duplicates existing
+        codes are left alone, otherwise they are updated. Returns the number of rows written.
+        """
+        raise NotImplementedError
+
+    def region_postcodes(self, region_id, page_size=1000):
+        """Returns {code: {"code", "place_name", "region_id"}} for every postcode of a region."""
+        raise NotImplementedError
+
+    def delete_postcodes(self, region_id, codes):
+        """Deletes the given codes of a region; returns the number of rows deleted."""
+        raise NotImplementedError
+
+    def postcode_page(self, columns, region_id=None, code_prefix=None, place_name_contains=None,
+                      after_id=None, limit=1000):
+        """
+        Returns up to `limit` postcode rows ordered by id, starting after `after_id`.
+        place_name_contains matches case-insensitively.
+        """
+        raise NotImplementedError
+
+    def count_postcodes(self, region_id=None):
+        raise NotImplementedError
+
+    def recent_postcodes(self, limit=5):
+        """Returns the `limit` most recently inserted postcodes ("code", "place_name"), newest first."""
+        raise NotImplementedError
+
+    def region_counts(self):
+        """Returns {region name: postcode count} for every region."""
+        raise NotImplementedError
+
+    # --- Jobs ---
+
+    def check_jobs_table(self):
+        """Raises if the jobs table cannot be queried."""
+        raise NotImplementedError
+
+    def upsert_jobs(self, rows):
+        """Inserts or updates job rows (see db_client.job_row) keyed on id."""
+        raise NotImplementedError
+
+    def load_job(self, job_id, columns):
+        """Returns the job row with the given columns, or None."""
+        raise NotImplementedError
+
+    def save_job_results(self, job_id, results):
+        raise NotImplementedError
+
+    def load_job_results(self, job_id):
+        """Returns a job's result list, or None if none was stored."""
+        raise NotImplementedError
@@ -0,0 +1,227 @@
+"""
+Storage backend kept in a local SQLite file.
+
+Meant for high-volume local scrapes and for benchmarking the storage layer
+without network latency. The file runs in WAL mode so the web process can read
+while job workers write, and every write batch is one BEGIN IMMEDIATE
+transaction. Postcodes are indexed on code (unique) and on (region_id, code), so
+region syncs, deletes and code-prefix filters are index range scans.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from sqlite_db import SQLiteFile
+from supabase_utils.storage.base import StorageBackend, DuplicateRow, TABLE_COLUMNS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS countries (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    code TEXT
+);
+CREATE TABLE IF NOT EXISTS regions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    code TEXT,
+    country_id INTEGER NOT NULL REFERENCES countries (id),
+    UNIQUE (country_id, name)
+);
+CREATE TABLE IF NOT EXISTS postcodes (
+    id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE,
+    place_name TEXT,
+    region_id INTEGER NOT NULL REFERENCES regions (id)
+);
+CREATE INDEX IF NOT EXISTS postcodes_by_region ON postcodes (region_id, code);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    state TEXT NOT NULL,
+    city TEXT,
+    preview TEXT,
+    results_count INTEGER DEFAULT 0,
+    message TEXT,
+    db_entries INTEGER DEFAULT 0,
+    error_details TEXT,
+    timings TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT PRIMARY KEY,
+    results TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+"""
+
+# Job columns stored as JSON text
+JSON_JOB_COLUMNS = ("timings",)
+
+
+def _check_columns(table, columns):
+    allowed = TABLE_COLUMNS.get(table)
+    if allowed is None:
+        raise ValueError(f"Unknown table '{table}'")
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown columns for '{table}': {', '.join(unknown)}")
+
+
+def _escape_glob(text):
+    # GLOB (unlike LIKE) is case-sensitive, so SQLite can answer prefix matches from the code index
+    return "".join(f"[{char}]" if char in "*?[" else char for char in text)
+
+
+class SQLiteStorage(StorageBackend):
+    """Stores every table in one SQLite file, shared by the processes on the host."""
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._db = SQLiteFile(path, SCHEMA, foreign_keys=True)
+
+    def ping(self):
+        self._db.connection().execute("SELECT id FROM countries LIMIT 1").fetchall()
+
+    def insert(self, table, data):
+        _check_columns(table, data)
+        columns = ", ".join(data)
+        placeholders = ", ".join("?" for _ in data)
+        try:
+            with self._db.transaction() as db:
+                cursor = db.execute(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", tuple(data.values()))
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE" in str(e):
+                raise DuplicateRow(str(e)) from e
+            raise
+        return cursor.lastrowid
+
+    def find_id(self, table, filters):
+        _check_columns(table, filters)
+        where = " AND ".join(f"{column} = ?" for column in filters) or "1"
+        row = self._db.connection().execute(
+            f"SELECT id FROM {table} WHERE {where} LIMIT 1", tuple(filters.values())
+        ).fetchone()
+        return row["id"] if row else None
+
+    def select_all(self, table, columns):
+        _check_columns(table, columns)
+        rows = self._db.connection().execute(f"SELECT {', '.join(columns)} FROM {table}").fetchall()
+        return [dict(row) for row in rows]
+
+    def upsert_postcodes(self, rows, ignore_duplicates=True):
+        if ignore_duplicates:
+            statement = "INSERT OR IGNORE INTO postcodes (code, place_name, region_id) VALUES (?, ?, ?)"
+        else:
+            statement = (
+                "INSERT INTO postcodes (code, place_name, region_id) VALUES (?, ?, ?) "
+                "ON CONFLICT (code) DO UPDATE SET place_name = excluded.place_name, region_id = excluded.region_id"
+            )
+        with self._db.transaction() as db:
+            before = db.total_changes
+            db.executemany(statement, ((row["code"], row.get("place_name"), row["region_id"]) for row in rows))
+            return db.total_changes - before
+
+    def region_postcodes(self, region_id, page_size=1000):
+        rows = self._db.connection().execute(
+            "SELECT code, place_name, region_id FROM postcodes WHERE region_id = ? ORDER BY code", (region_id,)
+        )
+        return {row["code"]: dict(row) for row in rows}
+
+    def delete_postcodes(self, region_id, codes):
+        with self._db.transaction() as db:
+            before = db.total_changes
+            db.executemany("DELETE FROM postcodes WHERE region_id = ? AND code = ?",
+                           ((region_id, code) for code in codes))
+            return db.total_changes - before
+
+    def postcode_page(self, columns, region_id=None, code_prefix=None, place_name_contains=None,
+                      after_id=None, limit=1000):
+        columns = TABLE_COLUMNS["postcodes"] if "*" in columns else columns
+        _check_columns("postcodes", columns)
+        where, params = [], []
+        if region_id is not None:
+            where.append("region_id = ?")
+            params.append(region_id)
+        if code_prefix:
+            where.append("code GLOB ?")
+            params.append(_escape_glob(code_prefix) + "*")
+        if place_name_contains:
+            escaped = place_name_contains.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("place_name LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if after_id is not None:
+            where.append("id > ?")
+            params.append(after_id)
+        sql = f"SELECT {', '.join(columns)} FROM postcodes"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self._db.connection().execute(sql + " ORDER BY id LIMIT ?", (*params, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_postcodes(self, region_id=None):
+        if region_id is None:
+            return self._db.connection().execute("SELECT COUNT(*) FROM postcodes").fetchone()[0]
+        return self._db.connection().execute(
+            "SELECT COUNT(*) FROM postcodes WHERE region_id = ?", (region_id,)
+        ).fetchone()[0]
+
+    def recent_postcodes(self, limit=5):
+        rows = self._db.connection().execute(
+            "SELECT code, place_name FROM postcodes ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def region_counts(self):
+        rows = self._db.connection().execute(
+            """
+            SELECT r.name, COUNT(p.id) FROM regions AS r
+            LEFT JOIN postcodes AS p ON p.region_id = r.id
+            GROUP BY r.id, r.name ORDER BY r.name
+            """
+        ).fetchall()
+        return {name: count for name, count in rows}
+
+    def check_jobs_table(self):
+        self._db.connection().execute("SELECT id FROM jobs LIMIT 1").fetchall()
+
+    def upsert_jobs(self, rows):
+        with self._db.transaction() as db:
+            for row in rows:
+                row = {column: json.dumps(value) if column in JSON_JOB_COLUMNS and value is not None else value
+                       for column, value in row.items()}
+                updates = ", ".join(f"{column} = excluded.{column}" for column in row if column != "id")
+                db.execute(
+                    f"INSERT INTO jobs ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)}) "
+                    f"ON CONFLICT (id) DO UPDATE SET {updates}",
+                    tuple(row.values()),
+                )
+
+    def load_job(self, job_id, columns):
+        row = self._db.connection().execute(
+            f"SELECT {', '.join(columns)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for column in JSON_JOB_COLUMNS:
+            if isinstance(job.get(column), str):
+                job[column] = json.loads(job[column])
+        return job
+
+    def save_job_results(self, job_id, results):
+        with self._db.transaction() as db:
+            db.execute(
+                "INSERT INTO job_results (job_id, results) VALUES (?, ?) "
+                "ON CONFLICT (job_id) DO UPDATE SET results = excluded.results",
+                (job_id, json.dumps(results)),
+            )
+
+    def load_job_results(self, job_id):
+        row = self._db.connection().execute("SELECT results FROM job_results WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["results"]) if row else None
@@ -0,0 +1,214 @@
+"""
+Storage backend for the hosted Supabase (PostgREST) database.
+
+The client is created on first use, so importing this module never touches the
+network. PostgREST requests go through the process-wide connection pool
+(http_pool) with the configured connect/read timeouts.
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from config import SUPABASE_URL, SUPABASE_KEY
+from http_pool import get_http_client
+from supabase_utils.storage.base import StorageBackend, DuplicateRow
+
+# PostgreSQL unique violation
+UNIQUE_VIOLATION = "23505"
+
+
+# supabase-py (and postgrest, which defines APIError) is imported when the client is
+# created. Until then nothing can raise an APIError, so this placeholder never matches.
+class APIError(Exception):
+    pass
+
+
+class SupabaseUnavailable(RuntimeError):
+    """Raised when the Supabase client cannot be created (missing credentials or a broken install)."""
+
+
+def initialize_supabase_client():
+    """
+    Initialize Supabase client with version compatibility handling.
+    PostgREST requests go through the process-wide connection pool (http_pool) with the
+    configured connect/read timeouts, instead of a client-private pool.
+    Returns the initialized client or raises SupabaseUnavailable.
+    """
+    # Validate Supabase credentials
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise SupabaseUnavailable("Supabase URL and Key must be set in config.py or environment variables.")
+
+    # --- Debug: Print relevant environment variables ---
+    print("--- Checking Environment Variables ---")
+    print(f"HTTP_PROXY: {os.environ.get('HTTP_PROXY')}")
+    print(f"HTTPS_PROXY: {os.environ.get('HTTPS_PROXY')}")
+    print(f"ALL_PROXY: {os.environ.get('ALL_PROXY')}")
+    print("------------------------------------")
+
+    # --- Debug: Test the connection through the shared pool ---
+    # The connection opened here stays in the pool and serves the first query
+    print("--- Testing httpx connection ---")
+    try:
+        test_url = f"{SUPABASE_URL.replace('/rest/v1', '').rstrip('/')}/auth/v1"
+        print(f"Attempting GET request to: {test_url}")
+        response = get_http_client().get(test_url)
+        print(f"httpx GET request successful. Status code: {response.status_code}")
+    except Exception as http_err:
+        print(f"httpx direct connection failed: {http_err}")
+        print("This might indicate an underlying network/proxy/SSL issue.")
+    print("------------------------------")
+
+    # --- Attempt Initialization (Simplified) ---
+    global APIError
+    try:
+        from supabase import create_client
+        from postgrest.utils import SyncClient
+        # Use the exceptions path consistently
+        from postgrest.exceptions import APIError
+    except ImportError as e:
+        print(f"Error importing Supabase modules: {e}")
+        print("Make sure 'supabase-py' is installed (`pip install supabase`).")
+        raise SupabaseUnavailable(str(e)) from e
+
+    try:
+        print("Attempting initialization with create_client...")
+        client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        session = client.postgrest.session
+        client.postgrest.session = get_http_client(
+            SyncClient, base_url=session.base_url, headers=session.headers
+        )
+        session.close()
+        print("Supabase client initialized successfully using create_client.")
+        return client
+    except Exception as e:
+        print(f"Error initializing Supabase client: {e}")
+        raise SupabaseUnavailable(str(e)) from e
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_supabase():
+    """Returns the process-wide Supabase client, creating it on first use. Raises SupabaseUnavailable."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = initialize_supabase_client()
+        return _client
+
+
+class SupabaseStorage(StorageBackend):
+    """Reads and writes through PostgREST. Every method is one or a few HTTP requests."""
+
+    name = "supabase"
+
+    def ping(self):
+        get_supabase().table("countries").select("id").limit(1).execute()
+
+    def insert(self, table, data):
+        try:
+            response = get_supabase().table(table).insert(data).execute()
+        except APIError as e:
+            if e.code == UNIQUE_VIOLATION:
+                raise DuplicateRow(str(e)) from e
+            raise
+        return response.data[0].get("id") if response.data else None
+
+    def find_id(self, table, filters):
+        query = get_supabase().table(table).select("id")
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        response = query.limit(1).execute()
+        return response.data[0]["id"] if response.data else None
+
+    def select_all(self, table, columns):
+        return get_supabase().table(table).select(",".join(columns)).execute().data
+
+    def upsert_postcodes(self, rows, ignore_duplicates=True):
+        response = (
+            get_supabase().table("postcodes")
+            .upsert(rows, on_conflict="code", ignore_duplicates=ignore_duplicates)
+            .execute()
+        )
+        # With ignore-duplicates only newly inserted rows are returned
+        return len(response.data) if getattr(response, "data", None) else 0
+
+    def region_postcodes(self, region_id, page_size=1000):
+        existing = {}
+        last_code = None
+        while True:
+            # Keyset pagination on code, so regions larger than PostgREST's row cap are not truncated
+            query = get_supabase().table("postcodes").select("code,place_name,region_id").eq("region_id", region_id)
+            if last_code is not None:
+                query = query.gt("code", last_code)
+            response = query.order("code").limit(page_size).execute()
+            for row in response.data:
+                existing[row["code"]] = row
+            if len(response.data) < page_size:
+                return existing
+            last_code = response.data[-1]["code"]
+
+    def delete_postcodes(self, region_id, codes):
+        response = get_supabase().table("postcodes").delete().eq("region_id", region_id).in_("code", codes).execute()
+        return len(response.data) if getattr(response, "data", None) else 0
+
+    def postcode_page(self, columns, region_id=None, code_prefix=None, place_name_contains=None,
+                      after_id=None, limit=1000):
+        query = get_supabase().table("postcodes").select(",".join(columns))
+        if region_id is not None:
+            query = query.eq("region_id", region_id)
+        if code_prefix:
+            query = query.like("code", f"{code_prefix}*")
+        if place_name_contains:
+            query = query.ilike("place_name", f"*{place_name_contains}*")
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        return query.order("id").limit(limit).execute().data
+
+    def count_postcodes(self, region_id=None):
+        # count="exact" counts server-side without transferring the rows
+        query = get_supabase().table("postcodes").select("id", count="exact")
+        if region_id is not None:
+            query = query.eq("region_id", region_id)
+        return query.limit(1).execute().count or 0
+
+    def recent_postcodes(self, limit=5):
+        return (
+            get_supabase().table("postcodes")
+            .select("code,place_name")
+            .order("id", desc=True)
+            .limit(limit)
+            .execute()
+            .data
+        )
+
+    def region_counts(self):
+        # postcode_region_counts() is a single GROUP BY (migrations/001_postcode_region_counts.sql);
+        # without it, fall back to one count-only request per region
+        try:
+            response = get_supabase().rpc("postcode_region_counts", {}).execute()
+            return {row["region_name"]: row["postcode_count"] for row in response.data}
+        except APIError as e:
+            print(f"postcode_region_counts() unavailable ({e.message}), counting per region instead.")
+        regions = self.select_all("regions", ("id", "name"))
+        return {region["name"]: self.count_postcodes(region["id"]) for region in regions}
+
+    def check_jobs_table(self):
+        get_supabase().table("jobs").select("id").limit(1).execute()
+
+    def upsert_jobs(self, rows):
+        get_supabase().table("jobs").upsert(rows, on_conflict="id").execute()
+
+    def load_job(self, job_id, columns):
+        response = get_supabase().table("jobs").select(",".join(columns)).eq("id", job_id).execute()
+        return response.data[0] if response.data else None
+
+    def save_job_results(self, job_id, results):
+        get_supabase().table("job_results").upsert({"job_id": job_id, "results": results}, on_conflict="job_id").execute()
+
+    def load_job_results(self, job_id):
+        response = get_supabase().table("job_results").select("results").eq("job_id", job_id).execute()
+        return response.data[0]["results"] if response.data else None
@@ -0,0 +1,135 @@
+"""
+Shared test setup. Every test runs offline: local state goes to a temporary
+directory, postcodes are stored in SQLite and pages are served from 127.0.0.1.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = tempfile.mkdtemp(prefix="scraper-tests-")
+
+# config.py reads the environment on import, so this has to run before any project module is imported
+os.environ.update(
+    SCRAPER_DATA_DIR=DATA_DIR,
+    STORAGE_BACKEND="sqlite",
+    STORAGE_PATH=os.path.join(DATA_DIR, "postcodes.sqlite3"),
+    PAGE_CACHE_DIR=os.path.join(DATA_DIR, "page_cache"),
+    JOB_QUEUE_PATH=os.path.join(DATA_DIR, "jobs.sqlite3"),
+    METRICS_PATH=os.path.join(DATA_DIR, "metrics.sqlite3"),
+    FRESHNESS_PATH=os.path.join(DATA_DIR, "freshness.sqlite3"),
+    JOB_WORKERS_EMBEDDED="false",
+    REFRESH_REQUESTS_PER_HOUR="0",
+    LOG_LEVEL="WARNING",
+)
+sys.path.insert(0, ROOT)
+
+
+def read_fixture(name):
+    with open(os.path.join(ROOT, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def age_entry(url, seconds):
+    """Moves the page cache entry of a URL `seconds` into the past; returns its new fetch time."""
+    from scraper.page_cache import get_page_cache
+    cache = get_page_cache()
+    entry = cache.get(url)
+    entry["fetched_at"] -= seconds
+    with open(cache._index_path(url), "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    return entry["fetched_at"]
+
+
+class FakeJobTables:
+    """jobs and job_results, with job_results.job_id referencing jobs like migration 002."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.results = {}
+        self.fail_jobs = False
+
+    def upsert_jobs(self, rows):
+        if self.fail_jobs:
+            raise RuntimeError("jobs unavailable")
+        for row in rows:
+            self.jobs[row["id"]] = row
+
+    def save_job_results(self, job_id, results):
+        if job_id not in self.jobs:
+            raise RuntimeError("insert on job_results violates foreign key constraint")
+        self.results[job_id] = results
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    """Replaces the jobs and job_results tables the job store writes to."""
+    tables = FakeJobTables()
+    monkeypatch.setattr("supabase_utils.job_store.upsert_jobs", tables.upsert_jobs)
+    monkeypatch.setattr("supabase_utils.job_store.save_job_results", tables.save_job_results)
+    return tables
+
+
+class PageServer:
+    """
+    Serves one body per path with an ETag, answering 304 to a matching If-None-Match.
+    Status codes queued in `failures[path]` are answered first, one per request.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.failures = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append((self.path, self.headers.get("If-None-Match")))
+                if server.failures.get(self.path):
+                    self.send_response(server.failures[self.path].pop(0))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = server.pages.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                etag = f'"{hash(body)}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.httpd.server_port}{path}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def page_server():
+    server = PageServer()
+    yield server
+    server.close()
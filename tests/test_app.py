@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+from app import app, get_job_queue
+from job_queue.base import PENDING, COMPLETED
+from supabase_utils.db_client import get_or_create_country_id, get_or_create_region_id, get_postcode_stats
+from supabase_utils.storage.backends import get_storage
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def test_completed_job_refreshes_postcode_stats(client):
+    region_id = get_or_create_region_id("Stats Region", get_or_create_country_id("United States", "US"))
+    queue = get_job_queue()
+    queue.enqueue("stats-job", {"status": PENDING, "state": "Vermont", "preview": []}, {"state": "Vermont"})
+    assert queue.claim(worker=1)[0] == "stats-job"
+    before = get_postcode_stats()["total_postcodes"]
+    assert client.get("/job/stats-job").get_json()["status"] == "running"
+
+    # A worker process writes postcodes; only its own stats snapshot is cleared
+    get_storage().upsert_postcodes([{"code": "99001", "place_name": "Statsville", "region_id": region_id}])
+    assert get_postcode_stats()["total_postcodes"] == before
+    queue.finish("stats-job", COMPLETED, {"state": "Vermont", "preview": [], "results_count": 1, "db_entries": 1})
+
+    response = client.get("/job/stats-job").get_json()
+
+    # The old snapshot is still served while it is refreshed in the background
+    assert response["status"] == COMPLETED
+    deadline = time.monotonic() + 5
+    while get_postcode_stats()["total_postcodes"] != before + 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert get_postcode_stats()["total_postcodes"] == before + 1
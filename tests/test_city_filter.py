@@ -0,0 +1,50 @@
+import pytest
+
+from scraper.city_filter import CityFilter, as_city_filter, edit_distance_within, normalize_place
+
+
+@pytest.mark.parametrize("a, b, limit, expected", [
+    ("concord", "concord", 0, True),
+    ("concord", "concrd", 1, True),
+    ("concord", "concorde", 1, True),
+    ("concord", "comcord", 1, True),
+    ("concord", "cnocord", 1, True),
+    ("concord", "cnocrod", 1, False),
+    ("concord", "cnocrod", 2, True),
+    ("concord", "conc", 2, False),
+    ("", "ab", 2, True),
+])
+def test_edit_distance_within(a, b, limit, expected):
+    assert edit_distance_within(a, b, limit) is expected
+    assert edit_distance_within(b, a, limit) is expected
+
+
+def test_place_names_are_matched_by_key():
+    assert normalize_place("St. Mary's") == normalize_place("ST-MARYS") == "st marys"
+    assert normalize_place("Saint-Étienne's") == "saint etiennes"
+
+
+@pytest.mark.parametrize("mode, kept", [
+    ("contains", ["Manchester", "Manchester Center", "West Manchester"]),
+    ("exact", ["Manchester"]),
+    ("prefix", ["Manchester", "Manchester Center"]),
+    ("fuzzy", ["Manchester", "Manchestre"]),
+])
+def test_match_modes(mode, kept):
+    rows = [{"code": str(i), "place_name": place} for i, place in enumerate(
+        ["Manchester", "Manchester Center", "West Manchester", "Manchestre", "Concord"])]
+
+    assert [row["place_name"] for row in CityFilter("manchester", mode).apply(rows)] == kept
+
+
+def test_fuzzy_distance_shrinks_for_short_names():
+    assert CityFilter("Avon", "fuzzy").max_distance == 1
+    assert CityFilter("Avon", "fuzzy").matches("Avan")
+    assert not CityFilter("Avon", "fuzzy").matches("Aven Hill")
+
+
+def test_unknown_mode_and_blank_city():
+    with pytest.raises(ValueError):
+        CityFilter("Avon", "regex")
+    assert as_city_filter("  ") is None
+    assert as_city_filter("Avon").mode == "contains"
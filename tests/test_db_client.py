@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+import supabase_utils.db_client as db_client
+
+
+class StorageWithoutTimings:
+    """A jobs table created by 002_job_store.sql only, rejecting the column 003 adds."""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def upsert_jobs(self, rows):
+        for row in rows:
+            if "timings" in row:
+                raise RuntimeError("Could not find the 'timings' column of 'jobs' in the schema cache")
+        for row in rows:
+            self.jobs[row["id"]] = row
+
+    def load_job(self, job_id, columns):
+        if "timings" in columns:
+            raise RuntimeError("column jobs.timings does not exist")
+        return self.jobs.get(job_id)
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = StorageWithoutTimings()
+    monkeypatch.setattr(db_client, "get_storage", lambda: storage)
+    monkeypatch.setattr(db_client, "_missing_job_columns", set())
+    return storage
+
+
+def test_jobs_are_stored_without_a_missing_optional_column(storage, capsys):
+    job = {"status": "completed", "state": "Maine", "timings": {"parse": {"count": 1}}}
+
+    assert db_client.save_job("job-1", job)
+    assert db_client.save_job("job-2", job)
+
+    assert "timings" not in storage.jobs["job-1"] and "job-2" in storage.jobs
+    assert capsys.readouterr().out.count("no 'timings' column") == 1
+    assert db_client.load_job("job-1")["state"] == "Maine"
+
+
+def test_other_errors_still_raise(storage):
+    with pytest.raises(KeyError):
+        db_client.upsert_jobs([{"status": "completed"}])
+
+
+@pytest.fixture
+def stats_loads(monkeypatch):
+    """Replaces the stats queries with a counter that a test can hold up."""
+    loads = {"count": 0, "release": None}
+
+    def load():
+        if loads["release"] is not None:
+            loads["release"].wait(5)
+        loads["count"] += 1
+        return {"total_postcodes": loads["count"], "recent_postcodes": [], "region_counts": {}}
+
+    monkeypatch.setattr(db_client, "_load_postcode_stats", load)
+    monkeypatch.setattr(db_client, "_stats_snapshot", {"value": None, "expires_at": 0.0, "refreshing": False,
+                                                       "loading": None, "generation": 0})
+    return loads
+
+
+def test_invalidated_stats_are_refreshed_in_the_background(stats_loads):
+    assert db_client.get_postcode_stats()["total_postcodes"] == 1
+    stats_loads["release"] = threading.Event()
+
+    db_client.invalidate_postcode_stats()
+
+    # Served at once from the old snapshot while the refresh waits on the database
+    assert db_client.get_postcode_stats()["total_postcodes"] == 1
+    stats_loads["release"].set()
+    deadline = time.monotonic() + 5
+    while db_client.get_postcode_stats()["total_postcodes"] != 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert db_client.get_postcode_stats()["total_postcodes"] == 2
+
+
+def test_cold_load_runs_once_without_holding_the_lock(stats_loads):
+    stats_loads["release"] = threading.Event()
+    results = []
+    readers = [threading.Thread(target=lambda: results.append(db_client.get_postcode_stats())) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    time.sleep(0.05)
+
+    # A writer can still invalidate while the first load is in flight
+    assert db_client._stats_lock.acquire(timeout=1)
+    db_client._stats_lock.release()
+    stats_loads["release"].set()
+    for reader in readers:
+        reader.join(5)
+
+    assert stats_loads["count"] == 1
+    assert [stats["total_postcodes"] for stats in results] == [1, 1, 1]
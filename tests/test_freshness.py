@@ -0,0 +1,53 @@
+from tests.conftest import read_fixture, age_entry
+from job_queue.refresh import RefreshScheduler
+from scraper.fetchers import HttpFetcher
+from scraper.freshness import get_state_freshness, StateFreshness
+from scraper.geonames_scraper import fetch_postcode_page, process_postcode_page
+
+
+def scrape(url, state):
+    report = {}
+    page = fetch_postcode_page([url], [HttpFetcher()], report)
+    process_postcode_page(state, page, None, report)
+    return page
+
+
+def age_record(state, seconds):
+    freshness = get_state_freshness()
+    freshness._db.connection().execute(
+        "UPDATE state_freshness SET fetched_at = fetched_at - ? WHERE state = ?", (seconds, state)
+    )
+
+
+def test_cache_hit_does_not_change_state_age(page_server):
+    page_server.pages["/vermont"] = read_fixture("page_source_0.html")
+    url = page_server.url("/vermont")
+    scrape(url, "Vermont")
+    age_entry(url, 1000)
+    age_record("Vermont", 1000)
+    age_before = StateFreshness.age(get_state_freshness().get("Vermont"))
+
+    page = scrape(url, "Vermont")
+
+    assert page.from_cache and page.status_code == 200
+    record = get_state_freshness().get("Vermont")
+    assert abs(StateFreshness.age(record) - age_before) < 5
+    assert record["requests"] == 0
+    # Still due for a refresh, although it was just scraped (from the cache)
+    scheduler = RefreshScheduler(["Vermont"], lambda state: f"{state}|", requests_per_hour=60, refresh_after=500)
+    assert [state for _, state, _ in scheduler.due_states()] == ["Vermont"]
+
+
+def test_revalidated_page_resets_state_age(page_server):
+    page_server.pages["/idaho"] = read_fixture("page_source_0.html")
+    url = page_server.url("/idaho")
+    scrape(url, "Idaho")
+    age_entry(url, 100000)
+    age_record("Idaho", 100000)
+
+    page = scrape(url, "Idaho")
+
+    assert page.status_code == 304
+    record = get_state_freshness().get("Idaho")
+    assert StateFreshness.age(record) < 5
+    assert record["requests"] == 1
@@ -0,0 +1,47 @@
+import time
+
+from job_queue.cache import JobCache
+
+
+def test_pinned_entries_are_not_evicted_for_room():
+    cache = JobCache(max_entries=2, max_bytes=10 ** 6, ttl=60)
+    cache.put("running", {"status": "running"}, pinned=True)
+    cache.put("old", {"status": "completed"})
+    cache.put("new", {"status": "completed"})
+
+    assert cache.get("running") is not None
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_only_pinned_entries_may_exceed_the_limit():
+    cache = JobCache(max_entries=1, max_bytes=10 ** 6, ttl=60)
+    cache.put("a", {"status": "running"}, pinned=True)
+    cache.put("b", {"status": "running"}, pinned=True)
+
+    assert cache.stats()["entries"] == 2 and cache.stats()["pinned"] == 2
+
+
+def test_pinned_entry_expires_once_nobody_reads_it(monkeypatch):
+    now = [time.monotonic()]
+    monkeypatch.setattr("job_queue.cache.time.monotonic", lambda: now[0])
+    cache = JobCache(max_entries=10, max_bytes=10 ** 6, ttl=60)
+    cache.put("running", {"status": "running"}, pinned=True)
+
+    now[0] += 50
+    assert cache.get("running") is not None
+    now[0] += 50
+    # The read above extended it
+    assert cache.get("running") is not None
+    now[0] += 61
+    assert cache.get("running") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_entry_read_at_another_version_is_a_miss():
+    cache = JobCache(max_entries=10, max_bytes=10 ** 6, ttl=60)
+    cache.put("job", {"status": "running"}, version=3, pinned=True)
+
+    assert cache.get("job", version=4) is None
+    assert cache.get("job", version=3) == {"status": "running"}
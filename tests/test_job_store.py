@@ -0,0 +1,58 @@
+import pytest
+
+from supabase_utils.job_store import JobStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = JobStore(flush_interval=3600)
+    # Flushes run only when a test calls flush()
+    monkeypatch.setattr(store, "_start_flusher", lambda: None)
+    return store
+
+
+RESULTS = [{"Post-Code": "05001", "City/Town": "White River Junction"}]
+
+
+def test_results_are_written_after_the_job_row(tables, store):
+    store.save("job-1", {"status": "completed", "state": "Vermont"}, results=RESULTS)
+    assert tables.jobs == {} and tables.results == {}
+
+    store.flush()
+
+    assert tables.jobs["job-1"]["status"] == "completed"
+    assert tables.results["job-1"] == RESULTS
+    assert store.stats()["buffered_results"] == 0
+
+
+def test_failed_row_upsert_keeps_results_buffered(tables, store):
+    tables.fail_jobs = True
+    store.save("job-1", {"status": "completed", "state": "Vermont"}, results=RESULTS)
+    store.flush()
+    assert store.stats()["buffered"] == 1 and store.stats()["buffered_results"] == 1
+
+    tables.fail_jobs = False
+    store.flush()
+
+    assert tables.results["job-1"] == RESULTS
+    assert store.stats()["buffered"] == 0 and store.stats()["buffered_results"] == 0
+
+
+def test_save_now_writes_row_then_results(tables, store):
+    store.save("job-1", {"status": "running", "state": "Vermont"})
+
+    store.save_now("job-1", {"status": "completed", "state": "Vermont"}, results=RESULTS)
+    store.flush()
+
+    # The buffered running row was superseded, not written over the completed one
+    assert tables.jobs["job-1"]["status"] == "completed"
+    assert tables.results["job-1"] == RESULTS
+
+
+def test_save_now_raises_and_buffers_nothing(tables, store):
+    tables.fail_jobs = True
+
+    with pytest.raises(RuntimeError):
+        store.save_now("job-1", {"status": "completed", "state": "Vermont"}, results=RESULTS)
+
+    assert store.stats()["buffered"] == 0 and store.stats()["buffered_results"] == 0
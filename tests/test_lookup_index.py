@@ -0,0 +1,62 @@
+import pytest
+
+import supabase_utils.db_client as db_client
+from supabase_utils.db_client import get_or_create_country_id, get_or_create_region_id, insert_postcodes_bulk
+from supabase_utils.lookup_index import LookupIndex
+
+# PostgREST's default max-rows: a request for more rows still gets at most this many
+MAX_ROWS = 1000
+
+
+class CappedStorage:
+    """The SQLite storage, answering postcode pages the way a capped Supabase API does."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def postcode_page(self, columns, limit=1000, **filters):
+        return self.storage.postcode_page(columns, limit=min(limit, MAX_ROWS), **filters)
+
+
+@pytest.fixture
+def region_id(monkeypatch):
+    region_id = get_or_create_region_id("Lookup Region", get_or_create_country_id("United States", "US"))
+    insert_postcodes_bulk([{"code": f"L{i:05d}", "place_name": f"Place {i % 40}", "region_id": region_id}
+                           for i in range(2500)])
+    storage = CappedStorage(db_client.get_storage())
+    monkeypatch.setattr(db_client, "get_storage", lambda: storage)
+    return region_id
+
+
+def test_load_reads_every_page(region_id):
+    index = LookupIndex()
+    index.load()
+
+    assert all(index.get(f"L{i:05d}") is not None for i in range(2500))
+
+
+def test_region_refresh_reads_every_page(region_id):
+    index = LookupIndex()
+    index.load()
+
+    index.refresh_regions([region_id])
+
+    assert len(index._partitions[region_id]) == 2500
+    assert index.get("L02499")["region_id"] == region_id
+
+
+def test_region_refresh_swaps_in_new_structures(region_id):
+    index = LookupIndex()
+    index.load()
+    partitions, regions_by_code, merged = index._partitions, index._regions_by_code, index._merged
+    db_client.delete_postcodes(region_id, ["L00000"])
+
+    index.refresh_regions([region_id])
+
+    # What a reader already holds is left untouched
+    assert regions_by_code["L00000"] == region_id and len(partitions[region_id]) == 2500
+    assert index._merged is not merged
+    assert index.get("L00000") is None and index.get("L00001") is not None
@@ -0,0 +1,14 @@
+from metrics import observe, flush_metrics, render_span_histograms
+
+
+def test_flushed_spans_add_up_in_the_metrics_file(tmp_path):
+    path = str(tmp_path / "metrics.sqlite3")
+    observe("test_parse", 0.02)
+    flush_metrics(path)
+    observe("test_parse", 3.0)
+
+    text = render_span_histograms(path)
+
+    assert 'scraper_stage_seconds_bucket{stage="test_parse",le="0.025"} 1\n' in text
+    assert 'scraper_stage_seconds_bucket{stage="test_parse",le="+Inf"} 2\n' in text
+    assert 'scraper_stage_seconds_count{stage="test_parse"} 2\n' in text
@@ -0,0 +1,82 @@
+import os
+import time
+
+from tests.conftest import read_fixture, age_entry
+from scraper.fetchers import HttpFetcher, get_browser_fetcher
+from scraper.geonames_scraper import fetch_postcode_page
+from scraper.page_cache import PageCache, get_page_cache
+
+
+def test_cache_hit_keeps_fetch_time(page_server):
+    page_server.pages["/hit"] = read_fixture("page_source_0.html")
+    url = page_server.url("/hit")
+    first = fetch_postcode_page([url], [HttpFetcher()], {})
+    fetched_at = age_entry(url, 90)
+
+    report = {}
+    page = fetch_postcode_page([url], [HttpFetcher()], report)
+
+    assert page.from_cache and page.status_code == 200
+    assert page.content_hash == first.content_hash
+    assert get_page_cache().get(url)["fetched_at"] == fetched_at
+    assert len(page_server.requests) == 1
+
+
+def test_expired_entry_is_revalidated(page_server):
+    page_server.pages["/expired"] = read_fixture("page_source_0.html")
+    url = page_server.url("/expired")
+    first = fetch_postcode_page([url], [HttpFetcher()], {})
+    age_entry(url, get_page_cache().ttl + 1)
+
+    page = fetch_postcode_page([url], [HttpFetcher()], {})
+
+    assert page.status_code == 304
+    assert page.content_hash == first.content_hash
+    assert page_server.requests[-1][1] is not None
+    assert time.time() - get_page_cache().get(url)["fetched_at"] < 5
+
+
+def test_prune_removes_unreferenced_objects(tmp_path):
+    cache = PageCache(root=str(tmp_path), prune_interval=float("inf"))
+    old_hash = cache.store("https://example.test/page", "<html>old</html>")
+    cache.save_rows(old_hash, [{"code": "1", "place_name": "A"}])
+    cache.mark_success("https://example.test/page", old_hash)
+    cache.store("https://example.test/page", "<html>stale</html>")
+    new_hash = cache.store("https://example.test/page", "<html>new</html>")
+    for name in os.listdir(tmp_path / "objects"):
+        os.utime(tmp_path / "objects" / name, (0, 0))
+
+    assert cache.prune() == 1
+    # The current body and the last successfully written one (with its rows) stay
+    assert cache.load_body(cache.get("https://example.test/page")) == "<html>new</html>"
+    assert cache.load_rows(old_hash) is not None
+    assert sorted(os.listdir(tmp_path / "objects")) == sorted(
+        [f"{old_hash}.html", f"{old_hash}.rows.json", f"{new_hash}.html"]
+    )
+
+
+def test_prune_keeps_recent_files(tmp_path):
+    cache = PageCache(root=str(tmp_path), prune_interval=float("inf"))
+    cache.store("https://example.test/page", "<html>one</html>")
+    cache.store("https://example.test/page", "<html>two</html>")
+
+    assert cache.prune() == 0
+
+
+def test_latency_saved_needs_a_timed_browser_fetch(page_server, monkeypatch):
+    page_server.pages["/first"] = page_server.pages["/second"] = read_fixture("page_source_0.html")
+    browser = get_browser_fetcher()
+    monkeypatch.setattr(browser, "average_elapsed", None)
+
+    report = {}
+    fetch_postcode_page([page_server.url("/first")], [HttpFetcher()], report)
+    assert "latency_saved" not in report
+
+    monkeypatch.setattr(browser, "average_elapsed", 60.0)
+    fetch_postcode_page([page_server.url("/second")], [HttpFetcher()], report)
+    saved = report["latency_saved"]
+    assert saved > 0
+
+    # A cache hit would not have needed a browser either
+    fetch_postcode_page([page_server.url("/second")], [HttpFetcher()], report)
+    assert report["latency_saved"] == saved
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+import job_queue.planner as planner
+from job_queue.base import COMPLETED
+from job_queue.sqlite_queue import SQLiteJobQueue
+from scraper.freshness import get_state_freshness
+from scraper.page_cache import get_page_cache
+
+ROWS = [
+    {"code": "03101", "place_name": "Manchester"},
+    {"code": "03102", "place_name": "Manchester"},
+    {"code": "03301", "place_name": "Concord"},
+]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+@pytest.fixture(autouse=True)
+def postcode_stats(monkeypatch):
+    monkeypatch.setattr(planner, "get_postcode_stats", lambda: {"total_postcodes": len(ROWS)})
+
+
+def store_state(state, fetched_ago=0):
+    get_page_cache().save_rows("planner-rows", ROWS)
+    get_state_freshness().record_success(state, "https://example.test", "planner-rows", len(ROWS))
+    get_state_freshness()._db.connection().execute(
+        "UPDATE state_freshness SET fetched_at = ? WHERE state = ?", (time.time() - fetched_ago, state)
+    )
+
+
+def payload(state, city="manchester", city_match="exact"):
+    return {"state": state, "city": city, "city_match": city_match, "states": None}
+
+
+def test_fresh_state_is_answered_from_stored_rows(queue, tables):
+    store_state("New Hampshire")
+
+    answered = planner.answer_from_store(queue, "job-1", {"state": "New Hampshire"}, payload("New Hampshire"))
+
+    assert answered
+    job = queue.get("job-1")
+    assert job["status"] == COMPLETED and job["results_count"] == 2
+    assert job["fetch_report"]["served_from_store"] == ["New Hampshire"]
+    assert [row["Post-Code"] for row in tables.results["job-1"]] == ["03101", "03102"]
+
+
+def test_stale_state_is_not_answered(queue, tables):
+    store_state("Rhode Island", fetched_ago=planner.STATE_DATA_MAX_AGE + 1)
+
+    assert not planner.answer_from_store(queue, "job-1", {"state": "Rhode Island"}, payload("Rhode Island"))
+    assert queue.get("job-1") is None
+
+
+def test_storage_failure_propagates_and_records_nothing(queue, tables):
+    store_state("Delaware")
+    tables.fail_jobs = True
+
+    with pytest.raises(RuntimeError):
+        planner.answer_from_store(queue, "job-1", {"state": "Delaware"}, payload("Delaware"))
+
+    assert queue.get("job-1") is None
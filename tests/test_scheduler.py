@@ -0,0 +1,54 @@
+import pytest
+
+import scraper.scheduler as scheduler
+from tests.conftest import read_fixture
+from scraper.fetchers import HttpFetcher
+
+
+class CountingBucket(scheduler.TokenBucket):
+    acquired = 0
+
+    async def acquire(self):
+        CountingBucket.acquired += 1
+        await super().acquire()
+
+
+@pytest.fixture
+def crawl(page_server, monkeypatch):
+    CountingBucket.acquired = 0
+    monkeypatch.setattr(scheduler, "TokenBucket", CountingBucket)
+    monkeypatch.setattr(scheduler, "get_state_urls",
+                        lambda state: ("XX", [page_server.url(f"/{state.lower().replace(' ', '-')}")]))
+    return scheduler.CrawlScheduler(rate=100, burst=100, fetchers=[HttpFetcher()])
+
+
+def test_every_request_takes_a_token(page_server, crawl):
+    page_server.pages["/connecticut"] = read_fixture("page_source_0.html")
+    page_server.failures["/connecticut"] = [503]
+
+    results = crawl.run(["Connecticut"])
+
+    assert len(results["Connecticut"]) == 200
+    # The retried 503 was a request of its own
+    assert len(page_server.requests) == 2
+    assert CountingBucket.acquired == 2
+
+
+def test_cache_hits_take_no_tokens(page_server, crawl):
+    page_server.pages["/new-hampshire"] = read_fixture("page_source_0.html")
+    crawl.run(["New Hampshire"])
+    CountingBucket.acquired = 0
+
+    crawl.run(["New Hampshire"])
+
+    assert len(page_server.requests) == 1
+    assert CountingBucket.acquired == 0
+
+
+def test_zero_rate_means_no_limit(page_server, crawl):
+    page_server.pages["/maine"] = read_fixture("page_source_0.html")
+    crawl.rate = 0
+
+    results = crawl.run(["Maine"])
+
+    assert len(results["Maine"]) == 200
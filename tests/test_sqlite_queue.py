@@ -0,0 +1,104 @@
+import pytest
+
+from job_queue.base import QueueFull, PENDING, RUNNING, FAILED, CANCELLED, CANCELLING, DETACHED
+from job_queue.refresh import REFRESH_PRIORITY
+from job_queue.sqlite_queue import SQLiteJobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def enqueue(queue, job_id, priority=0, **kwargs):
+    return queue.enqueue(job_id, {"status": PENDING, "state": job_id}, {"state": job_id}, priority=priority, **kwargs)
+
+
+def test_claim_takes_highest_priority_then_oldest(queue):
+    enqueue(queue, "low", priority=-1)
+    enqueue(queue, "first", priority=2)
+    enqueue(queue, "second", priority=2)
+
+    assert queue.get("low")["queue_position"] == 3
+    assert [queue.claim(worker=1)[0] for _ in range(3)] == ["first", "second", "low"]
+    assert queue.claim(worker=1) is None
+
+
+def test_requeue_fails_a_job_after_max_attempts(queue):
+    enqueue(queue, "job")
+    queue.claim(worker=1)
+
+    assert queue.requeue("job", max_attempts=2) == PENDING
+    assert queue.claim(worker=2)[0] == "job"
+    assert queue.requeue("job", max_attempts=2) == FAILED
+
+    job = queue.get("job")
+    assert job["status"] == FAILED and "exited unexpectedly" in job["message"]
+    assert queue.requeue("job", max_attempts=2) == FAILED
+
+
+def test_cancel_pending_and_running_jobs(queue):
+    enqueue(queue, "running")
+    enqueue(queue, "pending")
+    queue.claim(worker=1)
+
+    assert queue.cancel("pending") == CANCELLED
+    assert queue.cancel("running") == CANCELLING
+    assert queue.running_jobs() == [{"id": "running", "worker": 1, "cancel_requested": 1}]
+
+    queue.mark_cancelled("running")
+    assert queue.get("running")["status"] == CANCELLED
+    assert queue.cancel("running") == CANCELLED
+    assert queue.cancel("missing") is None
+
+
+def test_enqueue_refuses_jobs_past_max_pending(queue):
+    enqueue(queue, "one", max_pending=2)
+    enqueue(queue, "two", max_pending=2)
+
+    with pytest.raises(QueueFull) as error:
+        enqueue(queue, "three", max_pending=2)
+
+    assert error.value.pending == 2
+    assert queue.get("three") is None
+    # A duplicate of a queued job is coalesced even when the queue is full
+    enqueue(queue, "four", dedupe_key="Ohio|")
+    assert enqueue(queue, "five", max_pending=1, dedupe_key="Ohio|") == ("four", 3)
+
+
+def test_coalesced_request_raises_pending_priority(queue):
+    enqueue(queue, "refresh", priority=REFRESH_PRIORITY, dedupe_key="Ohio|")
+    enqueue(queue, "other", priority=0)
+    assert queue.get("refresh")["queue_position"] == 2
+
+    assert enqueue(queue, "user", priority=5, dedupe_key="Ohio|") == ("refresh", 1)
+    assert queue.get("refresh")["priority"] == 5
+    assert queue.claim(worker=1)[0] == "refresh"
+
+
+def test_coalesced_request_never_lowers_priority(queue):
+    enqueue(queue, "first", priority=3, dedupe_key="Ohio|")
+
+    enqueue(queue, "refresh", priority=REFRESH_PRIORITY, dedupe_key="Ohio|")
+
+    assert queue.get("first")["priority"] == 3
+
+
+def test_shared_job_is_cancelled_by_its_last_requester(queue):
+    enqueue(queue, "refresh", priority=REFRESH_PRIORITY, dedupe_key="Ohio|")
+    enqueue(queue, "user", dedupe_key="Ohio|")
+
+    assert queue.cancel("refresh") == DETACHED
+    assert queue.get("refresh")["status"] == PENDING
+    assert queue.cancel("refresh") == CANCELLED
+
+
+def test_running_shared_job_keeps_running_for_other_requesters(queue):
+    enqueue(queue, "first", dedupe_key="Ohio|")
+    queue.claim(worker=1)
+    enqueue(queue, "second", dedupe_key="Ohio|")
+
+    assert queue.cancel("first") == DETACHED
+    assert queue.running_jobs()[0]["cancel_requested"] == 0
+    assert queue.cancel("first") == CANCELLING
+    assert queue.get("first")["status"] == RUNNING
@@ -0,0 +1,86 @@
+import pytest
+
+import supabase_utils.db_client as db_client
+from tests.conftest import read_fixture
+from scraper.table_parser import iter_postcodes
+from supabase_utils.db_client import (
+    get_or_create_country_id, get_or_create_region_id, get_region_postcodes, sync_region_postcodes,
+)
+
+
+def page_rows(name):
+    return [{"code": code, "place_name": place_name} for place_name, code in iter_postcodes(read_fixture(name))]
+
+
+@pytest.fixture
+def region_id(request):
+    # The SQLite file is shared by the whole session, so each test syncs its own region
+    country_id = get_or_create_country_id("United States", "US")
+    return get_or_create_region_id(request.node.name, country_id)
+
+
+def test_iter_postcodes_reads_the_postcode_table():
+    rows = page_rows("page_source_0.html")
+
+    assert len(rows) == 200
+    assert rows[0] == {"code": "06001", "place_name": "Avon"}
+    assert len({row["code"] for row in rows}) == 200
+
+
+def test_iter_postcodes_on_a_page_without_the_table():
+    assert page_rows("page_source_1.html") == []
+
+
+def test_sync_inserts_then_writes_only_the_delta(region_id):
+    rows = page_rows("page_source_0.html")
+
+    summary = sync_region_postcodes(region_id, rows)
+    assert summary == {"inserted": 200, "updated": 0, "deleted": 0, "unchanged": 0, "errors": 0}
+
+    renamed = [dict(rows[0], place_name="Avon Center")] + rows[1:150]
+    summary = sync_region_postcodes(region_id, renamed)
+
+    assert summary == {"inserted": 0, "updated": 1, "deleted": 50, "unchanged": 149, "errors": 0}
+    stored = get_region_postcodes(region_id)
+    assert len(stored) == 150
+    assert stored["06001"]["place_name"] == "Avon Center"
+
+
+def test_sync_without_delete_missing_keeps_other_codes(region_id):
+    rows = page_rows("page_source_0.html")
+    sync_region_postcodes(region_id, rows)
+
+    summary = sync_region_postcodes(region_id, rows[:10], delete_missing=False)
+
+    assert summary == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 10, "errors": 0}
+    assert len(get_region_postcodes(region_id)) == 200
+
+
+def test_sync_of_an_empty_page_deletes_everything(region_id):
+    sync_region_postcodes(region_id, page_rows("page_source_0.html"))
+
+    summary = sync_region_postcodes(region_id, page_rows("page_source_1.html"))
+
+    assert summary["deleted"] == 200
+    assert get_region_postcodes(region_id) == {}
+
+
+def test_sync_counts_the_batches_that_were_written(region_id, monkeypatch):
+    rows = page_rows("page_source_0.html")
+    sync_region_postcodes(region_id, rows[:100])
+    renamed = [dict(row, place_name=row["place_name"] + " Center") for row in rows[:100]] + rows[100:]
+    storage = db_client.get_storage()
+    upsert = storage.upsert_postcodes
+
+    def failing_upsert(batch, ignore_duplicates=True):
+        if any(row["code"] == rows[150]["code"] for row in batch):
+            raise RuntimeError("statement timeout")
+        return upsert(batch, ignore_duplicates)
+
+    monkeypatch.setattr(storage, "upsert_postcodes", failing_upsert)
+
+    summary = sync_region_postcodes(region_id, renamed, batch_size=50)
+
+    # Batches: 2 of updates, then 2 of inserts of which the one holding rows[150] fails
+    assert summary == {"inserted": 50, "updated": 100, "deleted": 0, "unchanged": 0, "errors": 50}
+    assert len(get_region_postcodes(region_id)) == 150